@@ -10,8 +10,8 @@ from typing import Optional
 
 logger = logging.getLogger(__name__)
 
-# Aisha STT API endpoint
-AISHA_STT_URL = "https://back.aisha.group/api/v1/stt/post/"
+# Aisha STT API endpoint (overridable to point at a local stand-in)
+AISHA_STT_URL = os.getenv("AISHA_STT_URL", "https://back.aisha.group/api/v1/stt/post/")
 
 
 class AishaTranscriber:
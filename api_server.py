@@ -6,45 +6,87 @@ push notifications, and Turso cloud database support.
 
 import os
 import jwt
-import hashlib
 import asyncio
 import logging
 import tempfile
+import time
 import json
 import random
+import sqlite3
+import sys
+import uuid
 import httpx
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File, BackgroundTasks, Body, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, Response
 from pydantic import BaseModel
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from recurrence import build_rule, rule_for_reminder, next_fire_for_reminder
+from recurrence_batch import next_fires_for_reminders
+import stats as app_stats
+import rollups
+import outbox
+from unimtx_client import UnimtxClient, UnimtxUnavailable
+from token_cache import TokenCache
+import passwords
+import metrics
+from scheduler_health import SchedulerHealth, DEGRADED
+from otp_store import create_otp_store, VERIFIED, NOT_FOUND, EXPIRED, LOCKED, PENDING
+from coordination import Lease, ShardMembership, Shards, run_as_leader
+from logging_setup import configure_logging, parse_levels, log_context, get_levels, set_levels
+import profiling
+
+# Configure logging: JSON lines by default, written from a background thread
+configure_logging(
+    handlers=[logging.StreamHandler(sys.stdout)],
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    json_format=os.environ.get('LOG_FORMAT', 'json') == 'json',
+    levels=parse_levels(os.environ.get('LOG_LEVELS', 'httpx=WARNING')),
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', '0.1'))
+)
 logger = logging.getLogger(__name__)
 
+# ===== Metrics =====
+HTTP_LATENCY = metrics.histogram('http_request_seconds', "API request latency", ['method', 'route', 'status'])
+HTTP_IN_FLIGHT = metrics.gauge('http_requests_in_flight', "API requests being handled")
+DB_QUERY_SECONDS = metrics.histogram('db_query_seconds', "Database call latency by query", ['query'])
+STT_LATENCY = metrics.histogram('stt_latency_seconds', "Speech-to-text latency by backend", ['backend'])
+GEMINI_LATENCY = metrics.histogram('gemini_latency_seconds', "Gemini call latency by operation", ['operation'])
+FIRE_LAG = metrics.histogram(
+    'reminder_fire_lag_seconds', "Delay between a reminder's scheduled time and its delivery",
+    buckets=metrics.LAG_BUCKETS
+)
+DELIVERIES = metrics.counter('reminders_delivered_total', "Reminder messages by kind and outcome", ['channel', 'kind', 'outcome'])
+DUE_REMINDERS = metrics.gauge('reminders_due', "Unsent reminders found due on the last scheduler tick")
+TICK_SECONDS = metrics.histogram('scheduler_tick_seconds', "Duration of one reminder check")
+
 # Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'levi-app-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24 * 30  # 30 days
+# How long a user's token_version is trusted before re-reading it; bounds how
+# long a logout-everywhere takes to reach other workers
+TOKEN_VERSION_TTL_SECONDS = int(os.environ.get('TOKEN_VERSION_TTL_SECONDS', '30'))
 FOLLOW_UP_DELAY_SECONDS = 1800  # 30 minutes
 DEFAULT_TIMEZONE = 'Asia/Tashkent'
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'levi2026admin')
 
-# OTP Storage (in-memory fallback, expires after 5 minutes)
-# Format: {phone: {"code": "123456", "expires": datetime, "attempts": 0}}
-otp_storage: Dict[str, dict] = {}
 
 # Unimtx OTP Service Configuration
 UNIMTX_ACCESS_KEY_ID = os.environ.get('UNIMTX_ACCESS_KEY_ID', '')
-UNIMTX_API_BASE = 'https://api.unimtx.com'
+UNIMTX_API_BASE = os.environ.get('UNIMTX_API_BASE', 'https://api.unimtx.com')
 UNIMTX_ENABLED = bool(UNIMTX_ACCESS_KEY_ID)
+UNIMTX_CONNECT_TIMEOUT = float(os.environ.get('UNIMTX_CONNECT_TIMEOUT', '2'))
+UNIMTX_READ_TIMEOUT = float(os.environ.get('UNIMTX_READ_TIMEOUT', '5'))
+UNIMTX_MAX_CONNECTIONS = int(os.environ.get('UNIMTX_MAX_CONNECTIONS', '20'))
 
 # API Keys
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 ELEVENLABS_API_KEY = os.environ.get('ELEVENLABS_API_KEY')
+ELEVENLABS_API_BASE = os.environ.get('ELEVENLABS_API_BASE') or None
 
 # Turso Database Configuration
 TURSO_DATABASE_URL = os.environ.get('TURSO_DATABASE_URL')
@@ -52,8 +94,46 @@ TURSO_AUTH_TOKEN = os.environ.get('TURSO_AUTH_TOKEN')
 USE_TURSO = bool(TURSO_DATABASE_URL and TURSO_AUTH_TOKEN)
 DATABASE_PATH = os.environ.get('DATABASE_PATH', 'reminders.db')
 
+# Reminder checker period, and the p99 delivery lag above which it is degraded
+SCHEDULER_INTERVAL_SECONDS = 30
+SCHEDULER_LAG_SLO_SECONDS = int(os.environ.get('SCHEDULER_LAG_SLO_SECONDS', '90'))
+
+# Background jobs (reminder scheduler, rollups) run in exactly one process, the
+# holder of the scheduler lease. 'leader': every web worker competes for it;
+# 'sharded': every worker sends the reminders of its share of SCHEDULER_SHARDS
+# user_id shards (rollups stay with the leader); 'off': web workers never run
+# them and app_scheduler.py does.
+SCHEDULER_MODE = os.environ.get('SCHEDULER_MODE', 'leader')
+SCHEDULER_LEASE_TTL_SECONDS = int(os.environ.get('SCHEDULER_LEASE_TTL_SECONDS', '120'))
+SCHEDULER_SHARDS = int(os.environ.get('SCHEDULER_SHARDS', '16'))
+
+# The scheduler queues due pushes in an outbox; the dispatcher sends them
+OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', '2'))
+PUSH_CONCURRENCY = int(os.environ.get('PUSH_CONCURRENCY', '20'))
+
+# OTP codes: 'sqlite' is shared by all uvicorn workers, 'memory' is per process
+OTP_STORE_BACKEND = os.environ.get('OTP_STORE', 'sqlite')
+OTP_DB_PATH = os.environ.get('OTP_DB_PATH', DATABASE_PATH)
+
+# How often reminder events are folded into the analytics rollups
+ROLLUP_INTERVAL_SECONDS = int(os.environ.get('ROLLUP_INTERVAL_SECONDS', '300'))
+
+# Sampled request profiling; switched at runtime through /admin/api/profiling
+profiling.configure_profiling(
+    directory=os.environ.get('PROFILE_DIR', 'profiles'),
+    enabled=os.environ.get('PROFILING', 'false').lower() == 'true',
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0.05')),
+    min_duration_ms=float(os.environ.get('PROFILE_MIN_MS', '1000')),
+    max_files=int(os.environ.get('PROFILE_MAX_FILES', '200'))
+)
+# Only app requests are profiled, not metrics scrapes or the admin panel
+PROFILED_PATH_PREFIX = '/api/'
+
 # Firebase Cloud Messaging (for push notifications)
 FCM_SERVER_KEY = os.environ.get('FCM_SERVER_KEY')
+FCM_API_URL = os.environ.get('FCM_API_URL', 'https://fcm.googleapis.com/fcm/send')
+# Per-token errors that retrying cannot fix
+FCM_PERMANENT_ERRORS = ('NotRegistered', 'InvalidRegistration', 'MismatchSenderId')
 
 # Try to import libsql for Turso
 LIBSQL_AVAILABLE = False
@@ -93,6 +173,22 @@ except ImportError:
 import aiosqlite
 
 
+otp_store = create_otp_store(OTP_STORE_BACKEND, OTP_DB_PATH)
+unimtx = UnimtxClient(
+    UNIMTX_API_BASE,
+    UNIMTX_ACCESS_KEY_ID,
+    connect_timeout=UNIMTX_CONNECT_TIMEOUT,
+    read_timeout=UNIMTX_READ_TIMEOUT,
+    max_connections=UNIMTX_MAX_CONNECTIONS
+)
+
+# One pooled client for all pushes; a client per push costs tens of ms of CPU
+fcm_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(10.0, connect=2.0),
+    limits=httpx.Limits(max_connections=PUSH_CONCURRENCY)
+)
+
+
 def get_db_connection():
     """Get database connection (Turso or local SQLite)."""
     if USE_TURSO and LIBSQL_AVAILABLE and libsql:
@@ -105,6 +201,11 @@ def get_db_connection():
     return None  # Will use aiosqlite
 
 
+def sync_db_connection():
+    """Blocking DB-API connection (Turso or local SQLite) for worker threads."""
+    return get_db_connection() or sqlite3.connect(DATABASE_PATH)
+
+
 def rows_to_dicts(cursor, rows) -> List[dict]:
     """Convert rows to list of dictionaries."""
     if not rows:
@@ -123,261 +224,338 @@ def row_to_dict(cursor, row) -> Optional[dict]:
 
 # Background scheduler task
 scheduler_running = False
+scheduler_health = SchedulerHealth(SCHEDULER_INTERVAL_SECONDS, SCHEDULER_LAG_SLO_SECONDS)
+scheduler_lease = Lease(sync_db_connection, 'app_scheduler', ttl=SCHEDULER_LEASE_TTL_SECONDS)
+scheduler_shards = ShardMembership(
+    sync_db_connection, 'app_reminders', SCHEDULER_SHARDS, ttl=SCHEDULER_LEASE_TTL_SECONDS
+)
+
+
+def is_scheduling() -> bool:
+    """Whether this process is sending reminders (as leader or for some shards)."""
+    return scheduler_lease.held if SCHEDULER_MODE != 'sharded' else bool(scheduler_shards.owned.owned)
+
+
+async def scheduler_status() -> dict:
+    """
+    This worker's role in scheduling and the scheduler's health as seen
+    from it. Shard owners and the leader report their own tick and lag
+    tracking; a standby never ticks, so it reports the lease holder and is
+    degraded only when nobody holds the lease.
+    """
+    if SCHEDULER_MODE == 'sharded' and scheduler_shards.owned.owned:
+        return {"role": "shard", "shards": list(scheduler_shards.owned.owned), **scheduler_health.snapshot()}
+    if scheduler_lease.held:
+        return {"role": "leader", **scheduler_health.snapshot()}
+    leader = await asyncio.to_thread(scheduler_lease.current)
+    return {
+        "role": "standby",
+        "leader": leader["holder"] if leader else None,
+        "status": "ok" if leader else DEGRADED,
+        "reasons": [] if leader else ["no process holds the scheduler lease"],
+    }
 
 
-async def reminder_scheduler():
-    """Background task to check and send reminder notifications."""
+metrics.gauge('scheduler_degraded', "1 while scheduler health is degraded").set_function(
+    lambda: is_scheduling() and scheduler_health.snapshot()['status'] == DEGRADED
+)
+metrics.gauge('scheduler_leader', "1 while this process holds the scheduler lease").set_function(
+    lambda: scheduler_lease.held
+)
+metrics.gauge('scheduler_shards_owned', "Reminder shards this process sends for").set_function(
+    lambda: len(scheduler_shards.owned.owned)
+)
+
+
+async def reminder_scheduler(shards: Optional[ShardMembership] = None):
+    """
+    Background task queueing the pushes of due reminders.
+    
+    Args:
+        shards: Claim a share of the reminders at every tick instead of queueing all of them.
+    """
     global scheduler_running
     scheduler_running = True
+    scheduler_health.restart()
     logger.info("Reminder scheduler started")
     
     while scheduler_running:
+        scheduler_health.tick()
         try:
-            await check_and_send_reminders()
+            owned = await asyncio.to_thread(shards.claim) if shards else None
+            with TICK_SECONDS.time():
+                await asyncio.to_thread(queue_due_reminders, owned)
         except Exception as e:
             logger.error(f"Scheduler error: {e}")
-        await asyncio.sleep(30)  # Check every 30 seconds
+        # Logs a warning when health turns degraded
+        scheduler_health.check_transition()
+        await asyncio.sleep(SCHEDULER_INTERVAL_SECONDS)
 
 
-async def check_and_send_reminders():
-    """Check for due reminders and send push notifications."""
-    now = datetime.utcnow()
+async def outbox_dispatcher(shards: Optional[ShardMembership] = None):
+    """
+    Background task sending the queued push notifications.
     
-    if USE_TURSO and LIBSQL_AVAILABLE:
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT r.id, r.user_id, r.task_text, r.notes, r.location, 
-                       r.scheduled_time_utc, r.recurrence_type, r.recurrence_time,
-                       r.user_timezone, u.fcm_token, u.name
-                FROM app_reminders r
-                JOIN app_users u ON r.user_id = u.id
-                WHERE r.status = 'pending' 
-                AND r.initial_reminder_sent = 0
-                AND r.scheduled_time_utc <= ?
-                """,
-                (now.isoformat(),)
-            )
-            rows = cursor.fetchall()
-            reminders = rows_to_dicts(cursor, rows)
-            conn.close()
-            
-            for reminder in reminders:
-                await send_push_notification(reminder)
-                await mark_reminder_sent(reminder['id'])
-                
-                # Schedule next occurrence for recurring reminders
-                if reminder.get('recurrence_type'):
-                    await schedule_next_recurrence(reminder)
-    else:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                """
-                SELECT r.id, r.user_id, r.task_text, r.notes, r.location, 
-                       r.scheduled_time_utc, r.recurrence_type, r.recurrence_time,
-                       r.user_timezone, u.fcm_token, u.name
-                FROM app_reminders r
-                JOIN app_users u ON r.user_id = u.id
-                WHERE r.status = 'pending' 
-                AND r.initial_reminder_sent = 0
-                AND r.scheduled_time_utc <= ?
-                """,
-                (now.isoformat(),)
-            )
-            rows = await cursor.fetchall()
-            
-            for row in rows:
-                reminder = dict(row)
-                await send_push_notification(reminder)
-                await mark_reminder_sent_async(db, reminder['id'])
-                
-                if reminder.get('recurrence_type'):
-                    await schedule_next_recurrence_async(db, reminder)
-            
-            await db.commit()
+    Args:
+        shards: Send only for the shards reminder_scheduler last claimed.
+    """
+    while True:
+        try:
+            sent, retried, dead = await dispatch_pushes(shards.owned if shards else None)
+            if sent or retried or dead:
+                logger.info(f"Outbox: {sent} pushes sent, {retried} to retry, {dead} given up")
+        except Exception as e:
+            logger.error(f"Outbox dispatch error: {e}")
+        await asyncio.sleep(OUTBOX_POLL_SECONDS)
 
 
-async def send_push_notification(reminder: dict):
-    """Send push notification via Firebase Cloud Messaging."""
-    fcm_token = reminder.get('fcm_token')
-    if not fcm_token or not FCM_SERVER_KEY:
-        logger.info(f"No FCM token/key for reminder {reminder['id']}, skipping push")
+async def rollup_scheduler():
+    """Background task folding reminder events into the analytics rollups."""
+    while True:
+        await asyncio.sleep(ROLLUP_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(rollups.run_rollup, sync_db_connection, "app_reminders")
+        except Exception as e:
+            logger.error(f"Rollup error: {e}")
+
+
+async def run_background_jobs(sharded: bool = SCHEDULER_MODE == 'sharded'):
+    """
+    Run the reminder, outbox and rollup jobs whenever this process holds
+    the scheduler lease, or, sharded, queue and send this process's share
+    of the reminders while only the rollups wait for the lease.
+    """
+    if not sharded:
+        await run_as_leader(scheduler_lease, [reminder_scheduler, outbox_dispatcher, rollup_scheduler])
         return
+    try:
+        await asyncio.gather(
+            run_as_leader(scheduler_lease, [rollup_scheduler]),
+            reminder_scheduler(scheduler_shards),
+            outbox_dispatcher(scheduler_shards)
+        )
+    finally:
+        # Hand our shards to the remaining workers without waiting for the leases to expire
+        await asyncio.to_thread(scheduler_shards.leave)
+
+
+# Recurring reminders are stored once; when the slot computed at the last
+# firing arrives, the row is moved onto it and fires again.
+PROMOTE_RECURRENCES_SQL = """
+    UPDATE app_reminders
+    SET scheduled_time_utc = next_fire_utc,
+        next_fire_utc = NULL,
+        initial_reminder_sent = 0,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE status = 'pending'
+    AND recurrence_type IS NOT NULL
+    AND initial_reminder_sent = 1
+    AND next_fire_utc IS NOT NULL
+    AND next_fire_utc <= ?
+"""
+
+DUE_REMINDERS_SQL = """
+    SELECT r.id, r.user_id, r.task_text, r.notes, r.location, 
+           r.scheduled_time_utc, r.recurrence_type, r.recurrence_time,
+           r.recurrence_rule, r.user_timezone, u.fcm_token, u.name
+    FROM app_reminders r
+    JOIN app_users u ON r.user_id = u.id
+    WHERE r.status = 'pending' 
+    AND r.initial_reminder_sent = 0
+    AND r.scheduled_time_utc <= ?
+"""
+
+# Claims a due reminder; a row another worker or an edit changed since it was read is left alone
+MARK_FIRED_SQL = """
+    UPDATE app_reminders SET initial_reminder_sent = 1
+    WHERE id = ? AND initial_reminder_sent = 0 AND scheduled_time_utc = ?
+"""
+
+OUTBOX_OWNER = scheduler_lease.holder
+
+
+async def check_and_send_reminders(shards: Optional[Shards] = None):
+    """
+    Queue the pushes of due reminders and send everything queued.
+    
+    Args:
+        shards: Only handle reminders of users in these shards (default: all).
+    """
+    await asyncio.to_thread(queue_due_reminders, shards)
+    await dispatch_pushes(shards)
+
+
+def queue_due_reminders(shards: Optional[Shards] = None) -> int:
+    """
+    Mark due reminders as fired (moving recurring ones on) and queue their
+    pushes in the outbox, all in one transaction, so a crash can neither
+    lose a reminder nor queue it twice. Blocking; run it in a worker thread.
     
+    Args:
+        shards: Only handle reminders of users in these shards (default: all).
+    
+    Returns:
+        Number of pushes queued.
+    """
+    now = datetime.utcnow()
+    promote_sql = PROMOTE_RECURRENCES_SQL + (shards.sql('user_id') if shards else '')
+    due_sql = DUE_REMINDERS_SQL + (shards.sql('r.user_id') if shards else '')
+    
+    conn = sync_db_connection()
     try:
-        import httpx
+        cursor = conn.cursor()
+        # Move recurring reminders onto their next slot once it arrives
+        with DB_QUERY_SECONDS.time(query='promote_recurrences'):
+            cursor.execute(promote_sql, (now.isoformat(),))
         
-        message = f"🔔 {reminder['task_text']}"
-        if reminder.get('notes'):
-            message += f"\n📋 {reminder['notes']}"
-        if reminder.get('location'):
-            message += f"\n📍 {reminder['location']}"
+        with DB_QUERY_SECONDS.time(query='due_reminders'):
+            cursor.execute(due_sql, (now.isoformat(),))
+            reminders = sort_due_reminders(rows_to_dicts(cursor, cursor.fetchall()))
+        DUE_REMINDERS.set(len(reminders))
         
-        payload = {
-            "to": fcm_token,
-            "notification": {
-                "title": "Levi - Eslatma",
-                "body": message,
-                "sound": "default"
-            },
-            "data": {
-                "reminder_id": str(reminder['id']),
-                "task_text": reminder['task_text']
-            }
-        }
+        # Next slots for every recurring reminder in the batch at once
+        next_fires = next_fires_for_reminders(reminders, now)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://fcm.googleapis.com/fcm/send",
-                json=payload,
-                headers={
-                    "Authorization": f"key={FCM_SERVER_KEY}",
-                    "Content-Type": "application/json"
-                }
-            )
-            logger.info(f"FCM response: {response.status_code}")
-    except Exception as e:
-        logger.error(f"FCM push failed: {e}")
-
-
-async def mark_reminder_sent(reminder_id: int):
-    """Mark reminder as sent (Turso)."""
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE app_reminders SET initial_reminder_sent = 1 WHERE id = ?",
-            (reminder_id,)
-        )
+        queued = 0
+        with DB_QUERY_SECONDS.time(query='queue_pushes'):
+            for reminder in reminders:
+                cursor.execute(MARK_FIRED_SQL, (reminder['id'], reminder['scheduled_time_utc']))
+                if not cursor.rowcount:
+                    continue
+                next_fire = next_fires.get(reminder['id'])
+                if reminder.get('recurrence_type') and next_fire:
+                    record_fired_occurrence(cursor, reminder, next_fire)
+                queued += outbox.enqueue(cursor, 'app_reminders', outbox.REMINDER, reminder)
         conn.commit()
+    finally:
         conn.close()
+    if queued:
+        logger.info(f"Queued {queued} reminder pushes")
+    return queued
 
 
-async def mark_reminder_sent_async(db, reminder_id: int):
-    """Mark reminder as sent (aiosqlite)."""
-    await db.execute(
-        "UPDATE app_reminders SET initial_reminder_sent = 1 WHERE id = ?",
-        (reminder_id,)
+def record_fired_occurrence(cursor, reminder: dict, next_fire: datetime):
+    """Log a fired occurrence and store the next slot in place (caller commits)."""
+    cursor.execute(
+        """
+        UPDATE app_reminders 
+        SET next_fire_utc = ?, recurrence_rule = COALESCE(recurrence_rule, ?),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (next_fire.isoformat(), rule_for_reminder(reminder), reminder['id'])
+    )
+    cursor.execute(
+        "INSERT INTO app_reminder_occurrences (reminder_id, scheduled_time_utc, event) VALUES (?, ?, 'fired')",
+        (reminder['id'], reminder['scheduled_time_utc'])
     )
 
 
-async def schedule_next_recurrence(reminder: dict):
-    """Schedule next occurrence for recurring reminder (Turso)."""
-    from dateutil import tz as tz_module
-    
-    recurrence_type = reminder.get('recurrence_type')
-    if not recurrence_type:
-        return
+async def dispatch_pushes(shards: Optional[Shards] = None) -> Tuple[int, int, int]:
+    """
+    Send queued push notifications until the outbox is drained.
     
-    recurrence_time = reminder.get('recurrence_time', '09:00')
-    user_tz = reminder.get('user_timezone', DEFAULT_TIMEZONE)
+    Args:
+        shards: Only send for users in these shards (default: all).
     
+    Returns:
+        (sent, retried, dead) counts.
+    """
+    async def send(item: dict):
+        reminder = item['reminder']
+        with log_context(reminder_id=reminder['id'], user_id=reminder['user_id']):
+            await send_push_notification(reminder, item['idempotency_key'])
+            record_fire_lag(reminder)
+    
+    return await outbox.dispatch(
+        sync_db_connection, 'app_reminders', OUTBOX_OWNER, send,
+        shards=shards, concurrency=PUSH_CONCURRENCY
+    )
+
+
+def sort_due_reminders(reminders: List[dict]) -> List[dict]:
+    """Oldest first, so each user's reminders are sent in the order they were due."""
+    return sorted(reminders, key=lambda r: (r['scheduled_time_utc'], r['id']))
+
+
+def record_fire_lag(reminder: dict):
+    """Record how late a reminder was handled relative to its scheduled time."""
     try:
-        hour, minute = map(int, recurrence_time.split(':'))
-    except:
-        hour, minute = 9, 0
-    
-    user_timezone = tz_module.gettz(user_tz)
-    now_local = datetime.now(user_timezone)
-    
-    if recurrence_type == 'daily':
-        next_date = now_local + timedelta(days=1)
-    elif recurrence_type == 'weekdays':
-        next_date = now_local + timedelta(days=1)
-        while next_date.weekday() >= 5:
-            next_date += timedelta(days=1)
-    elif recurrence_type == 'weekly':
-        next_date = now_local + timedelta(weeks=1)
-    elif recurrence_type == 'monthly':
-        next_month = now_local.month + 1
-        next_year = now_local.year
-        if next_month > 12:
-            next_month = 1
-            next_year += 1
-        try:
-            next_date = now_local.replace(year=next_year, month=next_month)
-        except ValueError:
-            next_date = now_local.replace(year=next_year, month=next_month, day=28)
-    else:
+        scheduled = datetime.fromisoformat(str(reminder['scheduled_time_utc']))
+    except ValueError:
         return
-    
-    next_datetime_local = next_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-    next_datetime_utc = next_datetime_local.astimezone(tz_module.UTC).replace(tzinfo=None)
-    
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO app_reminders (user_id, task_text, notes, location, scheduled_time_utc, 
-                                       user_timezone, recurrence_type, recurrence_time, initial_reminder_sent)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
-            """,
-            (reminder['user_id'], reminder['task_text'], reminder.get('notes'), 
-             reminder.get('location'), next_datetime_utc.isoformat(),
-             user_tz, recurrence_type, recurrence_time)
-        )
-        conn.commit()
-        conn.close()
-        logger.info(f"Scheduled next occurrence for reminder {reminder['id']}")
+    lag = (datetime.utcnow() - scheduled).total_seconds()
+    FIRE_LAG.observe(max(0.0, lag))
+    scheduler_health.record_lag(lag)
 
 
-async def schedule_next_recurrence_async(db, reminder: dict):
-    """Schedule next occurrence (aiosqlite version)."""
-    from dateutil import tz as tz_module
+async def send_push_notification(reminder: dict, idempotency_key: Optional[str] = None):
+    """
+    Send push notification via Firebase Cloud Messaging.
+    
+    Args:
+        reminder: Due reminder with the user's fcm_token.
+        idempotency_key: Sent along in the data payload so the app can drop
+            a push delivered twice.
     
-    recurrence_type = reminder.get('recurrence_type')
-    if not recurrence_type:
+    Raises:
+        outbox.Undeliverable: If FCM rejects the request or the token for good.
+        Exception: Any other failure (the outbox retries it).
+    """
+    fcm_token = reminder.get('fcm_token')
+    if not fcm_token or not FCM_SERVER_KEY:
+        logger.info(f"No FCM token/key for reminder {reminder['id']}, skipping push")
+        DELIVERIES.inc(channel='fcm', kind='reminder', outcome='skipped')
         return
     
-    recurrence_time = reminder.get('recurrence_time', '09:00')
-    user_tz = reminder.get('user_timezone', DEFAULT_TIMEZONE)
+    message = f"🔔 {reminder['task_text']}"
+    if reminder.get('notes'):
+        message += f"\n📋 {reminder['notes']}"
+    if reminder.get('location'):
+        message += f"\n📍 {reminder['location']}"
+    
+    payload = {
+        "to": fcm_token,
+        "notification": {
+            "title": "Levi - Eslatma",
+            "body": message,
+            "sound": "default"
+        },
+        "data": {
+            "reminder_id": str(reminder['id']),
+            "task_text": reminder['task_text']
+        }
+    }
+    if idempotency_key:
+        payload["data"]["idempotency_key"] = idempotency_key
     
     try:
-        hour, minute = map(int, recurrence_time.split(':'))
-    except:
-        hour, minute = 9, 0
-    
-    user_timezone = tz_module.gettz(user_tz)
-    now_local = datetime.now(user_timezone)
-    
-    if recurrence_type == 'daily':
-        next_date = now_local + timedelta(days=1)
-    elif recurrence_type == 'weekdays':
-        next_date = now_local + timedelta(days=1)
-        while next_date.weekday() >= 5:
-            next_date += timedelta(days=1)
-    elif recurrence_type == 'weekly':
-        next_date = now_local + timedelta(weeks=1)
-    elif recurrence_type == 'monthly':
-        next_month = now_local.month + 1
-        next_year = now_local.year
-        if next_month > 12:
-            next_month = 1
-            next_year += 1
+        response = await fcm_client.post(
+            FCM_API_URL,
+            json=payload,
+            headers={
+                "Authorization": f"key={FCM_SERVER_KEY}",
+                "Content-Type": "application/json"
+            }
+        )
+        logger.info(f"FCM response: {response.status_code}")
+        if response.status_code == 400:
+            # Malformed request; sending it again cannot help
+            raise outbox.Undeliverable(f"FCM rejected the request: {response.text[:200]}")
+        response.raise_for_status()
         try:
-            next_date = now_local.replace(year=next_year, month=next_month)
+            error = (response.json().get('results') or [{}])[0].get('error')
         except ValueError:
-            next_date = now_local.replace(year=next_year, month=next_month, day=28)
-    else:
-        return
-    
-    next_datetime_local = next_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-    next_datetime_utc = next_datetime_local.astimezone(tz_module.UTC).replace(tzinfo=None)
-    
-    await db.execute(
-        """
-        INSERT INTO app_reminders (user_id, task_text, notes, location, scheduled_time_utc, 
-                                   user_timezone, recurrence_type, recurrence_time, initial_reminder_sent)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
-        """,
-        (reminder['user_id'], reminder['task_text'], reminder.get('notes'), 
-         reminder.get('location'), next_datetime_utc.isoformat(),
-         user_tz, recurrence_type, recurrence_time)
-    )
+            error = None
+        if error in FCM_PERMANENT_ERRORS:
+            raise outbox.Undeliverable(f"FCM token rejected: {error}")
+        if error:
+            raise RuntimeError(f"FCM error: {error}")
+    except Exception as e:
+        DELIVERIES.inc(channel='fcm', kind='reminder', outcome='failed')
+        logger.error(f"FCM push failed: {e}")
+        raise
+    DELIVERIES.inc(channel='fcm', kind='reminder', outcome='sent')
 
 
 @asynccontextmanager
@@ -385,7 +563,11 @@ async def lifespan(app: FastAPI):
     """Application lifespan - start/stop background tasks."""
     # Startup
     await init_app_database()
-    scheduler_task = asyncio.create_task(reminder_scheduler())
+    jobs_task = None
+    if SCHEDULER_MODE in ('leader', 'sharded'):
+        jobs_task = asyncio.create_task(run_background_jobs())
+    else:
+        logger.info(f"Background jobs left to app_scheduler.py (SCHEDULER_MODE={SCHEDULER_MODE})")
     logger.info("Application started")
     
     yield
@@ -393,7 +575,12 @@ async def lifespan(app: FastAPI):
     # Shutdown
     global scheduler_running
     scheduler_running = False
-    scheduler_task.cancel()
+    if jobs_task:
+        # Lets run_as_leader release the lease so a standby takes over at once
+        jobs_task.cancel()
+        await asyncio.gather(jobs_task, return_exceptions=True)
+    await unimtx.aclose()
+    await fcm_client.aclose()
     logger.info("Application shutdown")
 
 
@@ -409,6 +596,52 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request, labelled by route template rather than raw path."""
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get('route')
+        HTTP_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, 'path', 'unmatched'),
+            status=status
+        )
+
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """Tag every log record for a request with its id and echo it back in X-Request-ID."""
+    request_id = request.headers.get('x-request-id') or uuid.uuid4().hex
+    with log_context(request_id=request_id):
+        response = await call_next(request)
+    response.headers['X-Request-ID'] = request_id
+    return response
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Run a sample of app requests under the profiler (see profiling.py)."""
+    if not request.url.path.startswith(PROFILED_PATH_PREFIX):
+        return await call_next(request)
+    with profiling.profile('api', f"{request.method} {request.url.path}"):
+        return await call_next(request)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics for this worker."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ===== Pydantic Models =====
 class LoginRequest(BaseModel):
     phone: str
@@ -500,6 +733,33 @@ class FCMTokenUpdate(BaseModel):
 
 
 # ===== Database Initialization =====
+
+# Columns added after the first release; older databases get them via ALTER TABLE
+APP_REMINDER_COLUMNS = {
+    "recurrence_rule": "TEXT",
+    "next_fire_utc": "TIMESTAMP",
+}
+APP_USER_COLUMNS = {
+    "token_version": "INTEGER DEFAULT 0",
+}
+
+# Append-only history of recurring reminder occurrences
+APP_OCCURRENCES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS app_reminder_occurrences (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reminder_id INTEGER NOT NULL,
+        scheduled_time_utc TIMESTAMP NOT NULL,
+        event TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+APP_OCCURRENCES_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_app_occurrences_reminder
+    ON app_reminder_occurrences(reminder_id)
+"""
+
+
 async def init_app_database():
     """Initialize app-specific tables."""
     db_type = "Turso" if USE_TURSO else "SQLite"
@@ -519,6 +779,7 @@ async def init_app_database():
                     timezone TEXT DEFAULT 'Asia/Tashkent',
                     language TEXT DEFAULT 'uz',
                     fcm_token TEXT,
+                    token_version INTEGER DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
@@ -536,6 +797,8 @@ async def init_app_database():
                     status TEXT DEFAULT 'pending',
                     recurrence_type TEXT,
                     recurrence_time TEXT,
+                    recurrence_rule TEXT,
+                    next_fire_utc TIMESTAMP,
                     initial_reminder_sent INTEGER DEFAULT 0,
                     follow_up_sent INTEGER DEFAULT 0,
                     audio_url TEXT,
@@ -545,6 +808,37 @@ async def init_app_database():
                 )
             """)
             
+            cursor.execute("PRAGMA table_info(app_users)")
+            existing = {row[1] for row in cursor.fetchall()}
+            for name, ddl in APP_USER_COLUMNS.items():
+                if name not in existing:
+                    cursor.execute(f"ALTER TABLE app_users ADD COLUMN {name} {ddl}")
+            
+            cursor.execute("PRAGMA table_info(app_reminders)")
+            existing = {row[1] for row in cursor.fetchall()}
+            for name, ddl in APP_REMINDER_COLUMNS.items():
+                if name not in existing:
+                    cursor.execute(f"ALTER TABLE app_reminders ADD COLUMN {name} {ddl}")
+            
+            cursor.execute(APP_OCCURRENCES_TABLE_SQL)
+            cursor.execute(APP_OCCURRENCES_INDEX_SQL)
+            
+            # Admin stats counters, kept current by triggers; backfilled on first run
+            for statement in app_stats.schema_statements("app_reminders", "app_users"):
+                cursor.execute(statement)
+            cursor.execute(app_stats.initialized_query("app_reminders"))
+            if not cursor.fetchone():
+                for statement in app_stats.rebuild_statements("app_reminders", "app_users"):
+                    cursor.execute(statement)
+            
+            # Analytics event log and rollups
+            for statement in rollups.schema_statements("app_reminders", "app_reminder_occurrences", "app_users", "id"):
+                cursor.execute(statement)
+            
+            # Queued push notifications
+            for statement in outbox.schema_statements("app_reminders"):
+                cursor.execute(statement)
+            
             conn.commit()
             conn.close()
             logger.info("Turso database initialized")
@@ -561,6 +855,7 @@ async def init_app_database():
                 timezone TEXT DEFAULT 'Asia/Tashkent',
                 language TEXT DEFAULT 'uz',
                 fcm_token TEXT,
+                token_version INTEGER DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
@@ -578,6 +873,8 @@ async def init_app_database():
                 status TEXT DEFAULT 'pending',
                 recurrence_type TEXT,
                 recurrence_time TEXT,
+                recurrence_rule TEXT,
+                next_fire_utc TIMESTAMP,
                 initial_reminder_sent INTEGER DEFAULT 0,
                 follow_up_sent INTEGER DEFAULT 0,
                 audio_url TEXT,
@@ -587,33 +884,122 @@ async def init_app_database():
             )
         """)
         
+        cursor = await db.execute("PRAGMA table_info(app_users)")
+        existing = {row[1] for row in await cursor.fetchall()}
+        for name, ddl in APP_USER_COLUMNS.items():
+            if name not in existing:
+                await db.execute(f"ALTER TABLE app_users ADD COLUMN {name} {ddl}")
+        
+        cursor = await db.execute("PRAGMA table_info(app_reminders)")
+        existing = {row[1] for row in await cursor.fetchall()}
+        for name, ddl in APP_REMINDER_COLUMNS.items():
+            if name not in existing:
+                await db.execute(f"ALTER TABLE app_reminders ADD COLUMN {name} {ddl}")
+        
+        await db.execute(APP_OCCURRENCES_TABLE_SQL)
+        await db.execute(APP_OCCURRENCES_INDEX_SQL)
+        
+        # Admin stats counters, kept current by triggers; backfilled on first run
+        for statement in app_stats.schema_statements("app_reminders", "app_users"):
+            await db.execute(statement)
+        cursor = await db.execute(app_stats.initialized_query("app_reminders"))
+        if not await cursor.fetchone():
+            for statement in app_stats.rebuild_statements("app_reminders", "app_users"):
+                await db.execute(statement)
+        
+        # Analytics event log and rollups
+        for statement in rollups.schema_statements("app_reminders", "app_reminder_occurrences", "app_users", "id"):
+            await db.execute(statement)
+        
+        # Queued push notifications
+        for statement in outbox.schema_statements("app_reminders"):
+            await db.execute(statement)
+        
         await db.commit()
         logger.info("SQLite database initialized")
 
 
 # ===== Utility Functions =====
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+async def check_password(user_id: int, password: str, password_hash: str) -> bool:
+    """Verify a login password; outdated hashes are upgraded in place."""
+    valid, new_hash = await passwords.verify_password(password, password_hash)
+    if new_hash:
+        query = "UPDATE app_users SET password_hash = ? WHERE id = ?"
+        conn = get_db_connection()
+        if conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (new_hash, user_id))
+            conn.commit()
+            conn.close()
+        else:
+            async with aiosqlite.connect(DATABASE_PATH) as db:
+                await db.execute(query, (new_hash, user_id))
+                await db.commit()
+        logger.info(f"Upgraded password hash for user {user_id}")
+    return valid
 
 
-def verify_password(password: str, password_hash: str) -> bool:
-    return hash_password(password) == password_hash
+# Verified tokens, so polling clients skip signature checks on every request
+token_cache = TokenCache()
 
+# user_id -> (token_version, monotonic time it was read)
+token_versions: Dict[int, Tuple[Optional[int], float]] = {}
 
-def create_jwt_token(user_id: int) -> str:
+
+async def get_token_version(user_id: int) -> Optional[int]:
+    """Current token_version of a user (None if the user no longer exists), cached briefly."""
+    cached = token_versions.get(user_id)
+    if cached and time.monotonic() - cached[1] < TOKEN_VERSION_TTL_SECONDS:
+        return cached[0]
+    
+    query = "SELECT token_version FROM app_users WHERE id = ?"
+    row = None
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        cursor.execute(query, (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+    else:
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            cursor = await db.execute(query, (user_id,))
+            row = await cursor.fetchone()
+    
+    version = (row[0] or 0) if row else None
+    token_versions[user_id] = (version, time.monotonic())
+    return version
+
+
+async def create_jwt_token(user_id: int) -> str:
     payload = {
         'user_id': user_id,
+        'ver': await get_token_version(user_id) or 0,
         'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
-def decode_jwt_token(token: str) -> Optional[int]:
+def decode_jwt_token(token: str) -> Optional[Tuple[int, int]]:
+    """
+    Verify a token, using the cache of recently verified tokens.
+    
+    Returns:
+        (user_id, token_version), or None if the token is invalid or expired.
+    """
+    cached = token_cache.get(token)
+    if cached:
+        return cached
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload.get('user_id')
-    except:
+    except jwt.PyJWTError:
+        return None
+    user_id = payload.get('user_id')
+    if not user_id:
         return None
+    # Tokens issued before token_version existed count as version 0
+    version = payload.get('ver', 0)
+    token_cache.put(token, user_id, payload['exp'], version)
+    return user_id, version
 
 
 async def get_current_user(authorization: Optional[str] = Header(None)) -> int:
@@ -624,11 +1010,15 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> int:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
     
     token = authorization[7:]
-    user_id = decode_jwt_token(token)
+    claims = decode_jwt_token(token)
     
-    if not user_id:
+    if not claims:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
+    user_id, version = claims
+    if version != await get_token_version(user_id):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    
     return user_id
 
 
@@ -658,7 +1048,8 @@ VAZIFA:
 
 FAQAT toza, to'g'irlangan matnni qaytar, boshqa hech narsa yo'q:"""
 
-        response = gemini_model.generate_content(prompt)
+        with GEMINI_LATENCY.time(operation='normalize'):
+            response = gemini_model.generate_content(prompt)
         normalized = response.text.strip()
         
         # Remove any markdown formatting or quotes Gemini might add
@@ -685,24 +1076,25 @@ async def transcribe_audio_elevenlabs(file_path: str, language: str = "uz") -> O
         return None
     
     try:
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+        client = ElevenLabs(api_key=ELEVENLABS_API_KEY, base_url=ELEVENLABS_API_BASE)
         
         with open(file_path, 'rb') as audio_file:
             # Always force Uzbek — we normalize to Latin/Russian after
             language_code = "uzb" if language == "uz" else "rus" if language == "ru" else "uzb"
             
-            result = client.speech_to_text.convert(
-                file=audio_file,
-                model_id="scribe_v2",
-                language_code=language_code
-            )
+            with STT_LATENCY.time(backend='elevenlabs'):
+                result = client.speech_to_text.convert(
+                    file=audio_file,
+                    model_id="scribe_v2",
+                    language_code=language_code
+                )
             
             raw_text = result.text.strip() if hasattr(result, 'text') else str(result).strip()
             
             if not raw_text:
                 return None
             
-            logger.info(f"ElevenLabs raw transcription (lang={language_code}): '{raw_text}'")
+            logger.debug(f"ElevenLabs raw transcription (lang={language_code}): '{raw_text}'")
             
             # Normalize: fix Cyrillic/Turkish/Kazakh → clean Uzbek Latin or Russian
             normalized = await normalize_transcription(raw_text)
@@ -721,10 +1113,10 @@ async def parse_with_gemini(text: str, user_timezone: str = DEFAULT_TIMEZONE) ->
     
     try:
         now_utc = datetime.utcnow()
-        logger.info(f"=== PARSE_WITH_GEMINI START ===")
-        logger.info(f"Current UTC time (server): {now_utc.strftime('%Y-%m-%d %H:%M:%S')}")
-        logger.info(f"User timezone: {user_timezone}")
-        logger.info(f"Input text: {text}")
+        logger.debug(f"=== PARSE_WITH_GEMINI START ===")
+        logger.debug(f"Current UTC time (server): {now_utc.strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.debug(f"User timezone: {user_timezone}")
+        logger.debug(f"Input text: {text}")
         
         # Use the same comprehensive prompt as gemini_parser.py
         prompt = f"""Siz O'zbekiston foydalanuvchilari uchun aqlli eslatma yordamchisisiz. Quyidagi matnni tahlil qiling va eslatma vazifalarini ajratib oling.
@@ -793,11 +1185,12 @@ Faqat JSON massivini qaytaring:
 Agar eslatma bo'lmasa: []
 """
         
-        response = gemini_model.generate_content(prompt)
+        with GEMINI_LATENCY.time(operation='parse'):
+            response = gemini_model.generate_content(prompt)
         result_text = response.text.strip()
         
-        logger.info(f"Gemini raw response: {result_text[:500]}")
-        logger.info(f"Time after Gemini call: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.debug(f"Gemini raw response: {result_text[:500]}")
+        logger.debug(f"Time after Gemini call: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}")
         
         # Extract JSON
         if "```json" in result_text:
@@ -817,11 +1210,11 @@ Agar eslatma bo'lmasa: []
                 continue
             
             time_str = r.get('time_utc', '')
-            logger.info(f"Processing reminder: task='{r.get('task')}', time_utc='{time_str}'")
+            logger.debug(f"Processing reminder: task='{r.get('task')}', time_utc='{time_str}'")
             try:
                 scheduled_time = datetime.strptime(time_str, '%Y-%m-%d %H:%M')
                 diff_seconds = (scheduled_time - now_utc).total_seconds()
-                logger.info(f"Raw scheduled time diff from now_utc: {diff_seconds:.0f} seconds ({diff_seconds/60:.1f} minutes)")
+                logger.debug(f"Raw scheduled time diff from now_utc: {diff_seconds:.0f} seconds ({diff_seconds/60:.1f} minutes)")
                 
                 # FIX: Gemini returns HH:MM without seconds, causing alarms to fire early.
                 # If the scheduled time is within 10 minutes of now, add the current seconds
@@ -834,7 +1227,7 @@ Agar eslatma bo'lmasa: []
                     if scheduled_time <= now_utc:
                         scheduled_time = scheduled_time + timedelta(minutes=1)
                     diff_seconds = (scheduled_time - now_utc).total_seconds()
-                    logger.info(f"Adjusted for seconds: new time = {scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}, diff = {diff_seconds:.0f}s")
+                    logger.debug(f"Adjusted for seconds: new time = {scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}, diff = {diff_seconds:.0f}s")
                     r['time_utc'] = scheduled_time.strftime('%Y-%m-%d %H:%M:%S')
                 
                 # If time is in the past for non-recurring, skip
@@ -853,7 +1246,7 @@ Agar eslatma bo'lmasa: []
                     logger.info(f"Rescheduled recurring reminder to: {r['time_utc']}")
                 
                 processed.append(r)
-                logger.info(f"FINAL scheduled_time_utc: {r['time_utc']}")
+                logger.debug(f"FINAL scheduled_time_utc: {r['time_utc']}")
             except ValueError as e:
                 logger.error(f"Failed to parse time '{time_str}': {e}")
                 continue
@@ -879,7 +1272,7 @@ async def register(data: RegisterRequest):
                 conn.close()
                 return AuthResponse(success=False, message="Telefon raqam allaqachon ro'yxatdan o'tgan")
             
-            password_hash = hash_password(data.password)
+            password_hash = await passwords.hash_password(data.password)
             cursor.execute(
                 "INSERT INTO app_users (phone, password_hash, name) VALUES (?, ?, ?)",
                 (data.phone, password_hash, data.name)
@@ -895,7 +1288,7 @@ async def register(data: RegisterRequest):
             conn.close()
             
             user = UserResponse(id=row[0], phone=row[1], name=row[2], timezone=row[3], language=row[4], created_at=str(row[5]))
-            token = create_jwt_token(user_id)
+            token = await create_jwt_token(user_id)
             return AuthResponse(success=True, user=user, token=token)
     
     # Fallback to aiosqlite
@@ -904,7 +1297,7 @@ async def register(data: RegisterRequest):
         if await cursor.fetchone():
             return AuthResponse(success=False, message="Telefon raqam allaqachon ro'yxatdan o'tgan")
         
-        password_hash = hash_password(data.password)
+        password_hash = await passwords.hash_password(data.password)
         cursor = await db.execute(
             "INSERT INTO app_users (phone, password_hash, name) VALUES (?, ?, ?)",
             (data.phone, password_hash, data.name)
@@ -919,7 +1312,7 @@ async def register(data: RegisterRequest):
         row = await cursor.fetchone()
         
         user = UserResponse(id=row[0], phone=row[1], name=row[2], timezone=row[3], language=row[4], created_at=str(row[5]))
-        token = create_jwt_token(user_id)
+        token = await create_jwt_token(user_id)
         return AuthResponse(success=True, user=user, token=token)
 
 
@@ -940,11 +1333,11 @@ async def login(data: LoginRequest):
             if not row:
                 return AuthResponse(success=False, message="Telefon raqam yoki parol noto'g'ri")
             
-            if not verify_password(data.password, row[2]):
+            if not await check_password(row[0], data.password, row[2]):
                 return AuthResponse(success=False, message="Telefon raqam yoki parol noto'g'ri")
             
             user = UserResponse(id=row[0], phone=row[1], name=row[3], timezone=row[4], language=row[5], created_at=str(row[6]))
-            token = create_jwt_token(row[0])
+            token = await create_jwt_token(row[0])
             return AuthResponse(success=True, user=user, token=token)
     
     async with aiosqlite.connect(DATABASE_PATH) as db:
@@ -957,14 +1350,36 @@ async def login(data: LoginRequest):
         if not row:
             return AuthResponse(success=False, message="Telefon raqam yoki parol noto'g'ri")
         
-        if not verify_password(data.password, row[2]):
+        if not await check_password(row[0], data.password, row[2]):
             return AuthResponse(success=False, message="Telefon raqam yoki parol noto'g'ri")
         
         user = UserResponse(id=row[0], phone=row[1], name=row[3], timezone=row[4], language=row[5], created_at=str(row[6]))
-        token = create_jwt_token(row[0])
+        token = await create_jwt_token(row[0])
         return AuthResponse(success=True, user=user, token=token)
 
 
+@app.post("/api/auth/logout-all")
+async def logout_all(user_id: int = Depends(get_current_user)):
+    """Revoke every token issued to the current user."""
+    query = "UPDATE app_users SET token_version = IFNULL(token_version, 0) + 1 WHERE id = ?"
+    
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        cursor.execute(query, (user_id,))
+        conn.commit()
+        conn.close()
+    else:
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            await db.execute(query, (user_id,))
+            await db.commit()
+    
+    # Drop the cached version so this worker rejects old tokens immediately
+    token_versions.pop(user_id, None)
+    logger.info(f"Revoked all tokens for user {user_id}")
+    return {"success": True}
+
+
 @app.post("/api/auth/send-otp", response_model=OtpResponse)
 async def send_otp(data: OtpRequest):
     """Send OTP code to phone number via Unimtx SMS."""
@@ -984,55 +1399,32 @@ async def send_otp(data: OtpRequest):
         else:
             phone = '+' + phone
     
-    logger.info(f"Send OTP request for phone: {phone}")
+    logger.debug(f"Send OTP request for phone: {phone}")
+    
+    # Throttle resends per phone; the code itself is kept locally only in dev mode
+    otp_code = None if UNIMTX_ENABLED else str(random.randint(100000, 999999))
+    retry_after = await otp_store.issue(phone, otp_code)
+    if retry_after:
+        return OtpResponse(success=False, message=f"Iltimos, {retry_after} soniya kuting")
     
     if UNIMTX_ENABLED:
-        # Use Unimtx OTP API
+        # Use Unimtx OTP API; a failed send must not hold the user to the resend wait
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{UNIMTX_API_BASE}/?action=otp.send&accessKeyId={UNIMTX_ACCESS_KEY_ID}",
-                    json={
-                        "to": phone,
-                        "channel": "sms",
-                        "digits": 6,
-                        "ttl": 300,
-                    },
-                    headers={"Content-Type": "application/json"}
-                )
-                result = response.json()
-                logger.info(f"Unimtx send OTP response for {phone}: code={result.get('code')}, message={result.get('message')}")
-                
-                if result.get("code") == "0":
-                    return OtpResponse(success=True, message="Tasdiqlash kodi yuborildi")
-                else:
-                    error_msg = result.get("message", "Unknown error")
-                    logger.error(f"Unimtx OTP failed: {error_msg}")
-                    return OtpResponse(success=False, message=f"SMS yuborishda xatolik: {error_msg}")
-        except Exception as e:
+            result = await unimtx.send_otp(phone)
+        except UnimtxUnavailable as e:
             logger.error(f"Unimtx OTP exception: {e}")
+            await otp_store.release(phone)
             return OtpResponse(success=False, message="SMS xizmatida xatolik yuz berdi")
-    else:
-        # Fallback: local OTP generation (for development)
-        now = datetime.utcnow()
-        
-        # Clean expired OTPs
-        expired_phones = [p for p, v in otp_storage.items() if v["expires"] < now]
-        for p in expired_phones:
-            del otp_storage[p]
         
-        # Rate limiting
-        if phone in otp_storage:
-            time_since_sent = now - (otp_storage[phone]["expires"] - timedelta(minutes=5))
-            if time_since_sent.total_seconds() < 60:
-                return OtpResponse(success=False, message="Iltimos, 60 soniya kuting")
-        
-        otp_code = str(random.randint(100000, 999999))
-        otp_storage[phone] = {
-            "code": otp_code,
-            "expires": now + timedelta(minutes=5),
-            "attempts": 0
-        }
+        logger.debug(f"Unimtx send OTP response for {phone}: code={result.get('code')}, message={result.get('message')}")
+        if result.get("code") == "0":
+            return OtpResponse(success=True, message="Tasdiqlash kodi yuborildi")
+        error_msg = result.get("message", "Unknown error")
+        logger.error(f"Unimtx OTP failed: {error_msg}")
+        await otp_store.release(phone)
+        return OtpResponse(success=False, message=f"SMS yuborishda xatolik: {error_msg}")
+    else:
+        # Fallback: code generated above is logged (for development)
         logger.info(f"[DEV] OTP for {phone}: {otp_code}")
         return OtpResponse(success=True, message="Tasdiqlash kodi yuborildi")
 
@@ -1055,57 +1447,40 @@ async def verify_otp(data: OtpVerifyRequest):
         else:
             phone = '+' + phone
     
-    logger.info(f"Verify OTP request for phone: {phone}, code: {otp_code}")
+    logger.debug(f"Verify OTP request for phone: {phone}")
     
     # Verify OTP via Unimtx or locally
     otp_valid = False
     
     if UNIMTX_ENABLED:
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{UNIMTX_API_BASE}/?action=otp.verify&accessKeyId={UNIMTX_ACCESS_KEY_ID}",
-                    json={
-                        "to": phone,
-                        "code": otp_code,
-                    },
-                    headers={"Content-Type": "application/json"}
-                )
-                result = response.json()
-                logger.info(f"Unimtx verify OTP response for {phone}: {result}")
-                
-                if result.get("code") == "0" and result.get("data", {}).get("valid") is True:
-                    otp_valid = True
-                else:
-                    return AuthResponse(success=False, message="Kod noto'g'ri yoki muddati tugagan")
-        except Exception as e:
-            logger.error(f"Unimtx verify exception: {e}")
-            return AuthResponse(success=False, message="Tekshirishda xatolik yuz berdi")
+        # Unimtx holds the code; attempts are limited here, before it is asked
+        status, remaining = await otp_store.count_attempt(phone)
+        if status == PENDING:
+            try:
+                result = await unimtx.verify_otp(phone, otp_code)
+            except UnimtxUnavailable as e:
+                logger.error(f"Unimtx verify exception: {e}")
+                return AuthResponse(success=False, message="Tekshirishda xatolik yuz berdi")
+            
+            logger.debug(f"Unimtx verify OTP response for {phone}: {result}")
+            if result.get("code") != "0" or (result.get("data") or {}).get("valid") is not True:
+                return AuthResponse(success=False, message=f"Kod noto'g'ri yoki muddati tugagan. {remaining} ta urinish qoldi")
+            await otp_store.release(phone)
+            status = VERIFIED
     else:
         # Local verification fallback (for development)
-        now = datetime.utcnow()
-        
-        if phone not in otp_storage:
-            return AuthResponse(success=False, message="Kod topilmadi. Qayta urinib ko'ring")
-        
-        stored = otp_storage[phone]
-        
-        if stored["expires"] < now:
-            del otp_storage[phone]
-            return AuthResponse(success=False, message="Kod muddati tugagan. Qayta yuborish tugmasini bosing")
-        
-        if stored["attempts"] >= 5:
-            del otp_storage[phone]
-            return AuthResponse(success=False, message="Ko'p marta noto'g'ri kiritildi. Qayta yuborish tugmasini bosing")
-        
-        if stored["code"] != otp_code:
-            otp_storage[phone]["attempts"] += 1
-            remaining = 5 - otp_storage[phone]["attempts"]
-            return AuthResponse(success=False, message=f"Kod noto'g'ri. {remaining} ta urinish qoldi")
-        
-        # Valid - clean up
-        del otp_storage[phone]
-        otp_valid = True
+        status, remaining = await otp_store.verify(phone, otp_code)
+    
+    if status == NOT_FOUND:
+        return AuthResponse(success=False, message="Kod topilmadi. Qayta urinib ko'ring")
+    if status == EXPIRED:
+        return AuthResponse(success=False, message="Kod muddati tugagan. Qayta yuborish tugmasini bosing")
+    if status == LOCKED:
+        return AuthResponse(success=False, message="Ko'p marta noto'g'ri kiritildi. Qayta yuborish tugmasini bosing")
+    if status != VERIFIED:
+        return AuthResponse(success=False, message=f"Kod noto'g'ri. {remaining} ta urinish qoldi")
+    
+    otp_valid = True
     
     if not otp_valid:
         return AuthResponse(success=False, message="Kod noto'g'ri")
@@ -1127,11 +1502,11 @@ async def verify_otp(data: OtpVerifyRequest):
                 if not row:
                     return AuthResponse(success=False, message="Foydalanuvchi topilmadi")
                 
-                if data.password and not verify_password(data.password, row[2]):
+                if data.password and not await check_password(row[0], data.password, row[2]):
                     return AuthResponse(success=False, message="Parol noto'g'ri")
                 
                 user = UserResponse(id=row[0], phone=row[1], name=row[3], timezone=row[4], language=row[5], created_at=str(row[6]))
-                token = create_jwt_token(row[0])
+                token = await create_jwt_token(row[0])
                 return AuthResponse(success=True, user=user, token=token)
         
         async with aiosqlite.connect(DATABASE_PATH) as db:
@@ -1144,11 +1519,11 @@ async def verify_otp(data: OtpVerifyRequest):
             if not row:
                 return AuthResponse(success=False, message="Foydalanuvchi topilmadi")
             
-            if data.password and not verify_password(data.password, row[2]):
+            if data.password and not await check_password(row[0], data.password, row[2]):
                 return AuthResponse(success=False, message="Parol noto'g'ri")
             
             user = UserResponse(id=row[0], phone=row[1], name=row[3], timezone=row[4], language=row[5], created_at=str(row[6]))
-            token = create_jwt_token(row[0])
+            token = await create_jwt_token(row[0])
             return AuthResponse(success=True, user=user, token=token)
     else:
         # Registration flow - create new user
@@ -1164,7 +1539,7 @@ async def verify_otp(data: OtpVerifyRequest):
                     conn.close()
                     return AuthResponse(success=False, message="Telefon raqam allaqachon ro'yxatdan o'tgan")
                 
-                password_hash = hash_password(data.password)
+                password_hash = await passwords.hash_password(data.password)
                 cursor.execute(
                     "INSERT INTO app_users (phone, password_hash, name) VALUES (?, ?, ?)",
                     (phone, password_hash, data.name)
@@ -1180,7 +1555,7 @@ async def verify_otp(data: OtpVerifyRequest):
                 conn.close()
                 
                 user = UserResponse(id=row[0], phone=row[1], name=row[2], timezone=row[3], language=row[4], created_at=str(row[5]))
-                token = create_jwt_token(user_id)
+                token = await create_jwt_token(user_id)
                 return AuthResponse(success=True, user=user, token=token)
         
         async with aiosqlite.connect(DATABASE_PATH) as db:
@@ -1188,7 +1563,7 @@ async def verify_otp(data: OtpVerifyRequest):
             if await cursor.fetchone():
                 return AuthResponse(success=False, message="Telefon raqam allaqachon ro'yxatdan o'tgan")
             
-            password_hash = hash_password(data.password)
+            password_hash = await passwords.hash_password(data.password)
             cursor = await db.execute(
                 "INSERT INTO app_users (phone, password_hash, name) VALUES (?, ?, ?)",
                 (phone, password_hash, data.name)
@@ -1203,7 +1578,7 @@ async def verify_otp(data: OtpVerifyRequest):
             row = await cursor.fetchone()
             
             user = UserResponse(id=row[0], phone=row[1], name=row[2], timezone=row[3], language=row[4], created_at=str(row[5]))
-            token = create_jwt_token(user_id)
+            token = await create_jwt_token(user_id)
             return AuthResponse(success=True, user=user, token=token)
 
 
@@ -1363,6 +1738,17 @@ async def get_reminders(
         return {"success": True, "reminders": reminders}
 
 
+def build_reminder_rule(data: ReminderCreate, user_timezone: str) -> Optional[str]:
+    """Build the recurrence rule for a new reminder, anchored on its first occurrence."""
+    if not data.recurrence_type:
+        return None
+    try:
+        anchor = datetime.fromisoformat(data.scheduled_time.replace('Z', ''))
+    except ValueError:
+        anchor = None
+    return build_rule(data.recurrence_type, data.recurrence_time, anchor, user_timezone)
+
+
 @app.post("/api/reminders")
 async def create_reminder(
     data: ReminderCreate,
@@ -1376,15 +1762,16 @@ async def create_reminder(
             cursor.execute("SELECT timezone FROM app_users WHERE id = ?", (user_id,))
             row = cursor.fetchone()
             user_timezone = row[0] if row else DEFAULT_TIMEZONE
+            recurrence_rule = build_reminder_rule(data, user_timezone)
             
             cursor.execute(
                 """
                 INSERT INTO app_reminders (user_id, task_text, notes, location, scheduled_time_utc, 
-                                           user_timezone, recurrence_type, recurrence_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                           user_timezone, recurrence_type, recurrence_time, recurrence_rule)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (user_id, data.task_text, data.notes, data.location, data.scheduled_time,
-                 user_timezone, data.recurrence_type, data.recurrence_time)
+                 user_timezone, data.recurrence_type, data.recurrence_time, recurrence_rule)
             )
             conn.commit()
             reminder_id = cursor.lastrowid
@@ -1407,15 +1794,16 @@ async def create_reminder(
         cursor = await db.execute("SELECT timezone FROM app_users WHERE id = ?", (user_id,))
         row = await cursor.fetchone()
         user_timezone = row[0] if row else DEFAULT_TIMEZONE
+        recurrence_rule = build_reminder_rule(data, user_timezone)
         
         cursor = await db.execute(
             """
             INSERT INTO app_reminders (user_id, task_text, notes, location, scheduled_time_utc, 
-                                       user_timezone, recurrence_type, recurrence_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                       user_timezone, recurrence_type, recurrence_time, recurrence_rule)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (user_id, data.task_text, data.notes, data.location, data.scheduled_time,
-             user_timezone, data.recurrence_type, data.recurrence_time)
+             user_timezone, data.recurrence_type, data.recurrence_time, recurrence_rule)
         )
         await db.commit()
         reminder_id = cursor.lastrowid
@@ -1514,39 +1902,82 @@ async def create_reminder_from_voice(
         os.unlink(tmp_path)
 
 
+ADVANCE_RECURRENCE_SQL = """
+    UPDATE app_reminders
+    SET scheduled_time_utc = ?, next_fire_utc = NULL, initial_reminder_sent = 0,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+
+def next_slot_for_completion(reminder: dict) -> Optional[datetime]:
+    """Return the slot a completed recurring reminder moves to, or None for one-off reminders."""
+    if not reminder.get('recurrence_type'):
+        return None
+    if reminder.get('next_fire_utc'):
+        next_fire = datetime.fromisoformat(reminder['next_fire_utc'])
+        if next_fire > datetime.utcnow():
+            return next_fire
+    return next_fire_for_reminder(reminder)
+
+
 @app.patch("/api/reminders/{reminder_id}/status")
 async def update_reminder_status(
     reminder_id: int,
     status: str = Body(..., embed=True),
     user_id: int = Depends(get_current_user)
 ):
-    """Update reminder status."""
+    """Update reminder status. Completing a recurring reminder moves it to its next slot."""
+    select_sql = """
+        SELECT id, scheduled_time_utc, user_timezone, recurrence_type, recurrence_time,
+               recurrence_rule, next_fire_utc
+        FROM app_reminders WHERE id = ? AND user_id = ?
+    """
+    
     if USE_TURSO and LIBSQL_AVAILABLE:
         conn = get_db_connection()
         if conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT id FROM app_reminders WHERE id = ? AND user_id = ?", (reminder_id, user_id))
-            if not cursor.fetchone():
+            cursor.execute(select_sql, (reminder_id, user_id))
+            reminder = row_to_dict(cursor, cursor.fetchone())
+            if not reminder:
                 conn.close()
                 raise HTTPException(status_code=404, detail="Reminder not found")
             
-            cursor.execute(
-                "UPDATE app_reminders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (status, reminder_id)
-            )
+            next_fire = next_slot_for_completion(reminder) if status == 'done' else None
+            if next_fire:
+                cursor.execute(ADVANCE_RECURRENCE_SQL, (next_fire.isoformat(), reminder_id))
+                cursor.execute(
+                    "INSERT INTO app_reminder_occurrences (reminder_id, scheduled_time_utc, event) VALUES (?, ?, 'done')",
+                    (reminder_id, reminder['scheduled_time_utc'])
+                )
+            else:
+                cursor.execute(
+                    "UPDATE app_reminders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (status, reminder_id)
+                )
             conn.commit()
             conn.close()
             return {"success": True, "message": "Status updated"}
     
     async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("SELECT id FROM app_reminders WHERE id = ? AND user_id = ?", (reminder_id, user_id))
-        if not await cursor.fetchone():
+        cursor = await db.execute(select_sql, (reminder_id, user_id))
+        reminder = row_to_dict(cursor, await cursor.fetchone())
+        if not reminder:
             raise HTTPException(status_code=404, detail="Reminder not found")
         
-        await db.execute(
-            "UPDATE app_reminders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (status, reminder_id)
-        )
+        next_fire = next_slot_for_completion(reminder) if status == 'done' else None
+        if next_fire:
+            await db.execute(ADVANCE_RECURRENCE_SQL, (next_fire.isoformat(), reminder_id))
+            await db.execute(
+                "INSERT INTO app_reminder_occurrences (reminder_id, scheduled_time_utc, event) VALUES (?, ?, 'done')",
+                (reminder_id, reminder['scheduled_time_utc'])
+            )
+        else:
+            await db.execute(
+                "UPDATE app_reminders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, reminder_id)
+            )
         await db.commit()
         return {"success": True, "message": "Status updated"}
 
@@ -1644,28 +2075,28 @@ def verify_admin(password: str = Query(...)):
 
 
 @app.get("/admin/api/stats")
-async def admin_stats(authorized: bool = Depends(verify_admin)):
-    """Get dashboard stats."""
+async def admin_stats(
+    authorized: bool = Depends(verify_admin),
+    users_limit: int = Query(50, ge=1, le=500),
+    users_offset: int = Query(0, ge=0)
+):
+    """Get dashboard stats from the precomputed counters, with a page of users."""
     stats = {
         "total_users": 0, "total_reminders": 0, "pending_reminders": 0,
         "done_reminders": 0, "today_reminders": 0, "today_users": 0,
-        "users": [], "recent_reminders": []
-    }
-    
-    queries = {
-        "total_users": "SELECT COUNT(*) FROM app_users",
-        "total_reminders": "SELECT COUNT(*) FROM app_reminders",
-        "pending_reminders": "SELECT COUNT(*) FROM app_reminders WHERE status = 'pending'",
-        "done_reminders": "SELECT COUNT(*) FROM app_reminders WHERE status = 'done'",
-        "today_reminders": "SELECT COUNT(*) FROM app_reminders WHERE DATE(created_at) = DATE('now')",
-        "today_users": "SELECT COUNT(*) FROM app_users WHERE DATE(created_at) = DATE('now')",
+        "users": [], "recent_reminders": [],
+        "users_limit": users_limit, "users_offset": users_offset
     }
+    today = datetime.utcnow().date().isoformat()
     
-    users_query = """
+    users_query = f"""
         SELECT u.id, u.phone, u.name, u.timezone, u.language, u.created_at,
-            (SELECT COUNT(*) FROM app_reminders WHERE user_id = u.id) as reminder_count,
-            (SELECT COUNT(*) FROM app_reminders WHERE user_id = u.id AND status = 'pending') as pending_count
-        FROM app_users u ORDER BY u.created_at DESC
+            IFNULL(s.total, 0) as reminder_count,
+            IFNULL(s.pending, 0) as pending_count
+        FROM app_users u
+        LEFT JOIN {app_stats.users_table_name("app_reminders")} s ON s.user_id = u.id
+        ORDER BY u.created_at DESC
+        LIMIT ? OFFSET ?
     """
     
     reminders_query = """
@@ -1680,12 +2111,12 @@ async def admin_stats(authorized: bool = Depends(verify_admin)):
         conn = get_db_connection()
         if conn:
             cursor = conn.cursor()
-            for key, q in queries.items():
-                cursor.execute(q)
-                row = cursor.fetchone()
-                stats[key] = row[0] if row else 0
+            cursor.execute(app_stats.totals_query("app_reminders"))
+            totals = dict(cursor.fetchall())
+            cursor.execute(app_stats.daily_query("app_reminders"), (today,))
+            stats.update(app_stats.summarize(totals, dict(cursor.fetchall())))
             
-            cursor.execute(users_query)
+            cursor.execute(users_query, (users_limit, users_offset))
             for row in cursor.fetchall():
                 stats["users"].append({
                     "id": row[0], "phone": row[1], "name": row[2],
@@ -1704,12 +2135,12 @@ async def admin_stats(authorized: bool = Depends(verify_admin)):
     else:
         import aiosqlite as aiosqlite_mod
         async with aiosqlite_mod.connect(DATABASE_PATH) as db:
-            for key, q in queries.items():
-                cursor = await db.execute(q)
-                row = await cursor.fetchone()
-                stats[key] = row[0] if row else 0
+            cursor = await db.execute(app_stats.totals_query("app_reminders"))
+            totals = dict(await cursor.fetchall())
+            cursor = await db.execute(app_stats.daily_query("app_reminders"), (today,))
+            stats.update(app_stats.summarize(totals, dict(await cursor.fetchall())))
             
-            cursor = await db.execute(users_query)
+            cursor = await db.execute(users_query, (users_limit, users_offset))
             for row in await cursor.fetchall():
                 stats["users"].append({
                     "id": row[0], "phone": row[1], "name": row[2],
@@ -1725,6 +2156,7 @@ async def admin_stats(authorized: bool = Depends(verify_admin)):
                     "recurrence": row[5], "user_name": row[6], "user_phone": row[7]
                 })
     
+    stats["scheduler"] = await scheduler_status()
     return stats
 
 
@@ -1764,6 +2196,98 @@ async def admin_user_reminders(user_id: int, authorized: bool = Depends(verify_a
     return {"reminders": reminders}
 
 
+@app.get("/admin/api/sms")
+async def admin_sms(authorized: bool = Depends(verify_admin)):
+    """Get Unimtx circuit breaker state and call latency per action."""
+    return {"enabled": UNIMTX_ENABLED, **unimtx.stats()}
+
+
+@app.get("/admin/api/log-levels")
+async def admin_log_levels(authorized: bool = Depends(verify_admin)):
+    """Get the explicitly configured logger levels."""
+    return {"levels": get_levels()}
+
+
+@app.put("/admin/api/log-levels")
+async def admin_set_log_levels(
+    levels: Dict[str, str] = Body(...),
+    authorized: bool = Depends(verify_admin)
+):
+    """
+    Change logger levels on this worker without a restart.
+    
+    Body is a mapping of logger name ('root' for the root logger) to level,
+    e.g. {"scheduler": "DEBUG", "httpx": "WARNING"}.
+    """
+    try:
+        applied = set_levels(levels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Log levels changed: {applied}")
+    return {"levels": get_levels()}
+
+
+@app.get("/admin/api/profiling")
+async def admin_profiling(authorized: bool = Depends(verify_admin)):
+    """Get the profiling settings and the available backends."""
+    return {"settings": profiling.get_settings(), "backends": list(profiling.BACKENDS)}
+
+
+@app.put("/admin/api/profiling")
+async def admin_set_profiling(
+    changes: Dict[str, object] = Body(...),
+    authorized: bool = Depends(verify_admin)
+):
+    """
+    Change profiling settings for the API workers and the bot without a restart.
+    
+    Body holds any of enabled, sample_rate, min_duration_ms, max_files and
+    backend, e.g. {"enabled": true, "sample_rate": 0.2}.
+    """
+    try:
+        settings = profiling.set_settings(changes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Profiling settings changed: {changes}")
+    return {"settings": settings, "backends": list(profiling.BACKENDS)}
+
+
+@app.get("/admin/api/profiles")
+async def admin_profiles(authorized: bool = Depends(verify_admin)):
+    """List saved profiles, newest first."""
+    return {"profiles": profiling.list_profiles()}
+
+
+@app.get("/admin/api/profiles/{name}")
+async def admin_download_profile(name: str, authorized: bool = Depends(verify_admin)):
+    """Download a saved profile (pyinstrument HTML or cProfile stats)."""
+    path = profiling.profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/html" if name.endswith('.html') else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@app.get("/admin/api/rollups")
+async def admin_rollups(
+    authorized: bool = Depends(verify_admin),
+    granularity: str = Query('daily'),
+    days: int = Query(90, ge=1, le=366),
+    event: Optional[str] = Query(None),
+    group_by: Optional[str] = Query(None)
+):
+    """Get a reminder activity time series from the analytics rollups."""
+    try:
+        series = await asyncio.to_thread(
+            rollups.query_rollup, sync_db_connection, "app_reminders",
+            granularity, days, event, group_by
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"series": series}
+
+
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_dashboard():
     """Serve admin dashboard HTML."""
@@ -1829,6 +2353,16 @@ tr:hover td { background: #263044; }
 .modal .close-btn { float: right; background: #334155; border: none; color: #e2e8f0; padding: 6px 12px; border-radius: 6px; cursor: pointer; }
 .modal .close-btn:hover { background: #475569; }
 
+.chart { display: flex; align-items: flex-end; gap: 2px; height: 160px; background: #1e293b; border: 1px solid #334155; border-radius: 12px; padding: 16px; }
+.chart .bar { flex: 1; display: flex; flex-direction: column-reverse; min-width: 2px; height: 100%; }
+.chart .bar div { width: 100%; }
+.chart .created { background: #3b82f6; }
+.chart .completed { background: #22c55e; }
+.legend { display: flex; gap: 16px; margin-top: 8px; font-size: 13px; color: #94a3b8; }
+.legend span::before { content: ''; display: inline-block; width: 10px; height: 10px; border-radius: 2px; margin-right: 6px; }
+.legend .created::before { background: #3b82f6; }
+.legend .completed::before { background: #22c55e; }
+
 .refresh-btn { background: #334155; border: none; color: #e2e8f0; padding: 8px 16px; border-radius: 8px; cursor: pointer; font-size: 14px; }
 .refresh-btn:hover { background: #475569; }
 
@@ -1876,6 +2410,14 @@ tr:hover td { background: #263044; }
       <div class="stat-card"><div class="label">Bajarildi</div><div class="value green" id="statDone">-</div></div>
       <div class="stat-card"><div class="label">Bugun eslatmalar</div><div class="value red" id="statToday">-</div></div>
       <div class="stat-card"><div class="label">Bugun yangi users</div><div class="value blue" id="statTodayUsers">-</div></div>
+      <div class="stat-card"><div class="label">Scheduler (p99 kechikish)</div><div class="value green" id="statScheduler">-</div><div class="label" id="statSchedulerInfo"></div></div>
+    </div>
+
+    <!-- Activity (last 90 days, from the analytics rollups) -->
+    <div class="section">
+      <h2>Faollik (90 kun)</h2>
+      <div class="chart" id="activityChart"></div>
+      <div class="legend"><span class="created">Yaratilgan</span><span class="completed">Bajarilgan</span></div>
     </div>
 
     <!-- Users -->
@@ -1885,6 +2427,10 @@ tr:hover td { background: #263044; }
         <thead><tr><th>ID</th><th>Ism</th><th>Telefon</th><th>Til</th><th>Eslatmalar</th><th>Kutilmoqda</th><th>Ro'yxatdan o'tgan</th></tr></thead>
         <tbody id="usersTable"></tbody>
       </table>
+      <div style="display:flex;gap:8px;justify-content:flex-end;margin-top:12px;">
+        <button class="refresh-btn" id="usersPrev" onclick="changeUsersPage(-1)">← Oldingi</button>
+        <button class="refresh-btn" id="usersNext" onclick="changeUsersPage(1)">Keyingi →</button>
+      </div>
     </div>
 
     <!-- Recent Reminders -->
@@ -1912,17 +2458,29 @@ tr:hover td { background: #263044; }
 
 <script>
 let adminPassword = '';
+let usersOffset = 0;
+const USERS_PAGE = 50;
 const API = window.location.origin;
 
+function statsUrl() {
+  return `${API}/admin/api/stats?password=${encodeURIComponent(adminPassword)}&users_limit=${USERS_PAGE}&users_offset=${usersOffset}`;
+}
+
+function changeUsersPage(step) {
+  usersOffset = Math.max(0, usersOffset + step * USERS_PAGE);
+  loadData();
+}
+
 function login() {
   adminPassword = document.getElementById('passwordInput').value;
-  fetch(`${API}/admin/api/stats?password=${encodeURIComponent(adminPassword)}`)
+  fetch(statsUrl())
     .then(r => { if (!r.ok) throw new Error('bad'); return r.json(); })
     .then(data => {
       localStorage.setItem('levi_admin_pw', adminPassword);
       document.getElementById('loginScreen').style.display = 'none';
       document.getElementById('dashboard').style.display = 'block';
       renderData(data);
+      loadActivity();
     })
     .catch(() => {
       document.getElementById('loginError').style.display = 'block';
@@ -1938,10 +2496,34 @@ function logout() {
 }
 
 function loadData() {
-  fetch(`${API}/admin/api/stats?password=${encodeURIComponent(adminPassword)}`)
+  fetch(statsUrl())
     .then(r => r.json())
     .then(renderData)
     .catch(e => console.error('Load failed:', e));
+  loadActivity();
+}
+
+function loadActivity() {
+  fetch(`${API}/admin/api/rollups?password=${encodeURIComponent(adminPassword)}&days=90`)
+    .then(r => r.json())
+    .then(data => renderActivity(data.series))
+    .catch(e => console.error('Activity load failed:', e));
+}
+
+function renderActivity(series) {
+  const days = {};
+  series.forEach(row => {
+    days[row.bucket] = days[row.bucket] || {created: 0, completed: 0};
+    if (row.event in days[row.bucket]) days[row.bucket][row.event] += row.count;
+  });
+  const buckets = Object.keys(days).sort();
+  const peak = Math.max(1, ...buckets.map(d => days[d].created + days[d].completed));
+  document.getElementById('activityChart').innerHTML = buckets.map(d => `
+    <div class="bar" title="${d}: ${days[d].created} / ${days[d].completed}">
+      <div class="created" style="height:${days[d].created / peak * 100}%"></div>
+      <div class="completed" style="height:${days[d].completed / peak * 100}%"></div>
+    </div>
+  `).join('');
 }
 
 function renderData(data) {
@@ -1951,7 +2533,19 @@ function renderData(data) {
   document.getElementById('statDone').textContent = data.done_reminders;
   document.getElementById('statToday').textContent = data.today_reminders;
   document.getElementById('statTodayUsers').textContent = data.today_users;
-  document.getElementById('usersCount').textContent = data.users.length;
+  const sched = data.scheduler;
+  const schedEl = document.getElementById('statScheduler');
+  const standby = sched.role === 'standby';
+  schedEl.textContent = standby ? 'standby' : `${sched.lag_p99.toFixed(1)}s`;
+  schedEl.className = 'value ' + (sched.status === 'ok' ? 'green' : 'red');
+  document.getElementById('statSchedulerInfo').textContent = sched.status !== 'ok'
+    ? sched.reasons.join('; ')
+    : standby
+      ? `leader ${sched.leader}`
+      : `p50 ${sched.lag_p50.toFixed(1)}s · p95 ${sched.lag_p95.toFixed(1)}s`;
+  document.getElementById('usersCount').textContent = data.total_users;
+  document.getElementById('usersPrev').disabled = data.users_offset === 0;
+  document.getElementById('usersNext').disabled = data.users_offset + data.users.length >= data.total_users;
   document.getElementById('remindersCount').textContent = data.recent_reminders.length;
 
   // Users table
@@ -2037,9 +2631,11 @@ setInterval(() => {
 # ===== Health Check =====
 @app.get("/api/health")
 async def health_check():
+    scheduler = await scheduler_status()
     return {
-        "status": "ok",
+        "status": "degraded" if scheduler["status"] == DEGRADED else "ok",
         "timestamp": datetime.utcnow().isoformat(),
+        "scheduler": scheduler,
         "features": {
             "turso": USE_TURSO and LIBSQL_AVAILABLE,
             "gemini": gemini_model is not None,
@@ -0,0 +1,54 @@
+"""
+Standalone scheduler for the mobile app API.
+Runs the reminder and rollup jobs without serving HTTP, so the web app can
+be scaled out with its own background jobs switched off:
+
+    SCHEDULER_MODE=off uvicorn api_server:app --workers 4
+    python app_scheduler.py
+
+It still takes the scheduler lease, so a second copy (or a web worker left
+in 'leader' mode) stands by instead of sending duplicate pushes. With
+SCHEDULER_MODE=sharded every copy sends the reminders of its share of the
+user_id shards, so delivery scales with the number of copies:
+
+    SCHEDULER_MODE=sharded python app_scheduler.py   # on each core/node
+"""
+
+import asyncio
+import logging
+import os
+import signal
+
+import api_server
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics exporter port (0 disables it)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+
+
+async def main():
+    await api_server.init_app_database()
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    jobs = asyncio.create_task(api_server.run_background_jobs())
+    logger.info(f"App scheduler started (SCHEDULER_MODE={api_server.SCHEDULER_MODE})")
+    await stop.wait()
+
+    # Release the lease on the way out so a standby takes over at once
+    jobs.cancel()
+    await asyncio.gather(jobs, return_exceptions=True)
+    await api_server.unimtx.aclose()
+    await api_server.fcm_client.aclose()
+    logger.info("App scheduler stopped")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1 @@
+"""Benchmarks; run modules from the repository root, e.g. python -m bench.password_bench."""
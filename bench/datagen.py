@@ -0,0 +1,277 @@
+"""
+Synthetic data for scale testing.
+Fills the bot tables (user_preferences, reminders) and the app tables
+(app_users, app_reminders) of a fresh SQLite file with realistic
+distributions: mostly Tashkent users with a tail of other timezones, a
+heavy-tailed number of reminders per user, a mix of one-off and recurring
+reminders, statuses that follow the scheduled time, and scheduled times
+bunched around the five prayer times and 09:00 local.
+
+The schema comes from database.init_database() and
+api_server.init_app_database(), so triggers (admin counters, analytics
+events) run for every generated row just as in production.
+
+    python -m bench.datagen --db /tmp/levi-1m.db --reminders 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from recurrence import build_rule
+from timezones import utc_offset
+
+# Importing database/api_server pulls in config, which insists on a token
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:bench')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+# (timezone, weight)
+TIMEZONES = (
+    ('Asia/Tashkent', 0.82),
+    ('Asia/Samarkand', 0.05),
+    ('Europe/Moscow', 0.05),
+    ('Asia/Almaty', 0.03),
+    ('Europe/Istanbul', 0.02),
+    ('Asia/Seoul', 0.01),
+    ('America/New_York', 0.01),
+    ('UTC', 0.01),
+)
+
+# (recurrence_type, weight); None is a one-off reminder
+RECURRENCES = (
+    (None, 0.72),
+    ('daily', 0.14),
+    ('weekdays', 0.06),
+    ('weekly', 0.06),
+    ('monthly', 0.02),
+)
+
+# Local times reminders bunch around: Bomdod, 09:00, Peshin, Asr, Shom, Xufton
+PEAK_TIMES = ((5, 30), (9, 0), (12, 45), (16, 15), (18, 30), (20, 0))
+PEAK_SHARE = 0.65
+PEAK_SPREAD_MINUTES = 12
+
+# Scheduled times span this many days around now
+PAST_DAYS = 120
+FUTURE_DAYS = 30
+
+# Share of past one-off reminders the user never answered
+PAST_PENDING_SHARE = 0.06
+
+# Mean reminders per user (per-user counts are heavy-tailed around it)
+REMINDERS_PER_USER = 25
+
+TASKS = (
+    "Onamga qo'ng'iroq qilish", "Dori ichish", "Namoz", "Non olish", "Kitob o'qish",
+    "Позвонить маме", "Оплатить интернет", "Sport zalga borish", "Uchrashuv", "Suv ichish",
+)
+LOCATIONS = (None, None, None, "uy", "ish", "bozor", "apteka", "maktab")
+
+INSERT_BATCH = 20000
+
+
+def weighted(rng: random.Random, choices: Sequence[Tuple[object, float]]) -> object:
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+class Generator:
+    """Draws users and reminders from the distributions above."""
+
+    def __init__(self, seed: int = 1, now: Optional[datetime] = None):
+        self.rng = random.Random(seed)
+        self.now = (now or datetime.utcnow()).replace(microsecond=0)
+
+    def user_sizes(self, reminders: int) -> List[int]:
+        """Reminders per user: Pareto-distributed, summing to exactly `reminders`."""
+        users = max(1, reminders // REMINDERS_PER_USER)
+        raw = [self.rng.paretovariate(1.6) for _ in range(users)]
+        scale = reminders / sum(raw)
+        sizes = [max(1, int(value * scale)) for value in raw]
+        # Fix up rounding so the total is exact
+        difference = reminders - sum(sizes)
+        index = 0
+        while difference:
+            step = 1 if difference > 0 else -1
+            if sizes[index % users] + step >= 1:
+                sizes[index % users] += step
+                difference -= step
+            index += 1
+        return sizes
+
+    def local_time(self) -> Tuple[int, int]:
+        """Local (hour, minute): near a peak most of the time, else anywhere in the waking day."""
+        if self.rng.random() < PEAK_SHARE:
+            hour, minute = self.rng.choice(PEAK_TIMES)
+            offset = int(self.rng.gauss(0, PEAK_SPREAD_MINUTES))
+            total = (hour * 60 + minute + offset) % (24 * 60)
+        else:
+            total = self.rng.randrange(6 * 60, 23 * 60)
+        # Most people pick round times
+        if self.rng.random() < 0.6:
+            total -= total % 5
+        return divmod(total, 60)
+
+    def reminder(self, user_timezone: str, done_status: str) -> dict:
+        """One reminder row (UTC, naive) for a user in the given timezone."""
+        hour, minute = self.local_time()
+        day = (self.now + timedelta(days=self.rng.randint(-PAST_DAYS, FUTURE_DAYS))).date()
+        local = datetime(day.year, day.month, day.day, hour, minute)
+        scheduled = local - utc_offset(user_timezone, local)
+        created = scheduled - timedelta(minutes=self.rng.randint(5, 3 * 24 * 60))
+
+        recurrence_type = weighted(self.rng, RECURRENCES)
+        past = scheduled <= self.now
+        if recurrence_type:
+            # Recurring reminders stay pending and keep firing
+            status = 'pending'
+        elif past:
+            status = 'pending' if self.rng.random() < PAST_PENDING_SHARE else done_status
+        else:
+            status = 'pending'
+
+        recurrence_time = f"{hour:02d}:{minute:02d}" if recurrence_type else None
+        return {
+            'task_text': self.rng.choice(TASKS),
+            'notes': None,
+            'location': self.rng.choice(LOCATIONS),
+            'scheduled_time_utc': scheduled.isoformat(sep=' '),
+            'user_timezone': user_timezone,
+            'status': status,
+            'initial_reminder_sent': int(past),
+            'follow_up_sent': int(past and not recurrence_type and status != 'pending'),
+            'recurrence_type': recurrence_type,
+            'recurrence_time': recurrence_time,
+            'recurrence_rule': build_rule(recurrence_type, recurrence_time, scheduled, user_timezone),
+            'created_at': min(created, self.now).isoformat(sep=' '),
+        }
+
+    def users(self, reminders: int) -> Iterator[Tuple[int, str, str, int]]:
+        """(user_id, timezone, language, reminder_count) per user."""
+        for index, size in enumerate(self.user_sizes(reminders)):
+            timezone = weighted(self.rng, TIMEZONES)
+            language = 'ru' if timezone in ('Europe/Moscow', 'Asia/Almaty') or self.rng.random() < 0.15 else 'uz'
+            yield index + 1, timezone, language, size
+
+
+REMINDER_COLUMNS = (
+    'task_text', 'notes', 'location', 'scheduled_time_utc', 'user_timezone', 'status',
+    'initial_reminder_sent', 'follow_up_sent', 'recurrence_type', 'recurrence_time',
+    'recurrence_rule', 'created_at',
+)
+
+
+def _insert_reminders(conn: sqlite3.Connection, table: str, extra: Sequence[str], rows: List[tuple]) -> None:
+    columns = tuple(extra) + REMINDER_COLUMNS
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        rows
+    )
+
+
+def create_schema(path: str) -> None:
+    """Create the bot and app tables (with their triggers) in a new database."""
+    import database
+    import api_server
+
+    database.DATABASE_PATH = path
+    api_server.DATABASE_PATH = path
+    database.init_database()
+    asyncio.run(api_server.init_app_database())
+
+
+def fill(path: str, reminders: int, seed: int = 1, log=print) -> dict:
+    """
+    Generate `reminders` rows in each of reminders and app_reminders.
+
+    Args:
+        path: SQLite file (created if missing; should be empty).
+        reminders: Rows per reminders table.
+        seed: Random seed; the same seed gives the same data.
+        log: Progress callback.
+
+    Returns:
+        Row counts per table.
+    """
+    import rollups
+
+    create_schema(path)
+    generator = Generator(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+
+    started = time.monotonic()
+    users = 0
+    bot_rows: List[tuple] = []
+    app_rows: List[tuple] = []
+    written = 0
+
+    def flush() -> None:
+        nonlocal written
+        if bot_rows:
+            _insert_reminders(conn, 'reminders', ('user_id', 'chat_id'), bot_rows)
+        if app_rows:
+            _insert_reminders(conn, 'app_reminders', ('user_id',), app_rows)
+        conn.commit()
+        written += len(bot_rows)
+        bot_rows.clear()
+        app_rows.clear()
+        log(f"  {written:,}/{reminders:,} reminders per table ({time.monotonic() - started:.0f}s)")
+
+    for user_id, timezone, language, size in generator.users(reminders):
+        users += 1
+        telegram_id = 10_000_000 + user_id
+        conn.execute(
+            "INSERT INTO user_preferences (user_id, timezone, language) VALUES (?, ?, ?)",
+            (telegram_id, timezone, language)
+        )
+        conn.execute(
+            "INSERT INTO app_users (id, phone, password_hash, name, timezone, language, fcm_token) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, f"+998{900000000 + user_id}", 'bench', f"User {user_id}", timezone, language,
+             f"fcm-{user_id}" if generator.rng.random() < 0.7 else None)
+        )
+        for _ in range(size):
+            row = generator.reminder(timezone, 'done')
+            bot_rows.append((telegram_id, telegram_id) + tuple(row[column] for column in REMINDER_COLUMNS))
+            row = generator.reminder(timezone, 'completed')
+            app_rows.append((user_id,) + tuple(row[column] for column in REMINDER_COLUMNS))
+        if len(bot_rows) >= INSERT_BATCH:
+            flush()
+    flush()
+    conn.close()
+
+    # The rollup job runs every few minutes in production; catch it up
+    for table in ('reminders', 'app_reminders'):
+        while rollups.run_rollup(lambda: sqlite3.connect(path), table):
+            pass
+
+    log(f"Generated {users:,} users and {reminders:,} reminders per table in {time.monotonic() - started:.0f}s")
+    return {'users': users, 'reminders': reminders, 'app_users': users, 'app_reminders': reminders}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help="SQLite file to create")
+    parser.add_argument('--reminders', type=int, default=100000, help="rows in each reminders table")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--force', action='store_true', help="overwrite an existing file")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f"{args.db} exists; pass --force to overwrite", file=sys.stderr)
+            return 1
+        os.remove(args.db)
+    fill(args.db, args.reminders, args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,554 @@
+"""
+End-to-end benchmark of the API and the bot against local stand-ins.
+Boots api_server.app (in-process, over ASGI) and the bot's handlers
+(through Application.process_update) with every external service served
+by bench.fakes, runs realistic load and reports throughput, p50/p99
+latency, SQL statements and external calls per scenario.
+
+Scenarios:
+    api-voice   voice uploads: STT, Gemini parsing and reminder inserts
+    api-list    reminder list polling
+    api-peak    morning peak: one scheduler tick over a burst of due reminders (FCM)
+    bot-voice   Telegram voice messages through the conversation handlers
+    bot-peak    morning peak in the bot scheduler (Telegram sends)
+    bot-mixed   voice messages and menu button presses from many users, arriving
+                at --rate through the Application's update queue
+
+For the peak scenarios latency is from the start of the tick until the
+fake service receives each push or message. With --shards N the api-peak
+tick runs as N scheduler shards side by side (user_id % N), as N
+SCHEDULER_MODE=sharded workers would. bot-mixed reports voice messages and
+button presses as two rows (mixed-voice, mixed-press) sharing the SQL and
+call counts; latency is from queueing an update until its handlers finish,
+and --concurrent-updates sets how many chats are handled at once (1 is
+one update at a time).
+
+    python -m bench.e2e_bench
+    python -m bench.e2e_bench --scenario api-voice --users 50 --concurrency 20
+    python -m bench.e2e_bench --latency gemini=2000 --errors fcm=0.05 --json
+    python -m bench.e2e_bench --scenario api-peak --shards 4
+    python -m bench.e2e_bench --scenario bot-mixed --concurrent-updates 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bench.fakes import FAKE_OGG, SERVICES, FakeServices, default_profiles
+from bench.password_bench import percentile
+from coordination import Shards
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('api-voice', 'api-list', 'api-peak', 'bot-voice', 'bot-peak', 'bot-mixed')
+
+
+class QueryCounter:
+    """Counts SQL statements on every sqlite3 connection opened while installed."""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._connect = None
+
+    def _trace(self, statement: str) -> None:
+        # Statements run by triggers are reported with a '--' prefix
+        if statement.startswith('--'):
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else '?'
+        with self._lock:
+            self.counts[verb] += 1
+
+    def install(self) -> None:
+        original = self._connect = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            conn = original(*args, **kwargs)
+            conn.set_trace_callback(self._trace)
+            return conn
+
+        sqlite3.connect = connect
+
+    def uninstall(self) -> None:
+        if self._connect is not None:
+            sqlite3.connect = self._connect
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts.clear()
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+class Result:
+    """Measurements of one scenario run."""
+
+    def __init__(self, name: str, latencies: List[float], errors: int, elapsed: float, ops: Optional[int] = None):
+        self.name = name
+        self.latencies = latencies
+        self.errors = errors
+        self.elapsed = elapsed
+        self.ops = len(latencies) + errors if ops is None else ops
+        self.queries: Dict[str, int] = {}
+        self.calls: Dict[str, int] = {}
+
+    def as_dict(self) -> dict:
+        ops = self.ops
+        return {
+            'scenario': self.name,
+            'ops': ops,
+            'errors': self.errors,
+            'seconds': round(self.elapsed, 3),
+            'throughput': round(ops / self.elapsed, 1) if self.elapsed else 0.0,
+            'p50_ms': round(percentile(self.latencies, 0.5) * 1000, 1),
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 1),
+            'queries': sum(self.queries.values()),
+            'queries_per_op': round(sum(self.queries.values()) / ops, 1) if ops else 0.0,
+            'query_kinds': dict(self.queries),
+            'external_calls': dict(self.calls),
+        }
+
+
+async def run_ops(name: str, ops: List[Callable[[], Awaitable[bool]]], concurrency: int) -> Result:
+    """Run operations with bounded concurrency, timing each one."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def run(op) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await op()
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(op) for op in ops))
+    return Result(name, latencies, errors, time.perf_counter() - started)
+
+
+def arrival_result(name: str, fakes: FakeServices, service: str, started: float, elapsed: float, expected: int) -> Result:
+    """
+    Result whose latencies are fake-service arrival times relative to started.
+    Errors are injected failures plus expected requests that never arrived.
+    """
+    latencies = [arrival - started for arrival in fakes.arrivals.get(service, [])]
+    errors = fakes.errors.get(service, 0) + max(0, expected - len(latencies))
+    return Result(name, latencies, errors, elapsed, ops=max(expected, len(latencies)))
+
+
+def past_utc(minutes: int = 1) -> str:
+    return (datetime.utcnow() - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# ===== API scenarios =====
+
+class Bench:
+    """Shared state of the API and bot drivers."""
+
+    def __init__(self, args, fakes: FakeServices, counter: QueryCounter):
+        self.args = args
+        self.fakes = fakes
+        self.counter = counter
+
+    def begin(self) -> None:
+        """Start measuring: drop calls and queries made while seeding."""
+        self.fakes.reset()
+        self.counter.reset()
+
+
+class ApiBench(Bench):
+    """Drives api_server.app in-process over ASGI."""
+
+    def __init__(self, args, fakes: FakeServices, counter: QueryCounter):
+        super().__init__(args, fakes, counter)
+        self.tokens: List[str] = []
+
+    async def setup(self) -> None:
+        import httpx
+        import api_server
+
+        self.api = api_server
+        # Importing configures the real Gemini endpoint; repoint it
+        self.fakes.configure_gemini()
+        await api_server.init_app_database()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api_server.app),
+            base_url='http://api',
+            timeout=60
+        )
+
+        async def register(index: int) -> None:
+            response = await self.client.post('/api/auth/register', json={
+                'name': f"Bench {index}", 'phone': f"+99890{index:07d}", 'password': 'bench-password',
+            })
+            token = response.json()['token']
+            self.tokens.append(token)
+            await self.client.post('/api/user/fcm-token', json={'fcm_token': f"fcm-{index}"}, headers=self.auth(token))
+
+        await asyncio.gather(*(register(index) for index in range(self.args.users)))
+
+    async def teardown(self) -> None:
+        await self.client.aclose()
+        await self.api.unimtx.aclose()
+        await self.api.fcm_client.aclose()
+
+    @staticmethod
+    def auth(token: str) -> dict:
+        return {'Authorization': f"Bearer {token}"}
+
+    async def create_reminders(self, per_user: int, scheduled_time: str) -> None:
+        async def create(token: str, index: int) -> None:
+            await self.client.post('/api/reminders', headers=self.auth(token), json={
+                'task_text': f"Bench task {index}", 'scheduled_time': scheduled_time,
+            })
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def bounded(token: str, index: int) -> None:
+            async with semaphore:
+                await create(token, index)
+
+        await asyncio.gather(*(
+            bounded(token, index) for token in self.tokens for index in range(per_user)
+        ))
+
+    async def voice(self) -> Result:
+        def op(token: str) -> Callable[[], Awaitable[bool]]:
+            async def upload() -> bool:
+                response = await self.client.post(
+                    '/api/reminders/voice',
+                    headers=self.auth(token),
+                    files={'audio': ('voice.ogg', FAKE_OGG, 'audio/ogg')}
+                )
+                return response.status_code == 200 and response.json().get('success') is True
+            return upload
+
+        ops = [op(self.tokens[i % len(self.tokens)]) for i in range(self.args.voice)]
+        self.begin()
+        return await run_ops('api-voice', ops, self.args.concurrency)
+
+    async def list(self) -> Result:
+        await self.create_reminders(self.args.per_user, (datetime.utcnow() + timedelta(days=1)).isoformat())
+
+        def op(token: str) -> Callable[[], Awaitable[bool]]:
+            async def poll() -> bool:
+                response = await self.client.get('/api/reminders', headers=self.auth(token))
+                return response.status_code == 200
+            return poll
+
+        ops = [op(token) for _ in range(self.args.polls) for token in self.tokens]
+        self.begin()
+        return await run_ops('api-list', ops, self.args.concurrency)
+
+    async def peak(self) -> Result:
+        # Drain anything already due, then make a fresh burst due now
+        await self.api.check_and_send_reminders()
+        per_user = max(1, self.args.reminders // len(self.tokens))
+        await self.create_reminders(per_user, (datetime.utcnow() + timedelta(days=1)).isoformat())
+        with sqlite3.connect(self.api.DATABASE_PATH) as conn:
+            due = conn.execute(
+                "UPDATE app_reminders SET scheduled_time_utc = ? WHERE status = 'pending' AND initial_reminder_sent = 0",
+                (past_utc(),)
+            ).rowcount
+        self.begin()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.api.check_and_send_reminders(Shards(self.args.shards, (shard,)) if self.args.shards > 1 else None)
+            for shard in range(self.args.shards)
+        ))
+        elapsed = time.perf_counter() - started
+        return arrival_result('api-peak', self.fakes, 'fcm', started, elapsed, due)
+
+
+# ===== Bot scenarios =====
+
+class BotBench(Bench):
+    """Drives the bot's handlers through Application.process_update."""
+
+    def __init__(self, args, fakes: FakeServices, counter: QueryCounter):
+        super().__init__(args, fakes, counter)
+        self.update_id = 0
+
+    async def setup(self) -> None:
+        import bot
+        import database
+        import scheduler
+
+        self.database = database
+        self.scheduler = scheduler
+        self.fakes.configure_gemini()
+        database.init_database()
+        self.application = bot.build_application(
+            concurrent_updates=self.args.concurrent_updates, **self.fakes.telegram_urls()
+        )
+        await self.application.initialize()
+
+    async def teardown(self) -> None:
+        await self.application.shutdown()
+
+    def voice_update(self, user_id: int):
+        from telegram import Update
+
+        self.update_id += 1
+        return Update.de_json({
+            'update_id': self.update_id,
+            'message': {
+                'message_id': self.update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+                'voice': {
+                    'file_id': f"voice-{self.update_id}",
+                    'file_unique_id': f"voice-{self.update_id}",
+                    'duration': 3,
+                    'mime_type': 'audio/ogg',
+                    'file_size': len(FAKE_OGG),
+                },
+            },
+        }, self.application.bot)
+
+    def press_update(self, user_id: int):
+        """A tap on the 'my reminders' menu button."""
+        from telegram import Update
+
+        self.update_id += 1
+        user = {'id': user_id, 'is_bot': False, 'first_name': 'Bench'}
+        return Update.de_json({
+            'update_id': self.update_id,
+            'callback_query': {
+                'id': str(self.update_id),
+                'from': user,
+                'chat_instance': str(user_id),
+                'data': 'menu_reminders',
+                'message': {
+                    'message_id': 1,
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'text': 'Menu',
+                },
+            },
+        }, self.application.bot)
+
+    async def voice(self) -> Result:
+        def op(user_id: int) -> Callable[[], Awaitable[bool]]:
+            async def handle() -> bool:
+                await self.application.process_update(self.voice_update(user_id))
+                return True
+            return handle
+
+        ops = [op(1000 + i % self.args.users) for i in range(self.args.voice)]
+        self.begin()
+        return await run_ops('bot-voice', ops, self.args.concurrency)
+
+    async def peak(self) -> Result:
+        context = SimpleNamespace(bot=self.application.bot)
+        # Drain anything already due, then make a fresh burst due now
+        await self.scheduler.check_reminders(context)
+        await self.scheduler.dispatch_outbox(context)
+        due = datetime.utcnow() - timedelta(minutes=1)
+        for index in range(self.args.reminders):
+            user_id = 5000 + index % self.args.users
+            await self.database.add_reminder(user_id, user_id, f"Bench task {index}", due, 'Asia/Tashkent')
+        self.begin()
+        started = time.perf_counter()
+        await self.scheduler.check_reminders(context)
+        await self.scheduler.dispatch_outbox(context)
+        elapsed = time.perf_counter() - started
+        return arrival_result('bot-peak', self.fakes, 'telegram', started, elapsed, self.args.reminders)
+
+    async def mixed(self) -> List[Result]:
+        application = self.application
+        voices, presses = self.args.mixed_voice, self.args.presses
+        total = voices + presses
+        # Spread the voice messages evenly among the presses; users take turns
+        step = total / voices if voices else total + 1
+        kinds = ['voice' if voices and int(index % step) == 0 else 'press' for index in range(total)]
+        updates = [
+            (kind, (self.voice_update if kind == 'voice' else self.press_update)(1000 + index % self.args.users))
+            for index, kind in enumerate(kinds)
+        ]
+
+        queued: Dict[int, float] = {}
+        finished: Dict[int, float] = {}
+        process_update = application.process_update
+
+        async def timed(update) -> None:
+            try:
+                await process_update(update)
+            finally:
+                finished[update.update_id] = time.perf_counter()
+
+        # The Application looks process_update up per update, so this sees every one
+        application.process_update = timed
+        await application.start()
+        self.begin()
+        started = time.perf_counter()
+        try:
+            for index, (_, update) in enumerate(updates):
+                await asyncio.sleep(max(0.0, started + index / self.args.rate - time.perf_counter()))
+                queued[update.update_id] = time.perf_counter()
+                await application.update_queue.put(update)
+        finally:
+            # Stopping drains the queue and waits for the handlers still running
+            await application.stop()
+            application.process_update = process_update
+        elapsed = time.perf_counter() - started
+
+        results = []
+        for kind in ('voice', 'press'):
+            ids = [update.update_id for update_kind, update in updates if update_kind == kind]
+            latencies = [finished[i] - queued[i] for i in ids if i in finished]
+            results.append(Result(f"mixed-{kind}", latencies, len(ids) - len(latencies), elapsed))
+        return results
+
+
+# ===== Runner =====
+
+def parse_overrides(spec: str) -> Dict[str, float]:
+    """Parse 'gemini=2000,fcm=80' into a mapping."""
+    values = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            if name.strip() not in SERVICES:
+                raise SystemExit(f"Unknown service {name!r}; expected one of {', '.join(SERVICES)}")
+            values[name.strip()] = float(value)
+    return values
+
+
+def prepare_environment(args, fakes: FakeServices, workdir: str) -> None:
+    """Point the bot and API at the fakes and a scratch database (before importing them)."""
+    os.environ.update(fakes.environ())
+    os.environ.update({
+        'DATABASE_PATH': os.path.join(workdir, 'bench.db'),
+        'OTP_DB_PATH': os.path.join(workdir, 'otp.db'),
+        'TELEGRAM_TOKEN': '123456:bench',
+        'GEMINI_API_KEY': 'bench',
+        'ELEVENLABS_API_KEY': 'bench',
+        'AISHA_API_KEY': 'bench',
+        'FCM_SERVER_KEY': 'bench',
+        'UNIMTX_ACCESS_KEY_ID': 'bench',
+        'TRANSCRIPTION_SERVICE': args.stt,
+        'RATE_LIMIT_MESSAGES': '1000000',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_FORMAT': 'text',
+        # Hashing cost is measured by bench.password_bench
+        'PASSWORD_SCRYPT_N': '1024',
+    })
+
+
+async def run(args) -> List[Result]:
+    profiles = default_profiles(args.scale)
+    for name, latency in parse_overrides(args.latency).items():
+        profiles[name].latency_ms = latency
+    for name, rate in parse_overrides(args.errors).items():
+        profiles[name].error_rate = rate
+
+    fakes = FakeServices(profiles).start()
+    workdir = tempfile.mkdtemp(prefix='levi-bench-')
+    # The bot writes bot.log to the working directory; keep it in the scratch dir
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    prepare_environment(args, fakes, workdir)
+
+    counter = QueryCounter()
+    counter.install()
+
+    import logging
+    from logging_setup import configure_logging
+    results: List[Result] = []
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+
+    api = bot = None
+    try:
+        for name in scenarios:
+            if name.startswith('api') and api is None:
+                api = ApiBench(args, fakes, counter)
+                await api.setup()
+            if name.startswith('bot') and bot is None:
+                bot = BotBench(args, fakes, counter)
+                await bot.setup()
+            # Importing the bot reconfigures logging; keep the report readable
+            configure_logging([logging.StreamHandler(sys.stderr)], level='WARNING', json_format=False)
+
+            target = api if name.startswith('api') else bot
+            scenario = getattr(target, name.split('-', 1)[1])
+            scenario_results = await scenario()
+            if isinstance(scenario_results, Result):
+                scenario_results = [scenario_results]
+            for result in scenario_results:
+                result.queries = dict(counter.counts)
+                result.calls = fakes.counts()
+            results.extend(scenario_results)
+    finally:
+        if api is not None:
+            await api.teardown()
+        if bot is not None:
+            await bot.teardown()
+        counter.uninstall()
+        fakes.stop()
+    return results
+
+
+def report(results: List[Result], as_json: bool) -> None:
+    if as_json:
+        for result in results:
+            print(json.dumps(result.as_dict()))
+        return
+    print(f"{'scenario':<11} {'ops':>6} {'err':>5} {'ops/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'sql/op':>7}  external calls")
+    for result in results:
+        row = result.as_dict()
+        calls = ', '.join(f"{name}={count}" for name, count in sorted(row['external_calls'].items()))
+        print(
+            f"{row['scenario']:<11} {row['ops']:>6} {row['errors']:>5} {row['throughput']:>8} "
+            f"{row['p50_ms']:>9} {row['p99_ms']:>9} {row['queries_per_op']:>7}  {calls}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=('all',) + SCENARIOS, default='all')
+    parser.add_argument('--users', type=int, default=50, help="distinct users")
+    parser.add_argument('--voice', type=int, default=100, help="voice uploads / messages")
+    parser.add_argument('--per-user', type=int, default=20, help="reminders per user for list polling")
+    parser.add_argument('--polls', type=int, default=5, help="list polls per user")
+    parser.add_argument('--reminders', type=int, default=500, help="reminders due in a peak tick")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--shards', type=int, default=1, help="scheduler shards sharing the api-peak tick")
+    parser.add_argument('--mixed-voice', type=int, default=20, help="voice messages in bot-mixed")
+    parser.add_argument('--presses', type=int, default=100, help="button presses in bot-mixed")
+    parser.add_argument('--rate', type=float, default=20.0, help="bot-mixed updates per second")
+    parser.add_argument(
+        '--concurrent-updates', type=int, default=32, help="chats the bot handles at once (1: one update at a time)"
+    )
+    parser.add_argument('--stt', choices=('aisha', 'elevenlabs'), default='aisha', help="bot transcription service")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every default fake latency")
+    parser.add_argument('--latency', default='', help="per-service latency ms, e.g. gemini=2000,fcm=80")
+    parser.add_argument('--errors', default='', help="per-service error rate, e.g. fcm=0.05")
+    parser.add_argument('--json', action='store_true', help="one JSON object per scenario")
+    args = parser.parse_args(argv)
+
+    report(asyncio.run(run(args)), args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
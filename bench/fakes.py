@@ -0,0 +1,289 @@
+"""
+Local stand-ins for the external services the bot and API call: Telegram
+Bot API, FCM, Unimtx, ElevenLabs, Aisha and Gemini. All of them are served
+by one uvicorn server on a background thread (so blocking SDK clients in
+the code under test still get answered), each with its own latency, jitter
+and error rate, and every request is counted and timestamped.
+
+    fakes = FakeServices({'gemini': ServiceProfile(latency_ms=800)})
+    fakes.start()
+    os.environ.update(fakes.environ())
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+SERVICES = ('telegram', 'fcm', 'unimtx', 'elevenlabs', 'aisha', 'gemini')
+
+# Typical production round trips, in milliseconds
+DEFAULT_LATENCY_MS = {
+    'telegram': 40,
+    'fcm': 60,
+    'unimtx': 150,
+    'elevenlabs': 1200,
+    'aisha': 1500,
+    'gemini': 900,
+}
+
+# What the fake speech-to-text services "hear"
+TRANSCRIPT = "ertaga soat 9 da onamga qo'ng'iroq qilish"
+
+# A few bytes that look like an OGG file to anything that checks
+FAKE_OGG = b'OggS' + bytes(2044)
+
+
+class ServiceProfile:
+    """Latency and failure behaviour of one fake service."""
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 0, error_rate: float = 0.0):
+        """
+        Args:
+            latency_ms: Base response delay.
+            jitter_ms: Extra uniformly random delay, 0..jitter_ms.
+            error_rate: Share of requests answered with HTTP 500.
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    def __repr__(self) -> str:
+        return f"ServiceProfile(latency_ms={self.latency_ms}, jitter_ms={self.jitter_ms}, error_rate={self.error_rate})"
+
+
+def default_profiles(scale: float = 1.0) -> Dict[str, ServiceProfile]:
+    """Default profile per service, with latencies multiplied by scale."""
+    return {
+        name: ServiceProfile(latency_ms=ms * scale, jitter_ms=ms * scale * 0.2)
+        for name, ms in DEFAULT_LATENCY_MS.items()
+    }
+
+
+class FakeServices:
+    """All fake services behind one local HTTP server."""
+
+    def __init__(
+        self,
+        profiles: Optional[Dict[str, ServiceProfile]] = None,
+        port: int = 0,
+        seed: int = 1,
+        gemini_replies: Optional[Callable[[str], Optional[str]]] = None
+    ):
+        """
+        Args:
+            profiles: Per-service overrides of default_profiles().
+            port: Port to listen on (0 picks a free one).
+            seed: Seed for jitter and error injection.
+            gemini_replies: Maps a Gemini prompt to the model's reply text
+                (e.g. a recorded response); None falls back to the canned replies.
+        """
+        self.profiles = {**default_profiles(), **(profiles or {})}
+        self.gemini_replies = gemini_replies
+        self.port = port
+        self.random = random.Random(seed)
+        # service -> perf_counter() arrival times / error count
+        self.arrivals: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._message_id = 0
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def environ(self) -> Dict[str, str]:
+        """Environment variables that point the bot and API at the fakes."""
+        return {
+            'FCM_API_URL': f"{self.url}/fcm/send",
+            'UNIMTX_API_BASE': f"{self.url}/unimtx",
+            'ELEVENLABS_API_BASE': f"{self.url}/elevenlabs",
+            'AISHA_STT_URL': f"{self.url}/aisha/api/v1/stt/post/",
+        }
+
+    def configure_gemini(self) -> None:
+        """
+        Send google.generativeai calls to the fake. Call after importing the
+        modules that run genai.configure() themselves, before the first request.
+        """
+        import google.generativeai as genai
+        genai.configure(
+            api_key='bench',
+            transport='rest',
+            client_options={'api_endpoint': f"{self.url}/gemini"}
+        )
+
+    def telegram_urls(self) -> Dict[str, str]:
+        """base_url / base_file_url for the Telegram Application builder."""
+        return {
+            'base_url': f"{self.url}/telegram/bot",
+            'base_file_url': f"{self.url}/telegram/file/bot",
+        }
+
+    def reset(self) -> None:
+        """Forget recorded requests (between scenarios)."""
+        self.arrivals.clear()
+        self.errors.clear()
+
+    def counts(self) -> Dict[str, int]:
+        """Requests received per service."""
+        return {name: len(times) for name, times in self.arrivals.items()}
+
+    # ----- request handling -----
+
+    async def _serve(self, service: str) -> Optional[Response]:
+        """Record the arrival, wait out the latency, maybe inject an error."""
+        self.arrivals[service].append(time.perf_counter())
+        profile = self.profiles[service]
+        delay = profile.latency_ms + self.random.uniform(0, profile.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if profile.error_rate and self.random.random() < profile.error_rate:
+            self.errors[service] += 1
+            return JSONResponse({'error': 'injected failure'}, status_code=500)
+        return None
+
+    async def telegram(self, request: Request) -> Response:
+        error = await self._serve('telegram')
+        if error:
+            return JSONResponse({'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}, status_code=500)
+
+        method = request.path_params['method']
+        params = await _params(request)
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Levi', 'username': 'levi_bench_bot'}
+        elif method in ('sendMessage', 'editMessageText'):
+            self._message_id += 1
+            chat_id = int(params.get('chat_id') or 1)
+            result = {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        elif method == 'getFile':
+            file_id = params.get('file_id', 'voice')
+            result = {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_size': len(FAKE_OGG),
+                'file_path': f"voice/{file_id}.oga",
+            }
+        else:
+            # setMyCommands, sendChatAction, answerCallbackQuery, ...
+            result = True
+        return JSONResponse({'ok': True, 'result': result})
+
+    async def telegram_file(self, request: Request) -> Response:
+        error = await self._serve('telegram')
+        return error or Response(FAKE_OGG, media_type='audio/ogg')
+
+    async def fcm(self, request: Request) -> Response:
+        error = await self._serve('fcm')
+        return error or JSONResponse({'success': 1, 'failure': 0, 'results': [{'message_id': 'bench'}]})
+
+    async def unimtx(self, request: Request) -> Response:
+        error = await self._serve('unimtx')
+        if error:
+            return error
+        if request.query_params.get('action') == 'otp.verify':
+            return JSONResponse({'code': '0', 'message': 'Success', 'data': {'valid': True}})
+        return JSONResponse({'code': '0', 'message': 'Success', 'data': {}})
+
+    async def elevenlabs(self, request: Request) -> Response:
+        await request.body()
+        error = await self._serve('elevenlabs')
+        return error or JSONResponse({
+            'language_code': 'uzb',
+            'language_probability': 0.98,
+            'text': TRANSCRIPT,
+            'words': [],
+        })
+
+    async def aisha(self, request: Request) -> Response:
+        await request.body()
+        error = await self._serve('aisha')
+        return error or JSONResponse({'text': TRANSCRIPT})
+
+    async def gemini(self, request: Request) -> Response:
+        body = await request.json()
+        error = await self._serve('gemini')
+        if error:
+            return error
+        prompt = ''.join(
+            part.get('text', '')
+            for content in body.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        text = self.gemini_replies(prompt) if self.gemini_replies else None
+        if text is None and 'JSON' in prompt:
+            # Reminder parsing: one reminder two hours from now
+            when = time.strftime('%Y-%m-%d %H:%M', time.gmtime(time.time() + 7200))
+            text = json.dumps([{
+                'task': "Onamga qo'ng'iroq qilish", 'time_utc': when, 'notes': None,
+                'location': None, 'recurrence_type': None, 'recurrence_time': None,
+            }])
+        elif text is None:
+            # Transcription clean-up: hand the text back unchanged
+            text = TRANSCRIPT
+        return JSONResponse({
+            'candidates': [{
+                'content': {'parts': [{'text': text}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+        })
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route('/telegram/bot{token}/{method}', self.telegram, methods=['GET', 'POST']),
+            Route('/telegram/file/bot{token}/{path:path}', self.telegram_file),
+            Route('/fcm/send', self.fcm, methods=['POST']),
+            Route('/unimtx/', self.unimtx, methods=['POST']),
+            Route('/elevenlabs/v1/speech-to-text', self.elevenlabs, methods=['POST']),
+            Route('/aisha/api/v1/stt/post/', self.aisha, methods=['POST']),
+            Route('/gemini/{rest:path}', self.gemini, methods=['POST']),
+        ])
+
+    # ----- lifecycle -----
+
+    def start(self) -> 'FakeServices':
+        """Serve on a background thread; returns once the port is bound."""
+        config = uvicorn.Config(self.app(), host='127.0.0.1', port=self.port, log_level='warning', lifespan='off')
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name='fake-services', daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Fake services failed to start")
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+
+async def _params(request: Request) -> dict:
+    """Bot API parameters from the query string, a form or a JSON body."""
+    params = dict(request.query_params)
+    if request.method == 'POST':
+        content_type = request.headers.get('content-type', '')
+        if content_type.startswith('application/json'):
+            params.update(await request.json())
+        elif content_type:
+            form = await request.form()
+            params.update({key: value for key, value in form.items() if isinstance(value, str)})
+    return params
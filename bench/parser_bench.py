@@ -0,0 +1,445 @@
+"""
+Accuracy and latency of the reminder parsers against a labeled corpus.
+Runs every case in bench/parser_corpus.jsonl through each parser tier and
+reports the share of cases parsed correctly, accuracy per field and the
+per-call latency:
+
+    regex       time_parser.parse_reminder_text (slang, regexes, dateparser)
+    multi       time_parser.parse_multiple_tasks
+    snooze      time_parser.parse_snooze_duration
+    gemini-bot  gemini_parser.parse_with_gemini
+    gemini-api  api_server.parse_with_gemini
+
+The Gemini tiers talk to bench.fakes, which answers with the response
+recorded for the transcript in the corpus, so they measure everything
+around the model call (prompt, SDK round trip, JSON extraction, past-time
+handling) and are repeatable offline.
+
+Expected times are written relative to the moment a case runs, in the
+user's local time:
+
+    +5m, +2h, +3d, +1w      from now
+    today 18:00             today (the case is skipped once that has passed)
+    tomorrow 09:00, day+2 11:00
+    next 09:00              the next 09:00, today or tomorrow
+    mon 10:00 ... sun 10:00 the next such weekday
+    weekday 08:00           the next 08:00 on Monday to Friday
+
+Recorded Gemini responses use the same specs as "{time:<spec>}" placeholders,
+filled in when the fake replies.
+
+    python -m bench.parser_bench
+    python -m bench.parser_bench --tier regex --tier snooze --verbose
+    python -m bench.parser_bench --save baseline.json
+    python -m bench.parser_bench --compare baseline.json   # exit 1 on regressions
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench.fakes import FakeServices, ServiceProfile
+from bench.password_bench import percentile
+from timezones import to_local_naive, utc_offset
+
+# Importing the parsers pulls in config, which insists on a token; the Gemini
+# tiers need a key to build their models (requests go to the fake)
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:bench')
+os.environ.setdefault('GEMINI_API_KEY', 'bench')
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.gettempdir(), 'levi-parser-bench.db'))
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.jsonl')
+
+TIERS = ('regex', 'multi', 'snooze', 'gemini-bot', 'gemini-api')
+
+# Corpus kinds each tier runs
+TIER_KINDS = {
+    'regex': ('reminder',),
+    'multi': ('multi',),
+    'snooze': ('snooze',),
+    'gemini-bot': ('reminder', 'multi'),
+    'gemini-api': ('reminder', 'multi'),
+}
+
+DEFAULT_TIMEZONE = 'Asia/Tashkent'
+
+# Allowed difference from the expected time, in seconds. Relative times
+# drift with the clock during a run; Gemini answers to the minute.
+RELATIVE_TOLERANCE = 120
+ABSOLUTE_TOLERANCE = 60
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+RELATIVE_SPEC = re.compile(r'^\+(\d+)([mhdw])$')
+CLOCK_SPEC = re.compile(r'^(today|tomorrow|day\+\d+|next|weekday|mon|tue|wed|thu|fri|sat|sun) (\d{1,2}):(\d{2})$')
+RECORDED_TIME = re.compile(r'\{time:([^}]+)\}')
+PROMPT_TEXT = re.compile(r'^(Text|Matn): "(.*)"$', re.MULTILINE)
+
+
+def load_corpus(path: str = CORPUS) -> List[dict]:
+    """Corpus cases, one JSON object per line."""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def resolve(spec: str, now: datetime, timezone: str) -> Tuple[Optional[datetime], int]:
+    """
+    Turn an expected-time spec into a naive UTC datetime.
+
+    Args:
+        spec: A spec from the module docstring.
+        now: Current UTC time.
+        timezone: The user's timezone, for the clock specs.
+
+    Returns:
+        (UTC datetime, tolerance in seconds); the datetime is None for a
+        "today" time that has already passed.
+    """
+    relative = RELATIVE_SPEC.match(spec)
+    if relative:
+        amount, unit = int(relative.group(1)), relative.group(2)
+        delta = {'m': timedelta(minutes=amount), 'h': timedelta(hours=amount),
+                 'd': timedelta(days=amount), 'w': timedelta(weeks=amount)}[unit]
+        return now + delta, RELATIVE_TOLERANCE
+
+    clock = CLOCK_SPEC.match(spec)
+    if not clock:
+        raise ValueError(f"Bad time spec: {spec!r}")
+    day, hour, minute = clock.group(1), int(clock.group(2)), int(clock.group(3))
+    local_now = to_local_naive(now, timezone)
+    candidate = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    if day == 'today':
+        if candidate <= local_now:
+            return None, ABSOLUTE_TOLERANCE
+    elif day == 'tomorrow':
+        candidate += timedelta(days=1)
+    elif day.startswith('day+'):
+        candidate += timedelta(days=int(day[4:]))
+    else:
+        # next / weekday / a named day: first matching occurrence after now
+        while (
+            candidate <= local_now
+            or (day == 'weekday' and candidate.weekday() >= 5)
+            or (day in WEEKDAYS and candidate.weekday() != WEEKDAYS.index(day))
+        ):
+            candidate += timedelta(days=1)
+    return candidate - utc_offset(timezone, candidate), ABSOLUTE_TOLERANCE
+
+
+def expected_reminders(case: dict) -> List[dict]:
+    """The reminders a Gemini tier should return for a case."""
+    expect = case['expect']
+    if case['kind'] == 'multi':
+        return expect.get('reminders', [])
+    if case['kind'] == 'snooze' or expect['task'] is None:
+        return []
+    return [expect]
+
+
+def is_stale(case: dict, now: datetime) -> bool:
+    """True if an expected "today" time has already passed."""
+    timezone = case.get('timezone', DEFAULT_TIMEZONE)
+    specs = [reminder['time'] for reminder in expected_reminders(case) if reminder['time']]
+    return any(resolve(spec, now, timezone)[0] is None for spec in specs)
+
+
+class Recordings:
+    """Recorded Gemini responses, looked up by the transcript in the prompt."""
+
+    def __init__(self, cases: List[dict]):
+        self.by_text = {case['text']: case for case in cases if 'gemini' in case}
+
+    def __call__(self, prompt: str) -> Optional[str]:
+        match = PROMPT_TEXT.search(prompt)
+        case = self.by_text.get(match.group(2)) if match else None
+        if case is None:
+            return None
+        # The API prompt asks for Uzbek task names; some cases recorded its answer separately
+        recorded = case.get('gemini_api', case['gemini']) if match.group(1) == 'Matn' else case['gemini']
+        now = datetime.utcnow()
+        timezone = case.get('timezone', DEFAULT_TIMEZONE)
+        return RECORDED_TIME.sub(
+            lambda spec: (resolve(spec.group(1), now, timezone)[0] or now).strftime('%Y-%m-%d %H:%M'),
+            recorded
+        )
+
+
+# ----- scoring -----
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, one apostrophe, no punctuation or repeated spaces."""
+    text = re.sub(r"[‘’ʻʼ`]", "'", (text or '').lower())
+    text = re.sub(r"[.,!?;:\"]", ' ', text)
+    return ' '.join(text.split())
+
+
+def task_matches(got: Optional[str], accepted: List[str]) -> bool:
+    return normalize(got) in {normalize(task) for task in accepted}
+
+
+def time_matches(got: Optional[datetime], spec: Optional[str], started: datetime, timezone: str) -> bool:
+    if spec is None:
+        return got is None
+    if got is None:
+        return False
+    expected, tolerance = resolve(spec, started, timezone)
+    return expected is not None and abs((got - expected).total_seconds()) <= tolerance
+
+
+def location_matches(got: Optional[str], expected: Optional[str]) -> bool:
+    if expected is None:
+        return not got
+    return normalize(expected) in normalize(got)
+
+
+def parse_utc(value: Any) -> Optional[datetime]:
+    """Gemini tier times: a datetime (bot) or a 'YYYY-MM-DD HH:MM[:SS]' string (API)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def score_reminders(got: List[dict], case: dict, started: datetime) -> Dict[str, bool]:
+    """Field checks for a Gemini tier's reminders, in order."""
+    expected = expected_reminders(case)
+    timezone = case.get('timezone', DEFAULT_TIMEZONE)
+    pairs = list(zip(got, expected))
+    return {
+        'count': len(got) == len(expected),
+        'task': all(task_matches(g.get('task'), e['task']) for g, e in pairs),
+        'time': all(
+            time_matches(parse_utc(g.get('time', g.get('time_utc'))), e['time'], started, timezone)
+            for g, e in pairs
+        ),
+        'recurrence': all(g.get('recurrence_type') == e['recurrence'] for g, e in pairs),
+        'location': all(location_matches(g.get('location'), e['location']) for g, e in pairs),
+    }
+
+
+# ----- tiers -----
+
+class Outcome:
+    """One case through one tier."""
+
+    def __init__(self, case: dict, fields: Dict[str, bool], got: Any, seconds: List[float]):
+        self.case = case
+        self.fields = fields
+        self.got = got
+        self.seconds = seconds
+
+    @property
+    def ok(self) -> bool:
+        return all(self.fields.values())
+
+
+async def call(tier: str, case: dict) -> Any:
+    """Run one case through a tier and return the raw result."""
+    import time_parser
+
+    text = case['text']
+    timezone = case.get('timezone', DEFAULT_TIMEZONE)
+    if tier == 'regex':
+        return time_parser.parse_reminder_text(text, timezone, case['lang'])
+    if tier == 'multi':
+        return time_parser.parse_multiple_tasks(text, case['lang'])
+    if tier == 'snooze':
+        return time_parser.parse_snooze_duration(text)
+    if tier == 'gemini-bot':
+        import gemini_parser
+        return await gemini_parser.parse_with_gemini(text, timezone, case['lang'])
+    import api_server
+    return await api_server.parse_with_gemini(text, timezone)
+
+
+def score(tier: str, case: dict, got: Any, started: datetime) -> Dict[str, bool]:
+    expect = case['expect']
+    timezone = case.get('timezone', DEFAULT_TIMEZONE)
+    if tier == 'regex':
+        task, when = got
+        fields = {'time': time_matches(when, expect['time'], started, timezone)}
+        if expect['task'] is not None:
+            fields['task'] = task_matches(task, expect['task'])
+        return fields
+    if tier == 'multi':
+        return {'parts': [normalize(part) for part in got] == [normalize(part) for part in expect['parts']]}
+    if tier == 'snooze':
+        minutes = None if got is None else got.total_seconds() / 60
+        return {'minutes': minutes == expect['minutes']}
+    return score_reminders(got, case, started)
+
+
+async def run_tier(tier: str, cases: List[dict], repeat: int) -> Tuple[List[Outcome], List[dict]]:
+    """Score the tier's cases on the first call and time `repeat` calls each; returns (outcomes, skipped)."""
+    outcomes, skipped = [], []
+    for case in cases:
+        if case['kind'] not in TIER_KINDS[tier]:
+            continue
+        if tier.startswith('gemini') and case['kind'] == 'multi' and 'gemini' not in case:
+            continue
+        started = datetime.utcnow()
+        if is_stale(case, started):
+            skipped.append(case)
+            continue
+        seconds = []
+        got = None
+        for attempt in range(repeat):
+            began = time.perf_counter()
+            result = await call(tier, case)
+            seconds.append(time.perf_counter() - began)
+            if attempt == 0:
+                got = result
+        outcomes.append(Outcome(case, score(tier, case, got, started), got, seconds))
+    return outcomes, skipped
+
+
+def summarize(tier: str, outcomes: List[Outcome], skipped: List[dict]) -> dict:
+    fields: Dict[str, List[bool]] = {}
+    for outcome in outcomes:
+        for name, ok in outcome.fields.items():
+            fields.setdefault(name, []).append(ok)
+    seconds = [s for outcome in outcomes for s in outcome.seconds]
+    passed = sum(outcome.ok for outcome in outcomes)
+    return {
+        'tier': tier,
+        'cases': len(outcomes),
+        'passed': passed,
+        'skipped': len(skipped),
+        'accuracy': round(passed / len(outcomes), 3) if outcomes else None,
+        'fields': {name: round(sum(oks) / len(oks), 3) for name, oks in fields.items()},
+        'calls': len(seconds),
+        'p50_ms': round(percentile(seconds, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(seconds, 0.95) * 1000, 2),
+        'max_ms': round(max(seconds, default=0) * 1000, 2),
+        'passed_ids': sorted(outcome.case['id'] for outcome in outcomes if outcome.ok),
+        'failed_ids': sorted(outcome.case['id'] for outcome in outcomes if not outcome.ok),
+    }
+
+
+def describe(got: Any) -> str:
+    """Short form of a tier result for failure listings."""
+    if isinstance(got, tuple):
+        task, when = got
+        return f"task={task!r} time={when:%Y-%m-%d %H:%M} UTC" if when else f"task={task!r} time=None"
+    if isinstance(got, timedelta):
+        return f"{got.total_seconds() / 60:g} min"
+    if isinstance(got, list) and got and isinstance(got[0], dict):
+        return '; '.join(
+            f"{r.get('task')!r} @ {r.get('time', r.get('time_utc'))} rec={r.get('recurrence_type')} loc={r.get('location')}"
+            for r in got
+        )
+    return repr(got)
+
+
+def report(summaries: List[dict], failures: Dict[str, List[Outcome]], verbose: bool) -> None:
+    print(f"{'tier':<11} {'cases':>5} {'pass':>5} {'acc':>6} {'skip':>4} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  fields")
+    for row in summaries:
+        accuracy = f"{row['accuracy'] * 100:5.1f}%" if row['accuracy'] is not None else '     -'
+        fields = ', '.join(f"{name}={value * 100:.0f}%" for name, value in row['fields'].items())
+        print(
+            f"{row['tier']:<11} {row['cases']:>5} {row['passed']:>5} {accuracy:>6} {row['skipped']:>4} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['max_ms']:>8}  {fields}"
+        )
+    if not verbose:
+        return
+    for tier, outcomes in failures.items():
+        if not outcomes:
+            continue
+        print(f"\n{tier} failures:")
+        for outcome in outcomes:
+            wrong = ', '.join(name for name, ok in outcome.fields.items() if not ok)
+            print(f"  {outcome.case['id']:<28} [{wrong}] {outcome.case['text']!r}")
+            print(f"  {'':<28} got {describe(outcome.got)}")
+
+
+def compare(summaries: List[dict], baseline: Dict[str, List[str]]) -> int:
+    """Print cases that passed in the baseline but fail now; returns how many."""
+    regressions = 0
+    for row in summaries:
+        before = set(baseline.get(row['tier'], []))
+        broken = sorted(before & set(row['failed_ids']))
+        fixed = sorted(set(row['passed_ids']) - before)
+        regressions += len(broken)
+        if broken:
+            print(f"{row['tier']}: regressed {', '.join(broken)}")
+        if fixed:
+            print(f"{row['tier']}: now passing {', '.join(fixed)}")
+    print(f"{regressions} regression(s) against the baseline")
+    return regressions
+
+
+async def run(args) -> Tuple[List[dict], Dict[str, List[Outcome]]]:
+    import logging
+    from logging_setup import configure_logging
+
+    cases = load_corpus(args.corpus)
+    tiers = args.tier or list(TIERS)
+    fakes = None
+    if any(tier.startswith('gemini') for tier in tiers):
+        fakes = FakeServices({'gemini': ServiceProfile(latency_ms=args.gemini_latency)}, gemini_replies=Recordings(cases))
+        fakes.start()
+        # Both modules configure genai on import; point it at the fake afterwards
+        import gemini_parser  # noqa: F401
+        import api_server  # noqa: F401
+        fakes.configure_gemini()
+    # The parsers log every attempt; keep the report readable
+    configure_logging([logging.StreamHandler(sys.stderr)], level='ERROR', json_format=False)
+
+    summaries, failures = [], {}
+    try:
+        for tier in tiers:
+            # Load dateparser's language data and open the HTTP session before timing
+            warm = next(case for case in cases if case['kind'] in TIER_KINDS[tier])
+            await call(tier, warm)
+            outcomes, skipped = await run_tier(tier, cases, args.repeat)
+            summaries.append(summarize(tier, outcomes, skipped))
+            failures[tier] = [outcome for outcome in outcomes if not outcome.ok]
+    finally:
+        if fakes is not None:
+            fakes.stop()
+    return summaries, failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tier', action='append', choices=TIERS, help="tier to run (repeatable; default all)")
+    parser.add_argument('--corpus', default=CORPUS, help="labeled cases, JSON lines")
+    parser.add_argument('--repeat', type=int, default=5, help="timed calls per case (the first one is scored)")
+    parser.add_argument('--gemini-latency', type=float, default=0, help="fake Gemini round trip in ms")
+    parser.add_argument('--verbose', action='store_true', help="list failing cases and what the parser returned")
+    parser.add_argument('--json', action='store_true', help="one JSON object per tier")
+    parser.add_argument('--save', help="write the passing case ids per tier to this baseline file")
+    parser.add_argument('--compare', help="exit 1 if a case passing in this baseline file now fails")
+    args = parser.parse_args(argv)
+
+    summaries, failures = asyncio.run(run(args))
+    if args.json:
+        for row in summaries:
+            print(json.dumps(row, ensure_ascii=False))
+    else:
+        report(summaries, failures, args.verbose)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({row['tier']: row['passed_ids'] for row in summaries}, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(summaries, baseline):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
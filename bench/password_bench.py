@@ -0,0 +1,96 @@
+"""
+Login hashing benchmark.
+Fires logins at a fixed arrival rate through passwords.py while a probe
+task measures event-loop lag, and checks login p99 (measured from each
+login's arrival, so queueing counts) against a budget.
+
+    python -m bench.password_bench --logins 200 --rate 10 --budget-ms 500
+    python -m bench.password_bench --inline    # KDF on the event loop, for comparison
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import List
+
+import passwords
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+async def probe_loop_lag(interval: float, lags: List[float], stop: asyncio.Event) -> None:
+    """Record how late a short sleep wakes up (what other requests would feel)."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run(args) -> int:
+    # Logins compare the stored cost against SCRYPT_N; matching it means no rehash
+    passwords.SCRYPT_N = args.n
+    stored = passwords.hash_password_sync('correct horse battery staple', n=args.n)
+    latencies: List[float] = []
+
+    async def login(arrival: float) -> None:
+        if args.inline:
+            valid, rehash = passwords.verify_password_sync('correct horse battery staple', stored)
+        else:
+            valid, rehash = await passwords.verify_password('correct horse battery staple', stored)
+        latencies.append(time.perf_counter() - arrival)
+        assert valid and not rehash
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(0.01, lags, stop))
+
+    started = time.perf_counter()
+    tasks = []
+    for index in range(args.logins):
+        arrival = started + index / args.rate
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        tasks.append(asyncio.create_task(login(arrival)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    p99 = percentile(latencies, 0.99) * 1000
+    print(f"scrypt N={args.n}, workers={passwords.HASH_WORKERS}, {'inline' if args.inline else 'pooled'}, {args.rate:g} logins/s")
+    print(f"{args.logins} logins in {elapsed:.2f}s ({args.logins / elapsed:.1f}/s)")
+    print(
+        f"login ms: p50={percentile(latencies, 0.5) * 1000:.1f} "
+        f"p95={percentile(latencies, 0.95) * 1000:.1f} p99={p99:.1f}"
+    )
+    print(
+        f"loop lag ms: mean={statistics.mean(lags or [0]) * 1000:.1f} "
+        f"p99={percentile(lags, 0.99) * 1000:.1f} max={max(lags or [0]) * 1000:.1f}"
+    )
+
+    if p99 > args.budget_ms:
+        print(f"FAIL: login p99 {p99:.1f}ms exceeds budget {args.budget_ms}ms")
+        return 1
+    print(f"OK: login p99 within {args.budget_ms}ms")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=10.0, help="Login arrivals per second")
+    parser.add_argument('--n', type=int, default=passwords.SCRYPT_N, help="scrypt cost parameter N")
+    parser.add_argument('--budget-ms', type=float, default=500.0, help="Allowed login p99")
+    parser.add_argument('--inline', action='store_true', help="Run the KDF on the event loop")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Scale benchmark for the reminder queries.
+Generates databases of increasing size with bench.datagen, times every
+read path in database.py and the API's list, admin and scheduler queries
+on each, and flags queries whose time grows super-linearly with the row
+count (growth exponent k in time ~ rows^k; a per-user query that grows at
+all is scanning).
+
+User-scoped queries are timed for a user with the median number of
+reminders, which stays the same at every size.
+
+    python -m bench.scale_bench                          # 10k, 100k, 1M
+    python -m bench.scale_bench --sizes 10000,100000 --repeat 7
+    python -m bench.scale_bench --dir /var/tmp/levi --reuse
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bench import datagen
+
+# Growth exponent above which a query is flagged
+SUPER_LINEAR = 1.2
+
+# Growth exponent above which a user-scoped query is flagged as scanning
+SCANNING = 0.5
+
+# Timings below this are dominated by noise and never flagged
+MIN_FLAG_SECONDS = 0.002
+
+# Query name -> (user scoped, factory returning the awaitable to time)
+Queries = Dict[str, Tuple[bool, Callable[[], Awaitable]]]
+
+
+def median_user(path: str, table: str, column: str) -> int:
+    """User with the median number of reminders in a table."""
+    with sqlite3.connect(path) as conn:
+        counts = conn.execute(
+            f"SELECT {column}, COUNT(*) AS n FROM {table} GROUP BY {column} ORDER BY n, {column}"
+        ).fetchall()
+    return counts[len(counts) // 2][0]
+
+
+def bot_queries(path: str) -> Queries:
+    """The read paths in database.py."""
+    import database
+
+    database.DATABASE_PATH = path
+    user = median_user(path, 'reminders', 'user_id')
+    with sqlite3.connect(path) as conn:
+        reminder_id = conn.execute("SELECT id FROM reminders WHERE user_id = ? LIMIT 1", (user,)).fetchone()[0]
+    now = datetime.utcnow()
+
+    async def drain_recovery():
+        async for _ in database.iter_pending_reminders(now):
+            pass
+
+    return {
+        'get_user_reminders': (True, lambda: database.get_user_reminders(user)),
+        'get_user_reminders(pending)': (True, lambda: database.get_user_reminders(user, 'pending')),
+        'get_latest_pending_reminder': (True, lambda: database.get_latest_pending_reminder(user)),
+        'get_reminder_by_id': (True, lambda: database.get_reminder_by_id(reminder_id)),
+        'get_user_preferences': (True, lambda: database.get_user_preferences(user)),
+        'get_user_reminders_admin': (True, lambda: database.get_user_reminders_admin(user)),
+        'get_pending_reminders': (False, lambda: database.get_pending_reminders(now)),
+        'get_follow_up_reminders': (False, lambda: database.get_follow_up_reminders(now - timedelta(minutes=30))),
+        'count_pending_reminders': (False, lambda: database.count_pending_reminders(now)),
+        'iter_pending_reminders': (False, drain_recovery),
+        'get_all_reminders_admin': (False, lambda: database.get_all_reminders_admin(100)),
+        'get_all_users_admin': (False, lambda: database.get_all_users_admin(20, 0)),
+        'get_stats_admin': (False, database.get_stats_admin),
+        'get_rollup_series_admin': (False, lambda: database.get_rollup_series_admin('daily', 90)),
+    }
+
+
+async def api_queries(path: str) -> Tuple[Queries, Callable[[], Awaitable]]:
+    """The API's list, admin and scheduler queries, over ASGI; also returns a closer."""
+    import httpx
+    import api_server
+
+    api_server.DATABASE_PATH = path
+    user = median_user(path, 'app_reminders', 'user_id')
+    token = await api_server.create_jwt_token(user)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api_server.app), base_url='http://api', timeout=600)
+    headers = {'Authorization': f"Bearer {token}"}
+    admin = {'password': api_server.ADMIN_PASSWORD}
+    now = datetime.utcnow().isoformat()
+
+    def get(url: str, **kwargs) -> Callable[[], Awaitable]:
+        async def request():
+            response = await client.get(url, **kwargs)
+            response.raise_for_status()
+        return request
+
+    async def sql(query: str):
+        def run():
+            with sqlite3.connect(path) as conn:
+                conn.execute(query, (now,)).fetchall()
+        await asyncio.to_thread(run)
+
+    queries = {
+        'GET /api/reminders': (True, get('/api/reminders', headers=headers)),
+        'GET /api/reminders?status=pending': (True, get('/api/reminders', headers=headers, params={'status': 'pending'})),
+        'GET /admin/api/user/{id}/reminders': (True, get(f'/admin/api/user/{user}/reminders', params=admin)),
+        'GET /admin/api/stats': (False, get('/admin/api/stats', params=admin)),
+        'GET /admin/api/rollups': (False, get('/admin/api/rollups', params={**admin, 'days': 90})),
+        'GET /admin': (False, get('/admin')),
+        'scheduler: DUE_REMINDERS_SQL': (False, lambda: sql(api_server.DUE_REMINDERS_SQL)),
+    }
+    return queries, client.aclose
+
+
+async def time_query(factory: Callable[[], Awaitable], repeat: int) -> float:
+    """Median seconds over `repeat` runs, after one warm-up run."""
+    await factory()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await factory()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+async def measure(path: str, repeat: int) -> Dict[str, Tuple[bool, float]]:
+    """Median time of every query against one database."""
+    results = {}
+    for name, (scoped, factory) in bot_queries(path).items():
+        results[f"bot: {name}"] = (scoped, await time_query(factory, repeat))
+
+    queries, close = await api_queries(path)
+    try:
+        for name, (scoped, factory) in queries.items():
+            results[f"api: {name}"] = (scoped, await time_query(factory, repeat))
+    finally:
+        await close()
+    return results
+
+
+def growth(sizes: List[int], times: List[float]) -> float:
+    """Largest growth exponent between consecutive sizes."""
+    exponents = [
+        math.log(max(t2, 1e-6) / max(t1, 1e-6)) / math.log(n2 / n1)
+        for (n1, t1), (n2, t2) in zip(zip(sizes, times), zip(sizes[1:], times[1:]))
+    ]
+    return max(exponents) if exponents else 0.0
+
+
+def flag(scoped: bool, exponent: float, largest: float) -> str:
+    if largest < MIN_FLAG_SECONDS:
+        return ''
+    if exponent > SUPER_LINEAR:
+        return 'SUPER-LINEAR'
+    if scoped and exponent > SCANNING:
+        return 'SCANS (per-user query grows with table)'
+    return ''
+
+
+def report(sizes: List[int], runs: Dict[int, Dict[str, Tuple[bool, float]]]) -> int:
+    """Print the timing table; returns the number of flagged queries."""
+    names = list(runs[sizes[0]])
+    width = max(len(name) for name in names)
+    header = f"{'query':<{width}} " + ' '.join(f"{size:>10,}" for size in sizes) + f" {'k':>6}  flag"
+    print(header)
+    print('-' * len(header))
+    flagged = 0
+    for name in names:
+        scoped = runs[sizes[0]][name][0]
+        times = [runs[size][name][1] for size in sizes]
+        exponent = growth(sizes, times)
+        note = flag(scoped, exponent, times[-1])
+        flagged += bool(note)
+        cells = ' '.join(f"{t * 1000:>8.2f}ms" for t in times)
+        print(f"{name:<{width}} {cells} {exponent:>6.2f}  {note}")
+    print(f"\nk: growth exponent (time ~ rows^k) between consecutive sizes, worst step; times are medians.")
+    return flagged
+
+
+async def run(args) -> int:
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    os.makedirs(args.dir, exist_ok=True)
+    runs = {}
+    for size in sizes:
+        path = os.path.join(args.dir, f"levi-scale-{size}.db")
+        if not (args.reuse and os.path.exists(path)):
+            if os.path.exists(path):
+                os.remove(path)
+            print(f"Generating {size:,} reminders per table in {path}...", file=sys.stderr)
+            await asyncio.to_thread(datagen.fill, path, size, args.seed, lambda line: print(line, file=sys.stderr))
+        print(f"Timing queries at {size:,} rows...", file=sys.stderr)
+        runs[size] = await measure(path, args.repeat)
+
+    flagged = report(sizes, runs)
+    return 1 if flagged and args.fail_on_flag else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help="reminders per table, comma separated")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per query (median is reported)")
+    parser.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'levi-scale'), help="where databases go")
+    parser.add_argument('--reuse', action='store_true', help="reuse databases generated by an earlier run")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--fail-on-flag', action='store_true', help="exit 1 if any query is flagged")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,18 +6,34 @@ Supports multiple languages including Russian and Uzbek.
 import logging
 import sys
 import asyncio
+from typing import Optional
+from telegram import Update
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     ConversationHandler,
     CallbackQueryHandler,
+    TypeHandler,
     filters,
 )
 
-from config import TELEGRAM_TOKEN
-from database import init_database
-from scheduler import setup_scheduler, recover_pending_reminders
+from config import (
+    TELEGRAM_TOKEN, METRICS_PORT, LOG_FORMAT, LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE_RATE,
+    PROFILE_DIR, PROFILING, PROFILE_SAMPLE_RATE, PROFILE_MIN_MS, PROFILE_MAX_FILES,
+    TRACE_EXPORTER, TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_MS,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_SERVE_API, WEBHOOK_DRAIN_SECONDS, CONCURRENT_UPDATES,
+    PERSISTENCE, PERSISTENCE_UPDATE_INTERVAL, PERSISTENCE_REFRESH,
+)
+import metrics
+from logging_setup import configure_logging, parse_levels
+from profiling import configure_profiling, profiled
+from tracing import configure_tracing
+from update_processor import ChatOrderedUpdateProcessor
+from database import init_database, get_connection
+from persistence import SQLitePersistence
+from scheduler import setup_scheduler, recover_pending_reminders, leave_shards
 from handlers import (
     start_command,
     help_command,
@@ -38,6 +54,10 @@ from handlers import (
     admin_users_command,
     admin_reminders_command,
     admin_user_command,
+    admin_trends_command,
+    admin_loglevel_command,
+    admin_profiling_command,
+    bind_update_log_context,
     # New menu handlers
     setup_bot_menu,
     menu_command,
@@ -53,32 +73,92 @@ from handlers import (
     WAITING_FOR_TASK_CONFIRMATION,
 )
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
+# Configure logging (written from a background thread; httpx is quieted via LOG_LEVELS)
+configure_logging(
     handlers=[
         logging.StreamHandler(sys.stdout),
         logging.FileHandler('bot.log', encoding='utf-8'),
-    ]
+    ],
+    level=LOG_LEVEL,
+    json_format=LOG_FORMAT == 'json',
+    levels=parse_levels(LOG_LEVELS),
+    sample_rate=LOG_SAMPLE_RATE
 )
 
-# Reduce noise from httpx
-logging.getLogger("httpx").setLevel(logging.WARNING)
-
 logger = logging.getLogger(__name__)
 
+configure_profiling(
+    PROFILE_DIR,
+    enabled=PROFILING,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    min_duration_ms=PROFILE_MIN_MS,
+    max_files=PROFILE_MAX_FILES
+)
 
-def main() -> None:
-    """Start the bot."""
-    logger.info("Starting Voice Reminder Bot...")
+configure_tracing(
+    TRACE_EXPORTER,
+    path=TRACE_FILE,
+    sample_rate=TRACE_SAMPLE_RATE,
+    slow_ms=TRACE_SLOW_MS
+)
+
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
+async def post_init(app: Application) -> None:
+    """Run startup recovery for missed reminders and set up the menu."""
+    await setup_bot_menu(app)
+    if METRICS_PORT:
+        metrics.gauge('bot_update_queue_depth', "Telegram updates waiting to be processed").set_function(
+            app.update_queue.qsize
+        )
+        metrics.gauge('bot_scheduled_jobs', "Jobs in the job queue").set_function(
+            lambda: len(app.job_queue.jobs())
+        )
+        if isinstance(app.update_processor, ChatOrderedUpdateProcessor):
+            metrics.gauge('bot_busy_chats', "Chats with an update being handled").set_function(
+                lambda: app.update_processor.busy_chats
+            )
+            metrics.gauge('bot_updates_waiting_for_chat', "Updates queued behind their chat's earlier updates").set_function(
+                lambda: app.update_processor.queued_updates
+            )
+        metrics.start_http_server(METRICS_PORT)
+    await recover_pending_reminders(app)
+
+
+def build_application(
+    token: str = TELEGRAM_TOKEN,
+    base_url: Optional[str] = None,
+    base_file_url: Optional[str] = None,
+    concurrent_updates: int = 1,
+    persistence: bool = PERSISTENCE
+) -> Application:
+    """
+    Create the Application with the scheduler and every handler registered.
     
-    # Initialize the database
-    init_database()
-    logger.info("Database initialized")
+    Args:
+        token: Bot token.
+        base_url: Bot API root override (e.g. a local stand-in server).
+        base_file_url: File download root override.
+        concurrent_updates: Chats whose updates are handled at once (each
+            chat's one at a time); 1 handles every update in turn.
+        persistence: Keep conversation states and user/chat data in the database.
     
-    # Create the Application
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    Returns:
+        The configured (not yet initialized) Application.
+    """
+    builder = Application.builder().token(token)
+    if base_url:
+        builder = builder.base_url(base_url)
+    if base_file_url:
+        builder = builder.base_file_url(base_file_url)
+    if concurrent_updates > 1:
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(concurrent_updates))
+    if persistence:
+        builder = builder.persistence(
+            SQLitePersistence(get_connection, update_interval=PERSISTENCE_UPDATE_INTERVAL, refresh=PERSISTENCE_REFRESH)
+        )
+    application = builder.build()
     
     # Set up the scheduler for checking reminders
     setup_scheduler(application)
@@ -86,7 +166,7 @@ def main() -> None:
     # Conversation handler for voice message flow
     voice_conv_handler = ConversationHandler(
         entry_points=[
-            MessageHandler(filters.VOICE, voice_message_handler),
+            MessageHandler(filters.VOICE, profiled('bot', 'voice_message')(voice_message_handler)),
         ],
         states={
             WAITING_FOR_TIME: [
@@ -98,6 +178,8 @@ def main() -> None:
             CommandHandler("cancel", cancel_command),
         ],
         allow_reentry=True,
+        name="voice_conversation",
+        persistent=persistence,
     )
     
     # Conversation handler for timezone setting
@@ -115,6 +197,8 @@ def main() -> None:
             CommandHandler("cancel", cancel_command),
         ],
         allow_reentry=True,
+        name="timezone_conversation",
+        persistent=persistence,
     )
     
     # Conversation handler for YES/NO follow-up
@@ -137,10 +221,15 @@ def main() -> None:
             CommandHandler("cancel", cancel_command),
         ],
         allow_reentry=True,
+        name="followup_conversation",
+        persistent=persistence,
     )
     
+    # Tag log records with the update being handled (runs before every other group)
+    application.add_handler(TypeHandler(Update, bind_update_log_context), group=-1)
+    
     # Add callback query handler for inline buttons (YES/NO)
-    application.add_handler(CallbackQueryHandler(yes_no_callback_handler, pattern="^reminder_(yes|no)$"))
+    application.add_handler(CallbackQueryHandler(yes_no_callback_handler, pattern=r"^reminder_(yes|no)(:\d+)?$"))
     
     # Add callback handlers for menu
     application.add_handler(CallbackQueryHandler(menu_callback_handler, pattern="^menu_"))
@@ -166,6 +255,9 @@ def main() -> None:
     application.add_handler(CommandHandler("users", admin_users_command))
     application.add_handler(CommandHandler("reminders", admin_reminders_command))
     application.add_handler(CommandHandler("user", admin_user_command))
+    application.add_handler(CommandHandler("trends", admin_trends_command))
+    application.add_handler(CommandHandler("loglevel", admin_loglevel_command))
+    application.add_handler(CommandHandler("profiling", admin_profiling_command))
     
     # Add conversation handlers
     application.add_handler(voice_conv_handler)
@@ -178,16 +270,56 @@ def main() -> None:
     # Add error handler
     application.add_error_handler(error_handler)
     
-    # Run startup recovery for missed reminders and set up menu
-    async def post_init(app: Application) -> None:
-        await setup_bot_menu(app)
-        await recover_pending_reminders(app)
-    
     application.post_init = post_init
+    application.post_shutdown = leave_shards
+    return application
+
+
+def run_webhook(application: Application) -> None:
+    """Serve the webhook (and, with WEBHOOK_SERVE_API, the API server) until SIGINT/SIGTERM."""
+    import uvicorn
+    from webhook import create_webhook_app
+    
+    api_app = None
+    if WEBHOOK_SERVE_API:
+        # Note: importing the API server re-configures logging with its LOG_* settings
+        import api_server
+        api_app = api_server.app
+    
+    app = create_webhook_app(
+        application,
+        webhook_url=WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=ALLOWED_UPDATES,
+        api_app=api_app
+    )
+    uvicorn.run(
+        app,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        log_config=None,
+        timeout_graceful_shutdown=WEBHOOK_DRAIN_SECONDS
+    )
+
+
+def main() -> None:
+    """Start the bot."""
+    logger.info("Starting Voice Reminder Bot...")
+    
+    # Initialize the database
+    init_database()
+    logger.info("Database initialized")
+    
+    # Create the Application
+    application = build_application(concurrent_updates=CONCURRENT_UPDATES)
     
     # Start the bot
-    logger.info("Bot is starting...")
-    application.run_polling(allowed_updates=["message", "callback_query"])
+    logger.info(f"Bot is starting ({BOT_MODE}, {CONCURRENT_UPDATES} chats at once)...")
+    if BOT_MODE == 'webhook':
+        run_webhook(application)
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+"""
+Scheduler-only bot process for sharded reminder delivery.
+Sends reminders through the Bot API without polling for updates (only
+bot.py may poll), so extra copies can run on other cores or nodes; each
+claims its share of the user_id shards, and buttons on the messages it
+sends are answered by bot.py.
+
+    SCHEDULER_SHARDS=16 python bot.py
+    SCHEDULER_SHARDS=16 python bot_scheduler.py    # as many copies as needed
+"""
+
+import asyncio
+import logging
+import signal
+import sys
+
+from telegram.ext import Application
+
+import bot  # noqa: F401  (logging, profiling and tracing set up as for the bot)
+import metrics
+from config import TELEGRAM_TOKEN, METRICS_PORT, SCHEDULER_SHARDS
+from database import init_database
+from scheduler import setup_scheduler, recover_pending_reminders, leave_shards
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> int:
+    if not SCHEDULER_SHARDS:
+        # bot.py already sends every reminder; a second copy would send them twice
+        logger.error("bot_scheduler.py needs SCHEDULER_SHARDS set, for it and for bot.py")
+        return 1
+
+    init_database()
+    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    setup_scheduler(application)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    async with application:
+        await application.start()
+        if METRICS_PORT:
+            metrics.start_http_server(METRICS_PORT)
+        logger.info(f"Bot scheduler started with {SCHEDULER_SHARDS} shards")
+        await recover_pending_reminders(application)
+        await stop.wait()
+        await application.stop()
+    await leave_shards(application)
+    logger.info("Bot scheduler stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -33,8 +33,63 @@ USE_TURSO = bool(TURSO_DATABASE_URL and TURSO_AUTH_TOKEN)
 
 # Reminder settings
 FOLLOW_UP_DELAY_SECONDS = 1800  # 30 minutes after reminder
+RECOVERY_GRACE_SECONDS = 2 * 3600  # Missed reminders older than this are skipped on restart
+RECOVERY_BATCH_SIZE = int(os.getenv("RECOVERY_BATCH_SIZE", "500"))  # Rows per recovery batch
+DELIVERY_CONCURRENCY = int(os.getenv("DELIVERY_CONCURRENCY", "20"))  # Parallel Telegram sends
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))  # How often queued messages are sent
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))  # Analytics rollup job period
+SCHEDULER_LAG_SLO_SECONDS = int(os.getenv("SCHEDULER_LAG_SLO_SECONDS", "90"))  # p99 delivery lag before alerting
+# 0: this process sends every reminder. N: reminders are split by user_id % N across every
+# bot.py and bot_scheduler.py process sharing the database, rebalanced as they come and go.
+SCHEDULER_SHARDS = int(os.getenv("SCHEDULER_SHARDS", "0"))
+SCHEDULER_LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "120"))  # Keep well above the check interval
 DEFAULT_SNOOZE_MINUTES = 30
 
+# Logging: 'json' or 'text'; LOG_LEVELS overrides per module, e.g. "httpx=WARNING,scheduler=DEBUG"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))  # Share of DEBUG lines kept per call site
+
+# Sampled profiling of voice messages; /profiling changes it at runtime.
+# Share PROFILE_DIR with the API server to list and download profiles from its admin endpoints.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILING = os.getenv("PROFILING", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.05"))  # Share of voice messages profiled
+PROFILE_MIN_MS = float(os.getenv("PROFILE_MIN_MS", "1000"))  # Faster runs are not saved
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Per-stage tracing of voice messages: TRACE_EXPORTER is 'file' (OTLP/JSON lines in TRACE_FILE), 'stdout' or 'none'.
+# Failed and slow traces are always kept; slow ones are also logged with their stage timeline.
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))  # Share of ordinary traces exported
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+
+# How the bot receives updates: 'polling' (getUpdates) or 'webhook' (Telegram POSTs them to WEBHOOK_URL,
+# served by an ASGI app on WEBHOOK_HOST:WEBHOOK_PORT; with WEBHOOK_SERVE_API the API server shares the port)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public HTTPS URL, e.g. https://levi.example.com/telegram
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")  # Derived from the bot token if unset
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # Telegram allows 1-100
+WEBHOOK_SERVE_API = os.getenv("WEBHOOK_SERVE_API", "false").lower() == "true"
+WEBHOOK_DRAIN_SECONDS = int(os.getenv("WEBHOOK_DRAIN_SECONDS", "30"))  # Wait for open webhook requests on shutdown
+# Chats whose updates are handled at once; each chat's updates still run one at a time, in order,
+# so ConversationHandler state stays consistent. 1 handles every update in turn.
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+
+# Conversation states and user_data kept in the database (see persistence.py). Changes are written
+# in batches every PERSISTENCE_UPDATE_INTERVAL seconds; PERSISTENCE_REFRESH re-reads data other
+# bot processes changed before each update (one read per update).
+PERSISTENCE = os.getenv("PERSISTENCE", "true").lower() == "true"
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "5"))
+PERSISTENCE_REFRESH = os.getenv("PERSISTENCE_REFRESH", "false").lower() == "true"
+
+# Prometheus metrics exporter port for the bot (0 disables it)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
 # Timezone (default to Tashkent for Uzbekistan)
 DEFAULT_TIMEZONE = os.getenv("TIMEZONE", "Asia/Tashkent")
 
@@ -0,0 +1,347 @@
+"""
+Leader election and sharding through lease rows in the database.
+Every process that can run a singleton job (the API's reminder scheduler)
+competes for a named lease; the holder renews it on a heartbeat and runs
+the job, the others stand by and take over once the lease expires. With
+the lease in the shared database, web workers can scale out across cores
+and hosts while exactly one of them dispatches reminders.
+
+A job that outgrows one process is split into N shards (user_id % N)
+instead: each worker registers in a member table, works out its fair
+share from the live member count, and holds one lease per shard it owns.
+Workers hand surplus shards back and pick up free ones at each claim, so
+shards rebalance as workers join or leave, and a shard never has two
+owners at once.
+
+A holder that cannot renew in time stops its jobs when its own view of
+the lease runs out, which is no later than anyone else can take it over
+as long as host clocks agree; a tick already writing to the database may
+still finish.
+
+Works on a plain DB-API connection (sqlite3 or libsql), so callers run it
+in a worker thread.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL_SECONDS = 60
+
+LEASES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        acquired_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+"""
+
+# Takes the lease if it is free, expired or already ours; renewing keeps acquired_at
+ACQUIRE_LEASE_SQL = """
+    INSERT INTO leases (name, holder, acquired_at, expires_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        holder = excluded.holder,
+        acquired_at = CASE WHEN leases.holder = excluded.holder
+                           THEN leases.acquired_at ELSE excluded.acquired_at END,
+        expires_at = excluded.expires_at
+    WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+"""
+
+
+LEASE_MEMBERS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS lease_members (
+        pool TEXT NOT NULL,
+        member TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (pool, member)
+    )
+"""
+
+
+def default_holder() -> str:
+    """Identity of this process: host, pid and a random suffix against pid reuse."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class Lease:
+    """A named, expiring lease row; at most one holder at a time."""
+
+    def __init__(
+        self,
+        connect: Callable,
+        name: str,
+        holder: Optional[str] = None,
+        ttl: float = LEASE_TTL_SECONDS
+    ):
+        """
+        Args:
+            connect: Returns a new DB-API connection to the shared database.
+            name: Lease name; processes competing for the same job use the same name.
+            holder: Identity of this process (default: host:pid:random).
+            ttl: Seconds the lease stays valid without a renewal.
+        """
+        self.connect = connect
+        self.name = name
+        self.holder = holder or default_holder()
+        self.ttl = ttl
+        # Local deadline (monotonic) until which we know we hold the lease
+        self._valid_until = 0.0
+        self._initialized = False
+
+    @property
+    def held(self) -> bool:
+        """Whether the last renewal is still within the TTL."""
+        return time.monotonic() < self._valid_until
+
+    def try_acquire(self) -> bool:
+        """
+        Take or renew the lease. Blocking; run it in a worker thread.
+
+        Returns:
+            True if this process now holds the lease.
+        """
+        # Measured before the write so the local deadline never outlives the row
+        started = time.monotonic()
+        now = time.time()
+        conn = self.connect()
+        try:
+            if not self._initialized:
+                conn.execute(LEASES_TABLE_SQL)
+                self._initialized = True
+            cursor = conn.execute(ACQUIRE_LEASE_SQL, (self.name, self.holder, now, now + self.ttl, now))
+            conn.commit()
+            acquired = cursor.rowcount == 1
+        finally:
+            conn.close()
+        self._valid_until = started + self.ttl if acquired else 0.0
+        return acquired
+
+    def release(self) -> None:
+        """Give the lease up so a standby can take over without waiting for it to expire."""
+        self._valid_until = 0.0
+        conn = self.connect()
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def current(self) -> Optional[dict]:
+        """The lease row (holder, acquired_at, expires_at), or None if nobody holds it."""
+        conn = self.connect()
+        try:
+            conn.execute(LEASES_TABLE_SQL)
+            row = conn.execute(
+                "SELECT holder, acquired_at, expires_at FROM leases WHERE name = ? AND expires_at > ?",
+                (self.name, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {'holder': row[0], 'acquired_at': row[1], 'expires_at': row[2]}
+
+
+async def run_as_leader(lease: Lease, jobs: List[Callable[[], Awaitable]], heartbeat: Optional[float] = None):
+    """
+    Compete for the lease forever; run the jobs only while holding it.
+
+    Jobs are started when the lease is won and cancelled when a renewal
+    fails or the lease runs out; on cancellation the lease is released.
+
+    Args:
+        lease: The lease to hold.
+        jobs: Coroutine functions to run as tasks while leader.
+        heartbeat: Seconds between renewals (default: a third of the TTL).
+    """
+    heartbeat = heartbeat or lease.ttl / 3
+    tasks: List[asyncio.Task] = []
+
+    def stop_jobs():
+        for task in tasks:
+            task.cancel()
+        tasks.clear()
+
+    try:
+        while True:
+            try:
+                acquired = await asyncio.wait_for(asyncio.to_thread(lease.try_acquire), timeout=heartbeat)
+            except Exception as e:
+                logger.error(f"Lease {lease.name} renewal failed: {e}")
+                acquired = lease.held
+            if acquired and not tasks:
+                logger.info(f"Acquired lease {lease.name} as {lease.holder}; starting {len(jobs)} job(s)")
+                tasks.extend(asyncio.create_task(job()) for job in jobs)
+            elif not acquired and tasks:
+                logger.warning(f"Lost lease {lease.name}; stopping jobs")
+                stop_jobs()
+            # After a failed renewal, wake up when the lease would run out
+            remaining = lease._valid_until - time.monotonic()
+            await asyncio.sleep(min(heartbeat, remaining) if tasks and remaining > 0 else heartbeat)
+    finally:
+        stop_jobs()
+        if lease.held:
+            try:
+                await asyncio.to_thread(lease.release)
+                logger.info(f"Released lease {lease.name}")
+            except Exception as e:
+                logger.error(f"Failed to release lease {lease.name}: {e}")
+
+
+class Shards(NamedTuple):
+    """The shards of a job one worker owns for a tick."""
+
+    count: int
+    owned: Tuple[int, ...]
+
+    def sql(self, column: str) -> str:
+        """SQL condition (with a leading AND) limiting rows to the owned shards of an integer column."""
+        if not self.owned:
+            return " AND 0"
+        return f" AND {column} % {self.count} IN ({', '.join(str(shard) for shard in self.owned)})"
+
+    def owns(self, key: int) -> bool:
+        return key % self.count in self.owned
+
+
+class ShardMembership:
+    """This worker's share of a job split into `count` shards by key % count."""
+
+    def __init__(
+        self,
+        connect: Callable,
+        pool: str,
+        count: int,
+        member: Optional[str] = None,
+        ttl: float = LEASE_TTL_SECONDS
+    ):
+        """
+        Args:
+            connect: Returns a new DB-API connection to the shared database.
+            pool: Job name; workers splitting the same job use the same pool.
+            count: Number of shards; every worker must use the same count.
+            member: Identity of this worker (default: host:pid:random).
+            ttl: Seconds membership and shard leases last without a claim.
+                Claims happen once per tick, so keep it well above the tick interval.
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        self.connect = connect
+        self.pool = pool
+        self.count = count
+        self.member = member or default_holder()
+        self.ttl = ttl
+        self._names = [f"{pool}/{shard}" for shard in range(count)]
+        self._owned: Tuple[int, ...] = ()
+        self._valid_until = 0.0
+        self._initialized = False
+
+    @property
+    def owned(self) -> Shards:
+        """Shards owned as of the last claim, or none once its leases may have run out."""
+        return Shards(self.count, self._owned if time.monotonic() < self._valid_until else ())
+
+    def claim(self) -> Shards:
+        """
+        Renew membership and shard leases, hand back surplus shards and take
+        free ones up to this worker's fair share. Blocking; run it in a
+        worker thread at the start of every tick.
+
+        Returns:
+            The shards this worker owns until the next claim.
+        """
+        started = time.monotonic()
+        now = time.time()
+        expires = now + self.ttl
+        names = ', '.join('?' * self.count)
+        conn = self.connect()
+        try:
+            if not self._initialized:
+                conn.execute(LEASES_TABLE_SQL)
+                conn.execute(LEASE_MEMBERS_TABLE_SQL)
+                self._initialized = True
+
+            conn.execute(
+                """
+                INSERT INTO lease_members (pool, member, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(pool, member) DO UPDATE SET expires_at = excluded.expires_at
+                """,
+                (self.pool, self.member, expires)
+            )
+            conn.execute("DELETE FROM lease_members WHERE pool = ? AND expires_at <= ?", (self.pool, now))
+            members = [row[0] for row in conn.execute(
+                "SELECT member FROM lease_members WHERE pool = ? ORDER BY member", (self.pool,)
+            ).fetchall()]
+            index = members.index(self.member)
+            share = self.count // len(members) + (1 if index < self.count % len(members) else 0)
+
+            # Renew the shards still ours; lapsed ones are retaken below if nobody else did
+            conn.execute(
+                f"UPDATE leases SET expires_at = ? WHERE holder = ? AND expires_at > ? AND name IN ({names})",
+                (expires, self.member, now, *self._names)
+            )
+            rows = conn.execute(
+                f"SELECT name, holder FROM leases WHERE expires_at > ? AND name IN ({names})",
+                (now, *self._names)
+            ).fetchall()
+            holders = {int(name.rsplit('/', 1)[1]): holder for name, holder in rows}
+            owned = sorted(shard for shard, holder in holders.items() if holder == self.member)
+
+            # Hand back the highest shards beyond our share
+            for shard in owned[share:]:
+                conn.execute(
+                    "DELETE FROM leases WHERE name = ? AND holder = ?", (self._names[shard], self.member)
+                )
+            owned = owned[:share]
+
+            # Take free shards, starting at an offset of our own so workers rarely collide
+            offset = index * self.count // len(members)
+            for step in range(self.count):
+                if len(owned) >= share:
+                    break
+                shard = (offset + step) % self.count
+                if shard in holders:
+                    continue
+                cursor = conn.execute(
+                    ACQUIRE_LEASE_SQL, (self._names[shard], self.member, now, expires, now)
+                )
+                if cursor.rowcount == 1:
+                    owned.append(shard)
+            conn.commit()
+        finally:
+            conn.close()
+
+        owned = tuple(sorted(owned))
+        if owned != self._owned:
+            logger.info(
+                f"{self.pool}: {self.member} now owns {len(owned)}/{self.count} shards "
+                f"({len(members)} worker(s)): {list(owned)}"
+            )
+        self._owned = owned
+        self._valid_until = started + self.ttl
+        return Shards(self.count, owned)
+
+    def leave(self) -> None:
+        """Give up every shard and the membership so the other workers rebalance at once."""
+        self._owned = ()
+        self._valid_until = 0.0
+        conn = self.connect()
+        try:
+            conn.execute(LEASES_TABLE_SQL)
+            conn.execute(LEASE_MEMBERS_TABLE_SQL)
+            conn.execute(
+                f"DELETE FROM leases WHERE holder = ? AND name IN ({', '.join('?' * self.count)})",
+                (self.member, *self._names)
+            )
+            conn.execute("DELETE FROM lease_members WHERE pool = ? AND member = ?", (self.pool, self.member))
+            conn.commit()
+        finally:
+            conn.close()
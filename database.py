@@ -5,12 +5,25 @@ Supports both local SQLite and Turso (cloud SQLite).
 """
 
 import sqlite3
+import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import Optional, List, Tuple
+from typing import AsyncIterator, Optional, List, Tuple
+
+from recurrence import build_rule, rule_for_reminder, next_fire_for_reminder
+import stats
+import rollups
+import outbox
+import persistence
+import metrics
+from tracing import traced
+from coordination import Shards
 
 logger = logging.getLogger(__name__)
 
+DB_QUERY_SECONDS = metrics.histogram('db_query_seconds', "Database call latency by query", ['query'])
+timed_query = metrics.timed(DB_QUERY_SECONDS, 'query')
+
 # Try to import Turso config
 try:
     from config import TURSO_DATABASE_URL, TURSO_AUTH_TOKEN, USE_TURSO
@@ -70,6 +83,16 @@ def row_to_dict(cursor, row) -> Optional[dict]:
     return dict(zip(columns, row))
 
 
+def ensure_columns(cursor, table: str, columns: dict) -> None:
+    """Add any missing columns to an existing table."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, ddl in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+            logger.info(f"Added column {table}.{name}")
+
+
 def init_database() -> None:
     """Initialize the database and create tables if they don't exist."""
     db_type = "Turso" if (USE_TURSO and LIBSQL_AVAILABLE) else "local SQLite"
@@ -104,11 +127,30 @@ def init_database() -> None:
             follow_up_sent INTEGER DEFAULT 0,
             recurrence_type TEXT DEFAULT NULL,
             recurrence_time TEXT DEFAULT NULL,
+            recurrence_rule TEXT DEFAULT NULL,
+            next_fire_utc TIMESTAMP DEFAULT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
     
+    # Older databases were created before recurrence rules existed
+    ensure_columns(cursor, "reminders", {
+        "recurrence_rule": "TEXT DEFAULT NULL",
+        "next_fire_utc": "TIMESTAMP DEFAULT NULL",
+    })
+    
+    # Append-only history of recurring reminder occurrences
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_occurrences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            reminder_id INTEGER NOT NULL,
+            scheduled_time_utc TIMESTAMP NOT NULL,
+            event TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
     # Rate limiting table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS rate_limits (
@@ -128,17 +170,45 @@ def init_database() -> None:
         ON reminders(user_id)
     """)
     
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_occurrences_reminder
+        ON reminder_occurrences(reminder_id)
+    """)
+    
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_rate_limits_user_time
         ON rate_limits(user_id, timestamp)
     """)
     
+    # Admin stats counters, kept current by triggers; backfilled on first run
+    for statement in stats.schema_statements("reminders"):
+        cursor.execute(statement)
+    cursor.execute(stats.initialized_query("reminders"))
+    if not cursor.fetchone():
+        logger.info("Backfilling admin stats counters...")
+        for statement in stats.rebuild_statements("reminders"):
+            cursor.execute(statement)
+    
+    # Lifecycle events and their hourly/daily rollups
+    for statement in rollups.schema_statements("reminders", "reminder_occurrences", "user_preferences", "user_id"):
+        cursor.execute(statement)
+    
+    # Queued reminder and follow-up messages
+    for statement in outbox.schema_statements("reminders"):
+        cursor.execute(statement)
+    
+    # Conversation states and user/chat data of the bot
+    for statement in persistence.schema_statements():
+        cursor.execute(statement)
+    
     conn.commit()
     conn.close()
     
     logger.info(f"Database initialized successfully using {db_type}")
 
 
+@traced('insert')
+@timed_query
 async def add_reminder(
     user_id: int,
     chat_id: int,
@@ -151,14 +221,15 @@ async def add_reminder(
     recurrence_time: str = None
 ) -> int:
     """Add a new reminder to the database."""
+    recurrence_rule = build_rule(recurrence_type, recurrence_time, scheduled_time, user_timezone)
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         """
-        INSERT INTO reminders (user_id, chat_id, task_text, notes, location, scheduled_time_utc, user_timezone, recurrence_type, recurrence_time, initial_reminder_sent, follow_up_sent)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0)
+        INSERT INTO reminders (user_id, chat_id, task_text, notes, location, scheduled_time_utc, user_timezone, recurrence_type, recurrence_time, recurrence_rule, initial_reminder_sent, follow_up_sent)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0)
         """,
-        (user_id, chat_id, task_text, notes, location, scheduled_time.isoformat(), user_timezone, recurrence_type, recurrence_time)
+        (user_id, chat_id, task_text, notes, location, scheduled_time.isoformat(), user_timezone, recurrence_type, recurrence_time, recurrence_rule)
     )
     conn.commit()
     lastrowid = cursor.lastrowid
@@ -166,18 +237,19 @@ async def add_reminder(
     return lastrowid
 
 
-async def get_pending_reminders(before_time: datetime) -> List[dict]:
-    """Get all pending reminders scheduled before the given time (UTC)."""
+@timed_query
+async def get_pending_reminders(before_time: datetime, shards: Optional[Shards] = None) -> List[dict]:
+    """Get all pending reminders scheduled before the given time (UTC), optionally only for some user shards."""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
-        """
+        f"""
         SELECT id, user_id, chat_id, task_text, notes, location, scheduled_time_utc, 
                user_timezone, initial_reminder_sent, follow_up_sent, 
-               recurrence_type, recurrence_time
+               recurrence_type, recurrence_time, recurrence_rule, next_fire_utc
         FROM reminders
-        WHERE status = 'pending' AND scheduled_time_utc <= ?
-        ORDER BY scheduled_time_utc ASC
+        WHERE status = 'pending' AND scheduled_time_utc <= ?{shards.sql('user_id') if shards else ''}
+        ORDER BY scheduled_time_utc ASC, id ASC
         """,
         (before_time.isoformat(),)
     )
@@ -193,19 +265,21 @@ async def get_pending_reminders(before_time: datetime) -> List[dict]:
     return result
 
 
-async def get_follow_up_reminders(follow_up_after: datetime) -> List[dict]:
-    """Get reminders that need a follow-up (30 minutes after initial reminder)."""
+@timed_query
+async def get_follow_up_reminders(follow_up_after: datetime, shards: Optional[Shards] = None) -> List[dict]:
+    """Get reminders that need a follow-up (30 minutes after initial reminder), optionally only for some user shards."""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
-        """
-        SELECT id, user_id, chat_id, task_text, notes, location, scheduled_time_utc, user_timezone, recurrence_type
+        f"""
+        SELECT id, user_id, chat_id, task_text, notes, location, scheduled_time_utc, user_timezone,
+               recurrence_type, recurrence_time, recurrence_rule, next_fire_utc
         FROM reminders
         WHERE status = 'pending' 
         AND initial_reminder_sent = 1
         AND follow_up_sent = 0
-        AND scheduled_time_utc <= ?
-        ORDER BY scheduled_time_utc ASC
+        AND scheduled_time_utc <= ?{shards.sql('user_id') if shards else ''}
+        ORDER BY scheduled_time_utc ASC, id ASC
         """,
         (follow_up_after.isoformat(),)
     )
@@ -215,38 +289,7 @@ async def get_follow_up_reminders(follow_up_after: datetime) -> List[dict]:
     return result
 
 
-async def mark_initial_reminder_sent(reminder_id: int) -> None:
-    """Mark that the initial reminder has been sent."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        UPDATE reminders 
-        SET initial_reminder_sent = 1, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-        """,
-        (reminder_id,)
-    )
-    conn.commit()
-    conn.close()
-
-
-async def mark_follow_up_sent(reminder_id: int) -> None:
-    """Mark that a follow-up has been sent for a reminder."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        UPDATE reminders 
-        SET follow_up_sent = 1, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-        """,
-        (reminder_id,)
-    )
-    conn.commit()
-    conn.close()
-
-
+@timed_query
 async def reschedule_reminder_for_followup(reminder_id: int, new_scheduled_time: datetime) -> None:
     """Reschedule a reminder and reset follow-up flags."""
     conn = get_connection()
@@ -266,6 +309,7 @@ async def reschedule_reminder_for_followup(reminder_id: int, new_scheduled_time:
     conn.close()
 
 
+@timed_query
 async def update_reminder_status(reminder_id: int, status: str) -> None:
     """Update the status of a reminder."""
     conn = get_connection()
@@ -282,6 +326,7 @@ async def update_reminder_status(reminder_id: int, status: str) -> None:
     conn.close()
 
 
+@timed_query
 async def reschedule_reminder(reminder_id: int, new_time: datetime) -> None:
     """Reschedule a reminder to a new time (UTC)."""
     conn = get_connection()
@@ -301,6 +346,7 @@ async def reschedule_reminder(reminder_id: int, new_time: datetime) -> None:
     conn.close()
 
 
+@timed_query
 async def get_user_reminders(user_id: int, status: Optional[str] = None) -> List[dict]:
     """Get all reminders for a specific user."""
     conn = get_connection()
@@ -333,6 +379,7 @@ async def get_user_reminders(user_id: int, status: Optional[str] = None) -> List
     return result
 
 
+@timed_query
 async def get_reminder_by_id(reminder_id: int) -> Optional[dict]:
     """Get a specific reminder by ID."""
     conn = get_connection()
@@ -340,7 +387,8 @@ async def get_reminder_by_id(reminder_id: int) -> Optional[dict]:
     cursor.execute(
         """
         SELECT id, user_id, chat_id, task_text, scheduled_time_utc, 
-               user_timezone, status, follow_up_sent
+               user_timezone, status, initial_reminder_sent, follow_up_sent, notes, location,
+               recurrence_type, recurrence_time, recurrence_rule, next_fire_utc
         FROM reminders
         WHERE id = ?
         """,
@@ -352,6 +400,7 @@ async def get_reminder_by_id(reminder_id: int) -> Optional[dict]:
     return result
 
 
+@timed_query
 async def delete_reminder(reminder_id: int) -> bool:
     """Delete a reminder by ID."""
     conn = get_connection()
@@ -366,6 +415,7 @@ async def delete_reminder(reminder_id: int) -> bool:
     return rowcount > 0
 
 
+@timed_query
 async def get_latest_pending_reminder(user_id: int) -> Optional[dict]:
     """Get the most recently created pending reminder for a user."""
     conn = get_connection()
@@ -374,7 +424,7 @@ async def get_latest_pending_reminder(user_id: int) -> Optional[dict]:
         """
         SELECT id, user_id, chat_id, task_text, scheduled_time_utc, 
                user_timezone, status, follow_up_sent, notes, location,
-               recurrence_type, recurrence_time
+               recurrence_type, recurrence_time, recurrence_rule, next_fire_utc
         FROM reminders
         WHERE user_id = ? AND status = 'pending' AND follow_up_sent = 1
         ORDER BY scheduled_time_utc DESC
@@ -390,6 +440,7 @@ async def get_latest_pending_reminder(user_id: int) -> Optional[dict]:
 
 # ============ User Preferences Functions ============
 
+@timed_query
 async def get_user_preferences(user_id: int) -> Optional[dict]:
     """Get user preferences (timezone, language)."""
     conn = get_connection()
@@ -404,6 +455,7 @@ async def get_user_preferences(user_id: int) -> Optional[dict]:
     return result
 
 
+@timed_query
 async def set_user_preferences(
     user_id: int,
     timezone: Optional[str] = None,
@@ -446,6 +498,7 @@ async def set_user_preferences(
 
 # ============ Rate Limiting Functions ============
 
+@timed_query
 async def check_rate_limit(user_id: int, limit: int, window_seconds: int) -> bool:
     """Check if user is within rate limits."""
     conn = get_connection()
@@ -482,92 +535,298 @@ async def check_rate_limit(user_id: int, limit: int, window_seconds: int) -> boo
 
 # ============ Startup Recovery ============
 
-async def get_all_pending_reminders() -> List[dict]:
-    """Get ALL pending reminders for restart recovery."""
+@timed_query
+async def complete_stale_reminders(cutoff: datetime) -> int:
+    """
+    Close every one-off pending reminder scheduled before the cutoff in one statement.
+    Recurring reminders are left for the caller to advance to their next slot.
+    
+    Returns:
+        Number of reminders marked completed.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         """
-        SELECT id, user_id, chat_id, task_text, notes, location, scheduled_time_utc, 
-               user_timezone, follow_up_sent, status, recurrence_type, recurrence_time
-        FROM reminders
+        UPDATE reminders 
+        SET status = 'completed', updated_at = CURRENT_TIMESTAMP
         WHERE status = 'pending'
-        ORDER BY scheduled_time_utc ASC
+        AND recurrence_type IS NULL
+        AND scheduled_time_utc < ?
+        """,
+        (cutoff.isoformat(),)
+    )
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+
+async def iter_pending_reminders(
+    before_time: datetime,
+    batch_size: int = 500,
+    shards: Optional[Shards] = None
+) -> AsyncIterator[List[dict]]:
+    """
+    Stream pending reminders scheduled up to the given time, oldest first.
+    Uses keyset pagination on (scheduled_time_utc, id), so no read
+    transaction is held open between batches and callers may update the
+    rows they receive.
+    
+    Args:
+        before_time: Upper bound for scheduled_time_utc (UTC).
+        batch_size: Rows per batch.
+        shards: Only reminders of users in these shards (default: all).
+    
+    Yields:
+        Lists of reminder dicts, at most batch_size each.
+    """
+    last_time = None
+    last_id = 0
+    while True:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT id, user_id, chat_id, task_text, notes, location, scheduled_time_utc, 
+                   user_timezone, initial_reminder_sent, follow_up_sent, status,
+                   recurrence_type, recurrence_time, recurrence_rule, next_fire_utc
+            FROM reminders
+            WHERE status = 'pending'
+            AND scheduled_time_utc <= ?
+            AND (? IS NULL OR scheduled_time_utc > ? OR (scheduled_time_utc = ? AND id > ?)){shards.sql('user_id') if shards else ''}
+            ORDER BY scheduled_time_utc ASC, id ASC
+            LIMIT ?
+            """,
+            (before_time.isoformat(), last_time, last_time, last_time, last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        batch = rows_to_dicts(cursor, rows)
+        conn.close()
+        
+        if not batch:
+            return
+        last_time = batch[-1]['scheduled_time_utc']
+        last_id = batch[-1]['id']
+        yield batch
+        if len(batch) < batch_size:
+            return
+
+
+@timed_query
+async def count_pending_reminders(after_time: datetime) -> int:
+    """Count pending reminders scheduled after the given time (UTC)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM reminders WHERE status = 'pending' AND scheduled_time_utc > ?",
+        (after_time.isoformat(),)
+    )
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
+def _record_fired_occurrence(cursor, reminder: dict, next_fire: datetime) -> None:
+    """
+    Log a fired occurrence and store the slot that follows it. The row is
+    kept and moved onto next_fire_utc by promote_due_recurrences once it
+    comes due. The caller commits.
+    """
+    cursor.execute(
         """
+        UPDATE reminders 
+        SET next_fire_utc = ?,
+            recurrence_rule = COALESCE(recurrence_rule, ?),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (next_fire.isoformat(), rule_for_reminder(reminder), reminder['id'])
     )
-    rows = cursor.fetchall()
-    result = rows_to_dicts(cursor, rows)
+    cursor.execute(
+        "INSERT INTO reminder_occurrences (reminder_id, scheduled_time_utc, event) VALUES (?, ?, 'fired')",
+        (reminder['id'], reminder['scheduled_time_utc'])
+    )
+
+
+@timed_query
+async def enqueue_notifications(
+    due: List[Tuple[dict, Optional[datetime]]],
+    follow_ups: List[dict],
+    kind: str = outbox.REMINDER
+) -> Tuple[int, int]:
+    """
+    Mark reminders as fired and queue their messages in the outbox, in one
+    transaction, so a crash can neither lose a reminder nor queue it twice.
+    Rows another worker or an edit changed since they were read are skipped.
+    
+    Args:
+        due: (reminder, next slot for recurring ones) pairs due for their initial message.
+        follow_ups: Reminders due for a follow-up question.
+        kind: Outbox kind of the initial messages (DELAYED for reminders
+            missed while the bot was down).
+    
+    Returns:
+        (reminders queued, follow-ups queued).
+    """
+    if not due and not follow_ups:
+        return 0, 0
+    conn = get_connection()
+    cursor = conn.cursor()
+    queued = 0
+    for reminder, next_fire in due:
+        cursor.execute(
+            """
+            UPDATE reminders 
+            SET initial_reminder_sent = 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND initial_reminder_sent = 0 AND scheduled_time_utc = ?
+            """,
+            (reminder['id'], reminder['scheduled_time_utc'])
+        )
+        if not cursor.rowcount:
+            continue
+        if reminder.get('recurrence_type') and next_fire:
+            _record_fired_occurrence(cursor, reminder, next_fire)
+        queued += outbox.enqueue(cursor, 'reminders', kind, reminder)
+    
+    queued_follow_ups = 0
+    for reminder in follow_ups:
+        cursor.execute(
+            """
+            UPDATE reminders 
+            SET follow_up_sent = 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND follow_up_sent = 0 AND scheduled_time_utc = ?
+            """,
+            (reminder['id'], reminder['scheduled_time_utc'])
+        )
+        if cursor.rowcount:
+            queued_follow_ups += outbox.enqueue(cursor, 'reminders', outbox.FOLLOW_UP, reminder)
+    conn.commit()
     conn.close()
-    return result
+    return queued, queued_follow_ups
 
 
-async def schedule_next_recurrence(reminder: dict) -> Optional[int]:
-    """Schedule the next occurrence of a recurring reminder."""
-    from dateutil import tz as tz_module
+@timed_query
+async def promote_due_recurrences(now: datetime, shards: Optional[Shards] = None) -> int:
+    """
+    Move recurring reminders whose next slot has arrived onto that slot.
+    Resets the sent flags so the scheduler fires them again.
     
-    recurrence_type = reminder.get('recurrence_type')
-    if not recurrence_type:
-        return None
+    Args:
+        now: Current UTC time.
+        shards: Only reminders of users in these shards (default: all).
     
-    recurrence_time = reminder.get('recurrence_time', '09:00')
-    user_tz = reminder.get('user_timezone', 'Asia/Tashkent')
-    
-    # Parse the recurrence time
-    try:
-        hour, minute = map(int, recurrence_time.split(':'))
-    except:
-        hour, minute = 9, 0
-    
-    # Get current time in user's timezone
-    user_timezone = tz_module.gettz(user_tz)
-    now_local = datetime.now(user_timezone)
-    
-    # Calculate next occurrence based on recurrence type
-    if recurrence_type == 'daily':
-        next_date = now_local + timedelta(days=1)
-    elif recurrence_type == 'weekdays':
-        next_date = now_local + timedelta(days=1)
-        while next_date.weekday() >= 5:
-            next_date += timedelta(days=1)
-    elif recurrence_type == 'weekly':
-        next_date = now_local + timedelta(weeks=1)
-    elif recurrence_type == 'monthly':
-        next_month = now_local.month + 1
-        next_year = now_local.year
-        if next_month > 12:
-            next_month = 1
-            next_year += 1
-        try:
-            next_date = now_local.replace(year=next_year, month=next_month)
-        except ValueError:
-            next_date = now_local.replace(year=next_year, month=next_month, day=28)
-    else:
+    Returns:
+        Number of reminders advanced.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        UPDATE reminders 
+        SET scheduled_time_utc = next_fire_utc,
+            next_fire_utc = NULL,
+            initial_reminder_sent = 0,
+            follow_up_sent = 0,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'pending'
+        AND recurrence_type IS NOT NULL
+        AND initial_reminder_sent = 1
+        AND next_fire_utc IS NOT NULL
+        AND next_fire_utc <= ?{shards.sql('user_id') if shards else ''}
+        """,
+        (now.isoformat(),)
+    )
+    conn.commit()
+    count = cursor.rowcount
+    conn.close()
+    return count
+
+
+@timed_query
+async def advance_recurrence(reminder: dict, event: str = 'done') -> Optional[datetime]:
+    """
+    Close the current occurrence of a recurring reminder and move it to its next slot.
+    
+    Args:
+        reminder: The reminder dictionary from database.
+        event: Outcome recorded in the occurrence log ('done', 'skipped').
+    
+    Returns:
+        The next occurrence (UTC), or None if the reminder is not recurring.
+    """
+    next_fire = reminder.get('next_fire_utc')
+    if next_fire:
+        next_fire = datetime.fromisoformat(next_fire)
+    if not next_fire or next_fire <= datetime.utcnow():
+        next_fire = next_fire_for_reminder(reminder)
+    if not next_fire:
         return None
     
-    # Set the time
-    next_datetime_local = next_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-    
-    # Convert to UTC
-    next_datetime_utc = next_datetime_local.astimezone(tz_module.UTC).replace(tzinfo=None)
-    
-    # Create new reminder
-    new_id = await add_reminder(
-        user_id=reminder['user_id'],
-        chat_id=reminder['chat_id'],
-        task_text=reminder['task_text'],
-        scheduled_time=next_datetime_utc,
-        user_timezone=user_tz,
-        notes=reminder.get('notes'),
-        location=reminder.get('location'),
-        recurrence_type=recurrence_type,
-        recurrence_time=recurrence_time
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        UPDATE reminders 
+        SET scheduled_time_utc = ?,
+            next_fire_utc = NULL,
+            initial_reminder_sent = 0,
+            follow_up_sent = 0,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (next_fire.isoformat(), reminder['id'])
+    )
+    cursor.execute(
+        "INSERT INTO reminder_occurrences (reminder_id, scheduled_time_utc, event) VALUES (?, ?, ?)",
+        (reminder['id'], reminder['scheduled_time_utc'], event)
     )
+    conn.commit()
+    conn.close()
+    return next_fire
+
+
+@timed_query
+async def advance_recurrences(items: List[Tuple[dict, datetime]], event: str = 'skipped') -> int:
+    """
+    Move many recurring reminders to precomputed next slots in one transaction.
+    
+    Args:
+        items: (reminder, next_fire) pairs, next_fire in UTC.
+        event: Outcome recorded in the occurrence log for each reminder.
     
-    return new_id
+    Returns:
+        Number of reminders advanced.
+    """
+    if not items:
+        return 0
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        """
+        UPDATE reminders 
+        SET scheduled_time_utc = ?,
+            next_fire_utc = NULL,
+            initial_reminder_sent = 0,
+            follow_up_sent = 0,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        [(next_fire.isoformat(), reminder['id']) for reminder, next_fire in items]
+    )
+    cursor.executemany(
+        "INSERT INTO reminder_occurrences (reminder_id, scheduled_time_utc, event) VALUES (?, ?, ?)",
+        [(reminder['id'], reminder['scheduled_time_utc'], event) for reminder, _ in items]
+    )
+    conn.commit()
+    conn.close()
+    return len(items)
 
 
 # ============ Admin Functions ============
 
+@timed_query
 async def get_all_reminders_admin(limit: int = 100) -> List[dict]:
     """Get all reminders for admin panel."""
     conn = get_connection()
@@ -589,23 +848,26 @@ async def get_all_reminders_admin(limit: int = 100) -> List[dict]:
     return result
 
 
-async def get_all_users_admin() -> List[dict]:
-    """Get all users with their reminder counts."""
+@timed_query
+async def get_all_users_admin(limit: int = 20, offset: int = 0) -> List[dict]:
+    """Get a page of users with their reminder counts, most recently active first."""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
-        """
+        f"""
         SELECT 
-            r.user_id,
-            COUNT(*) as total_reminders,
-            SUM(CASE WHEN r.status = 'pending' THEN 1 ELSE 0 END) as pending_reminders,
-            SUM(CASE WHEN r.status = 'done' THEN 1 ELSE 0 END) as completed_reminders,
-            MIN(r.created_at) as first_reminder,
-            MAX(r.created_at) as last_reminder
-        FROM reminders r
-        GROUP BY r.user_id
+            user_id,
+            total AS total_reminders,
+            pending AS pending_reminders,
+            done AS completed_reminders,
+            first_reminder,
+            last_reminder
+        FROM {stats.users_table_name("reminders")}
+        WHERE total > 0
         ORDER BY last_reminder DESC
-        """
+        LIMIT ? OFFSET ?
+        """,
+        (limit, offset)
     )
     rows = cursor.fetchall()
     result = rows_to_dicts(cursor, rows)
@@ -613,6 +875,7 @@ async def get_all_users_admin() -> List[dict]:
     return result
 
 
+@timed_query
 async def get_user_reminders_admin(user_id: int) -> List[dict]:
     """Get all reminders for a specific user (admin view)."""
     conn = get_connection()
@@ -634,41 +897,39 @@ async def get_user_reminders_admin(user_id: int) -> List[dict]:
     return result
 
 
+@timed_query
 async def get_stats_admin() -> dict:
-    """Get overall bot statistics."""
+    """Get overall bot statistics from the precomputed counters."""
     conn = get_connection()
     cursor = conn.cursor()
     
-    # Total reminders
-    cursor.execute("SELECT COUNT(*) FROM reminders")
-    total_reminders = cursor.fetchone()[0]
-    
-    # Pending reminders
-    cursor.execute("SELECT COUNT(*) FROM reminders WHERE status = 'pending'")
-    pending_reminders = cursor.fetchone()[0]
-    
-    # Unique users
-    cursor.execute("SELECT COUNT(DISTINCT user_id) FROM reminders")
-    total_users = cursor.fetchone()[0]
+    cursor.execute(stats.totals_query("reminders"))
+    totals = dict(cursor.fetchall())
     
-    # Today's reminders
-    cursor.execute(
-        "SELECT COUNT(*) FROM reminders WHERE DATE(created_at) = DATE('now')"
-    )
-    today_reminders = cursor.fetchone()[0]
-    
-    # Recurring reminders
-    cursor.execute(
-        "SELECT COUNT(*) FROM reminders WHERE recurrence_type IS NOT NULL AND status = 'pending'"
-    )
-    recurring_reminders = cursor.fetchone()[0]
+    cursor.execute(stats.daily_query("reminders"), (datetime.utcnow().date().isoformat(),))
+    today = dict(cursor.fetchall())
     
     conn.close()
     
-    return {
-        'total_reminders': total_reminders,
-        'pending_reminders': pending_reminders,
-        'total_users': total_users,
-        'today_reminders': today_reminders,
-        'recurring_reminders': recurring_reminders,
-    }
+    return stats.summarize(totals, today)
+
+
+# ============ Analytics Rollups ============
+
+@timed_query
+async def roll_up_reminder_events() -> int:
+    """Fold new reminder events into the rollup tables (runs in a worker thread)."""
+    return await asyncio.to_thread(rollups.run_rollup, get_connection, "reminders")
+
+
+@timed_query
+async def get_rollup_series_admin(
+    granularity: str = 'daily',
+    days: int = 14,
+    event: Optional[str] = None,
+    group_by: Optional[str] = None
+) -> List[dict]:
+    """Get a time series from the reminder rollups for the admin views."""
+    return await asyncio.to_thread(
+        rollups.query_rollup, get_connection, "reminders", granularity, days, event, group_by
+    )
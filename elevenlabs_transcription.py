@@ -10,6 +10,9 @@ from elevenlabs.client import ElevenLabs
 
 logger = logging.getLogger(__name__)
 
+# API root override (e.g. a local stand-in server); None uses ElevenLabs' own
+ELEVENLABS_API_BASE = os.getenv("ELEVENLABS_API_BASE") or None
+
 class ElevenLabsTranscriber:
     """Handles voice transcription using ElevenLabs Scribe API."""
     
@@ -23,7 +26,7 @@ class ElevenLabsTranscriber:
         if not api_key:
             raise ValueError("ElevenLabs API key is required")
         
-        self.client = ElevenLabs(api_key=api_key)
+        self.client = ElevenLabs(api_key=api_key, base_url=ELEVENLABS_API_BASE)
         logger.info("ElevenLabsTranscriber initialized")
     
     async def transcribe_voice(self, file_path: str, language: str = "uz") -> Optional[str]:
@@ -3,12 +3,16 @@ Gemini AI post-correction for Whisper transcriptions.
 Fixes common Uzbek STT errors using AI understanding.
 """
 
+import asyncio
 import logging
 import google.generativeai as genai
 from config import GEMINI_API_KEY
+import metrics
 
 logger = logging.getLogger(__name__)
 
+GEMINI_LATENCY = metrics.histogram('gemini_latency_seconds', "Gemini call latency by operation", ['operation'])
+
 # Configure Gemini
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
@@ -51,7 +55,8 @@ Return ONLY the corrected text, no explanations."""
 
         # Call Gemini
         model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
+        with GEMINI_LATENCY.time(operation='correct'):
+            response = await asyncio.to_thread(model.generate_content, prompt)
         
         corrected = response.text.strip()
         
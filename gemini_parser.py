@@ -3,15 +3,20 @@ Gemini AI-powered intelligent parsing for reminder tasks and times.
 Uses Google's Gemini model for natural language understanding.
 """
 
+import asyncio
 import logging
 import json
 from datetime import datetime, timedelta
 from typing import List, Tuple, Optional, Dict, Any
 import google.generativeai as genai
 from config import GEMINI_API_KEY, DEFAULT_TIMEZONE
+import metrics
+from tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
+GEMINI_LATENCY = metrics.histogram('gemini_latency_seconds', "Gemini call latency by operation", ['operation'])
+
 # Configure Gemini
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
@@ -21,6 +26,7 @@ else:
     model = None
 
 
+@traced('parse.gemini')
 async def parse_with_gemini(
     text: str,
     user_timezone: str = DEFAULT_TIMEZONE,
@@ -137,11 +143,12 @@ Return ONLY a JSON array with this exact format:
 If the text is not a reminder or makes no sense, return an empty array: []
 """
         
-        # Call Gemini
-        response = model.generate_content(prompt)
+        # Call Gemini (the SDK call blocks, so keep it off the event loop)
+        with GEMINI_LATENCY.time(operation='parse'), span('gemini.generate_content'):
+            response = await asyncio.to_thread(model.generate_content, prompt)
         result_text = response.text.strip()
         
-        logger.info(f"Gemini raw response: {result_text[:500]}")
+        logger.debug(f"Gemini raw response: {result_text[:500]}")
         
         # Extract JSON from response (remove markdown code blocks if present)
         if "```json" in result_text:
@@ -149,7 +156,7 @@ If the text is not a reminder or makes no sense, return an empty array: []
         elif "```" in result_text:
             result_text = result_text.split("```")[1].split("```")[0].strip()
         
-        logger.info(f"Gemini cleaned JSON: {result_text}")
+        logger.debug(f"Gemini cleaned JSON: {result_text}")
         
         # Parse JSON response
         reminders = json.loads(result_text)
@@ -6,6 +6,7 @@ Supports multiple languages including Russian and Uzbek.
 import logging
 import os
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ContextTypes,
@@ -19,6 +20,7 @@ from database import (
     reschedule_reminder,
     reschedule_reminder_for_followup,
     get_latest_pending_reminder,
+    get_reminder_by_id,
     delete_reminder,
     get_user_preferences,
     set_user_preferences,
@@ -27,9 +29,17 @@ from database import (
     get_all_users_admin,
     get_user_reminders_admin,
     get_stats_admin,
+    get_rollup_series_admin,
+    advance_recurrence,
 )
-from scheduler import schedule_next_recurrence
 from config import TRANSCRIPTION_SERVICE, WHISPER_MODEL_SIZE, ELEVENLABS_API_KEY, ADMIN_USER_IDS
+from scheduler import SCHEDULER_HEALTH
+from logging_setup import bind, get_levels, set_levels
+import profiling
+import metrics
+from tracing import current_span, span, traced
+
+STT_LATENCY = metrics.histogram('stt_latency_seconds', "Speech-to-text latency by backend", ['backend'])
 
 # Try to import Aisha API key
 try:
@@ -74,6 +84,7 @@ from time_parser import (
     parse_multiple_tasks,
     detect_timezone_from_location,
 )
+from timezones import is_valid_timezone
 from gemini_parser import parse_with_gemini
 from gemini_correction import correct_transcription
 from config import RATE_LIMIT_MESSAGES, RATE_LIMIT_WINDOW_SECONDS, USE_GEMINI_FALLBACK, ALWAYS_USE_GEMINI, USE_GEMINI_CORRECTION
@@ -87,6 +98,9 @@ WAITING_FOR_SNOOZE = 3
 WAITING_FOR_TIMEZONE = 4
 WAITING_FOR_TASK_CONFIRMATION = 5
 
+# Users listed per page by /users
+ADMIN_USERS_PAGE_SIZE = 20
+
 
 async def setup_bot_menu(application) -> None:
     """Set up the bot menu commands that appear when clicking the menu button."""
@@ -725,8 +739,7 @@ async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         else:
             # Try to use the input directly as timezone
             try:
-                from dateutil import tz as tz_module
-                if tz_module.gettz(tz_input):
+                if is_valid_timezone(tz_input):
                     await set_user_preferences(user_id, timezone=tz_input)
                     await update.message.reply_text(
                         f"✅ Vaqt zonasi: **{tz_input}**",
@@ -770,8 +783,7 @@ async def timezone_input_handler(update: Update, context: ContextTypes.DEFAULT_T
         timezone = detect_timezone_from_location(text)
     if not timezone:
         # Try as direct timezone string
-        from dateutil import tz as tz_module
-        if tz_module.gettz(text):
+        if is_valid_timezone(text):
             timezone = text
     
     if timezone:
@@ -792,11 +804,13 @@ async def timezone_input_handler(update: Update, context: ContextTypes.DEFAULT_T
     return ConversationHandler.END
 
 
+@traced('voice_message', root=True)
 async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle incoming voice messages - main transcription flow."""
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
     voice = update.message.voice
+    current_span().set_attributes(user_id=user_id, voice_duration_s=voice.duration, stt_backend=TRANSCRIPTION_SERVICE)
     
     # Check rate limiting
     if not await check_rate_limit(user_id, RATE_LIMIT_MESSAGES, RATE_LIMIT_WINDOW_SECONDS):
@@ -816,35 +830,41 @@ async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
     
     try:
         # Step 1: Transcribe the voice message
-        await update.message.reply_text(
-            "🎧 Ovozli xabaringizni qayta ishlamoqdaman...\n"
-            "Обрабатываю голосовое сообщение..."
-        )
+        with span('reply.ack'):
+            await update.message.reply_text(
+                "🎧 Ovozli xabaringizni qayta ishlamoqdaman...\n"
+                "Обрабатываю голосовое сообщение..."
+            )
         
         if USE_WHISPER or USE_ELEVENLABS or USE_AISHA_STT:
             # Download voice file for Whisper, ElevenLabs, or Aisha
-            voice_file = await context.bot.get_file(voice.file_id)
-            with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp_file:
-                voice_path = tmp_file.name
-                await voice_file.download_to_drive(voice_path)
+            with span('download') as download:
+                voice_file = await context.bot.get_file(voice.file_id)
+                with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp_file:
+                    voice_path = tmp_file.name
+                    await voice_file.download_to_drive(voice_path)
+                download.set_attribute('bytes', os.path.getsize(voice_path))
             
             logger.info(f"Downloaded voice message to {voice_path} ({os.path.getsize(voice_path)} bytes)")
             
             # Transcribe with selected service
-            if USE_AISHA_STT:
-                # Use Aisha.group STT (native Uzbek)
-                transcription = await transcribe_audio(voice_path, language=user_lang, api_key=AISHA_API_KEY)
-            elif USE_ELEVENLABS:
-                # Use ElevenLabs Scribe
-                transcription = await transcribe_audio(voice_path, language=user_lang, api_key=ELEVENLABS_API_KEY)
-            else:
-                # Use Whisper
-                transcription = await transcribe_audio(voice_path, model_size=WHISPER_MODEL_SIZE)
-                
+            with STT_LATENCY.time(backend=TRANSCRIPTION_SERVICE), span('transcribe', backend=TRANSCRIPTION_SERVICE):
+                if USE_AISHA_STT:
+                    # Use Aisha.group STT (native Uzbek)
+                    transcription = await transcribe_audio(voice_path, language=user_lang, api_key=AISHA_API_KEY)
+                elif USE_ELEVENLABS:
+                    # Use ElevenLabs Scribe
+                    transcription = await transcribe_audio(voice_path, language=user_lang, api_key=ELEVENLABS_API_KEY)
+                else:
+                    # Use Whisper
+                    transcription = await transcribe_audio(voice_path, model_size=WHISPER_MODEL_SIZE)
+            
+            if USE_WHISPER:
                 # Post-correct with Gemini if enabled
                 if USE_GEMINI_CORRECTION and transcription:
                     logger.info(f"Original Whisper: {transcription}")
-                    transcription = await correct_transcription(transcription, language=user_lang)
+                    with span('normalize'):
+                        transcription = await correct_transcription(transcription, language=user_lang)
                     logger.info(f"After Gemini correction: {transcription}")
             
             detected_lang = user_lang  # Use user preference, auto-detection handled by service
@@ -854,11 +874,12 @@ async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
                 os.remove(voice_path)
         else:
             # Use Google Cloud STT
-            transcription, detected_lang = await download_and_transcribe(
-                context.bot,
-                voice,
-                language_hint=user_lang
-            )
+            with STT_LATENCY.time(backend='google'):
+                transcription, detected_lang = await download_and_transcribe(
+                    context.bot,
+                    voice,
+                    language_hint=user_lang
+                )
         
         # Update user's language preference based on detection
         if detected_lang and detected_lang != user_lang:
@@ -892,10 +913,11 @@ async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
         if ALWAYS_USE_GEMINI:
             # Always use Gemini AI for better understanding
             logger.info("Using Gemini AI for parsing (ALWAYS_USE_GEMINI=true)")
-            await update.message.reply_text(
-                "🤖 AI yordamida tahlil qilyapman...\n"
-                "Анализирую с помощью AI..."
-            )
+            with span('reply.progress'):
+                await update.message.reply_text(
+                    "🤖 AI yordamida tahlil qilyapman...\n"
+                    "Анализирую с помощью AI..."
+                )
             
             gemini_results = await parse_with_gemini(
                 transcription,
@@ -988,6 +1010,7 @@ async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
             recurrence_time=recurrence_time
         )
         
+        current_span().set_attribute('reminder_id', reminder_id)
         formatted_time = format_datetime(scheduled_time, user_tz)
         
         # Build confirmation message with notes, location, and recurrence
@@ -1036,7 +1059,8 @@ async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
                 f"_Напомню в указанное время._"
             )
         
-        await update.message.reply_text(confirmation_msg, parse_mode='Markdown')
+        with span('reply'):
+            await update.message.reply_text(confirmation_msg, parse_mode='Markdown')
         
         logger.info(f"Created reminder {reminder_id} for user {user_id}: {task_text}, notes={notes}, location={location}, recurrence={recurrence_type}")
         return ConversationHandler.END
@@ -1066,6 +1090,7 @@ async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
     
     except TranscriptionError as e:
         logger.error(f"Transcription error: {e}")
+        current_span().record_exception(e)
         await update.message.reply_text(
             "❌ Xatolik yuz berdi. Keyinroq urinib ko'ring.\n"
             "Произошла ошибка. Попробуйте позже."
@@ -1074,6 +1099,7 @@ async def voice_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
     
     except Exception as e:
         logger.error(f"Error processing voice message: {e}")
+        current_span().record_exception(e)
         await update.message.reply_text(
             "❌ Xatolik yuz berdi. Qayta urinib ko'ring.\n"
             "Что-то пошло не так. Попробуйте ещё раз."
@@ -1226,16 +1252,59 @@ async def time_input_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return ConversationHandler.END
 
 
+def parse_follow_up_callback(data: str) -> Tuple[str, Optional[int]]:
+    """Split follow-up callback data like "reminder_yes:42" into (action, reminder id)."""
+    action, _, reminder_id = data.partition(':')
+    return action, int(reminder_id) if reminder_id.isdigit() else None
+
+
+def follow_up_reminder_id(message) -> Optional[int]:
+    """Read the reminder id from the YES/NO keyboard of a follow-up message, if any."""
+    markup = getattr(message, 'reply_markup', None) if message else None
+    if not markup or not getattr(markup, 'inline_keyboard', None):
+        return None
+    for row in markup.inline_keyboard:
+        for button in row:
+            if button.callback_data and button.callback_data.startswith('reminder_'):
+                return parse_follow_up_callback(button.callback_data)[1]
+    return None
+
+
+async def resolve_follow_up_reminder(user_id: int, reminder_id: Optional[int]) -> Optional[dict]:
+    """
+    Find the reminder a follow-up answer refers to.
+    
+    Args:
+        user_id: Telegram user answering the follow-up.
+        reminder_id: Reminder id from the follow-up keyboard, if known.
+    
+    Returns:
+        The reminder if it belongs to the user and is awaiting an answer, else None.
+    """
+    if reminder_id is None:
+        # Follow-ups sent before ids were encoded, or plain text answers
+        return await get_latest_pending_reminder(user_id)
+    
+    reminder = await get_reminder_by_id(reminder_id)
+    if (
+        not reminder
+        or reminder['user_id'] != user_id
+        or reminder['status'] != 'pending'
+        or not reminder.get('follow_up_sent')
+    ):
+        return None
+    return reminder
+
+
 async def yes_no_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle YES/NO button clicks for follow-up questions."""
     query = update.callback_query
     await query.answer()
     
     user_id = update.effective_user.id
-    action = query.data  # "reminder_yes" or "reminder_no"
+    action, reminder_id = parse_follow_up_callback(query.data)  # "reminder_yes:<id>" or "reminder_no:<id>"
     
-    # Get the most recent reminder that had a follow-up sent
-    reminder = await get_latest_pending_reminder(user_id)
+    reminder = await resolve_follow_up_reminder(user_id, reminder_id)
     
     if not reminder:
         await query.edit_message_text(
@@ -1248,12 +1317,9 @@ async def yes_no_callback_handler(update: Update, context: ContextTypes.DEFAULT_
     is_recurring = reminder.get('recurrence_type') is not None
     
     if action == "reminder_yes":
-        # Mark as done
-        await update_reminder_status(reminder['id'], 'done')
-        
-        # For recurring reminders, schedule the next occurrence
+        # Recurring reminders stay active and move to their next slot
         if is_recurring:
-            new_id = await schedule_next_recurrence(reminder)
+            await advance_recurrence(reminder, event='done')
             recurrence_labels = {
                 'daily': 'ertaga / завтра',
                 'weekly': 'kelasi hafta / на следующей неделе',
@@ -1271,6 +1337,7 @@ async def yes_no_callback_handler(update: Update, context: ContextTypes.DEFAULT_
                 parse_mode='Markdown'
             )
         else:
+            await update_reminder_status(reminder['id'], 'done')
             await query.edit_message_text(
                 f"✅ **Ajoyib!** Vazifa bajarildi!\n"
                 f"**Отлично!** Задача выполнена!\n\n"
@@ -1296,8 +1363,9 @@ async def yes_no_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     text = update.message.text.strip().upper()
     
-    # Get the most recent reminder that had a follow-up sent
-    reminder = await get_latest_pending_reminder(user_id)
+    # A reply to the follow-up message names the reminder; otherwise use the latest one
+    reminder_id = follow_up_reminder_id(update.message.reply_to_message)
+    reminder = await resolve_follow_up_reminder(user_id, reminder_id)
     
     if not reminder:
         # No pending reminder with follow-up - might be out of context
@@ -1312,12 +1380,9 @@ async def yes_no_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     negative = ["YO'Q", 'YOQ', 'YOʻQ', 'ЙУҚ', 'HALI', 'KEYINROQ', 'НЕТ', 'Н', 'ЕЩЁ НЕТ', 'ПОЗЖЕ', 'ОТЛОЖИТЬ']
     
     if text in positive:
-        # Mark as done
-        await update_reminder_status(reminder['id'], 'done')
-        
-        # For recurring reminders, schedule the next occurrence
+        # Recurring reminders stay active and move to their next slot
         if is_recurring:
-            new_id = await schedule_next_recurrence(reminder)
+            await advance_recurrence(reminder, event='done')
             recurrence_labels = {
                 'daily': 'ertaga / завтра',
                 'weekly': 'kelasi hafta / на следующей неделе',
@@ -1335,6 +1400,7 @@ async def yes_no_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 parse_mode='Markdown'
             )
         else:
+            await update_reminder_status(reminder['id'], 'done')
             await update.message.reply_text(
                 f"✅ **Ajoyib!** Vazifa bajarildi!\n"
                 f"**Отлично!** Задача выполнена!\n\n"
@@ -1494,6 +1560,8 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     
     # Get stats
     stats = await get_stats_admin()
+    health = SCHEDULER_HEALTH.snapshot()
+    health_icon = "🟢" if health['status'] == 'ok' else "🔴"
     
     message = (
         "📊 **Admin Panel**\n\n"
@@ -1501,17 +1569,90 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         f"📝 Total Reminders: {stats['total_reminders']}\n"
         f"⏳ Pending: {stats['pending_reminders']}\n"
         f"🔄 Recurring: {stats['recurring_reminders']}\n"
-        f"📅 Today: {stats['today_reminders']}\n\n"
+        f"📅 Today: {stats['today_reminders']}\n"
+        f"{health_icon} Scheduler: {health['status']} "
+        f"(lag p50/p95/p99: {health['lag_p50']:.1f}/{health['lag_p95']:.1f}/{health['lag_p99']:.1f}s, "
+        f"missed ticks: {health['missed_ticks']})\n\n"
         "**Commands:**\n"
         "/admin - This panel\n"
         "/users - List all users\n"
         "/reminders - Recent reminders\n"
-        "/user [id] - User's reminders"
+        "/user [id] - User's reminders\n"
+        "/trends [days] - Daily activity\n"
+        "/loglevel [logger] [LEVEL] - Log levels\n"
+        "/profiling [on|off|rate R|min MS] - Voice profiling"
     )
     
     await update.message.reply_text(message, parse_mode='Markdown')
 
 
+async def bind_update_log_context(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Attach update_id and user_id to every log record written while handling this update."""
+    if isinstance(update, Update):
+        bind(
+            update_id=update.update_id,
+            user_id=update.effective_user.id if update.effective_user else None
+        )
+
+
+async def admin_loglevel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /loglevel [logger] [LEVEL] command - show or change log levels at runtime."""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("⛔ Admin access required.")
+        return
+    
+    if len(context.args or []) == 2:
+        try:
+            set_levels({context.args[0]: context.args[1]})
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+        logger.info(f"Admin {user_id} set log level {context.args[0]}={context.args[1].upper()}")
+    
+    levels = "\n".join(f"`{name}`: {level}" for name, level in get_levels().items())
+    await update.message.reply_text(f"📜 **Log levels:**\n\n{levels}", parse_mode='Markdown')
+
+
+async def admin_profiling_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /profiling [on|off|rate R|min MS] command - show or change sampled profiling at runtime."""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("⛔ Admin access required.")
+        return
+    
+    args = [arg.lower() for arg in context.args or []]
+    changes = {}
+    if args[:1] in (['on'], ['off']):
+        changes['enabled'] = args[0] == 'on'
+    elif len(args) == 2 and args[0] in ('rate', 'min'):
+        changes['sample_rate' if args[0] == 'rate' else 'min_duration_ms'] = args[1]
+    
+    if changes:
+        try:
+            profiling.set_settings(changes)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+        logger.info(f"Admin {user_id} changed profiling settings: {changes}")
+    
+    settings = profiling.get_settings()
+    recent = profiling.list_profiles()[:5]
+    message = (
+        f"🔬 **Profiling:** {'on' if settings['enabled'] else 'off'} ({settings['backend']})\n"
+        f"Sample rate: {settings['sample_rate']:g}, saved if slower than {settings['min_duration_ms']:g} ms\n\n"
+    )
+    if recent:
+        message += "**Recent profiles:**\n" + "\n".join(
+            f"`{entry['name']}`" for entry in recent
+        ) + "\n\n_Download from /admin/api/profiles on the API server_"
+    else:
+        message += "_No profiles saved yet_"
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+
 async def admin_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /users command - list all users."""
     user_id = update.effective_user.id
@@ -1520,15 +1661,18 @@ async def admin_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("⛔ Admin access required.")
         return
     
-    users = await get_all_users_admin()
+    # /users [page] - 20 users per page
+    page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+    page = max(page, 1)
+    users = await get_all_users_admin(limit=ADMIN_USERS_PAGE_SIZE, offset=(page - 1) * ADMIN_USERS_PAGE_SIZE)
     
     if not users:
         await update.message.reply_text("No users found.")
         return
     
-    message = "👥 **All Users:**\n\n"
+    message = f"👥 **All Users (page {page}):**\n\n"
     
-    for user in users[:20]:  # Limit to 20 users
+    for user in users:
         message += (
             f"**ID: {user['user_id']}**\n"
             f"   📝 Total: {user['total_reminders']} | "
@@ -1538,6 +1682,8 @@ async def admin_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
     
     message += "_Use /user [id] to see user's reminders_"
+    if len(users) == ADMIN_USERS_PAGE_SIZE:
+        message += f"\n_Next page: /users {page + 1}_"
     
     await update.message.reply_text(message, parse_mode='Markdown')
 
@@ -1623,3 +1769,34 @@ async def admin_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         message += f"   📅 Created: {r['created_at'][:10]}\n\n"
     
     await update.message.reply_text(message, parse_mode='Markdown')
+
+
+async def admin_trends_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /trends [days] command - daily activity from the analytics rollups."""
+    user_id = update.effective_user.id
+    
+    if not is_admin(user_id):
+        await update.message.reply_text("⛔ Admin access required.")
+        return
+    
+    days = int(context.args[0]) if context.args and context.args[0].isdigit() else 7
+    days = min(max(days, 1), 90)
+    series = await get_rollup_series_admin('daily', days)
+    
+    if not series:
+        await update.message.reply_text("No activity recorded yet.")
+        return
+    
+    # bucket -> {event: count}
+    by_day = {}
+    for row in series:
+        by_day.setdefault(row['bucket'], {})[row['event']] = row['count']
+    
+    message = f"📈 **Last {days} days:**\n_created / fired / done / snoozed_\n\n"
+    for day, counts in sorted(by_day.items(), reverse=True):
+        message += (
+            f"`{day}`  {counts.get('created', 0)} / {counts.get('fired', 0)} / "
+            f"{counts.get('completed', 0)} / {counts.get('snoozed', 0)}\n"
+        )
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
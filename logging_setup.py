@@ -0,0 +1,200 @@
+"""
+Logging setup shared by the bot and the API server.
+Records go through a QueueHandler; a QueueListener thread does the actual
+formatting and I/O, so the event loop never blocks on stdout or log
+files. Output is JSON lines (or the classic text format) carrying context
+fields such as request_id, update_id, user_id and reminder_id. High-volume
+DEBUG lines are sampled per call site, and per-module levels can be
+changed while running.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Fields copied from the logging context (and from extra=...) into output
+CONTEXT_FIELDS = ('request_id', 'update_id', 'user_id', 'reminder_id', 'trace_id')
+
+_context: contextvars.ContextVar[Dict[str, object]] = contextvars.ContextVar('log_context', default={})
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """Attach fields (e.g. reminder_id=5) to every record logged inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind(**fields) -> None:
+    """Attach fields to the rest of the current task's records."""
+    _context.set({**_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current logging context onto each record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every N records below INFO, counted per call site, so a
+    debug line inside a hot loop cannot flood the output.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._seen: Dict[tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.INFO or self.every == 1:
+            return True
+        if not self.every:
+            return False
+        site = (record.pathname, record.lineno)
+        count = self._seen.get(site, 0)
+        self._seen[site] = count + 1
+        if count % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that merges args on the calling thread but leaves formatting to the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks can't cross the queue; render them here
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if getattr(record, 'sampled', None):
+            entry['sampled'] = f"1/{record.sampled}"
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse 'httpx=WARNING,scheduler=DEBUG' into a mapping."""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def set_levels(levels: Dict[str, str]) -> Dict[str, str]:
+    """
+    Change logger levels at runtime.
+
+    Args:
+        levels: Logger name ('root' for the root logger) to level name.
+
+    Returns:
+        The levels that were applied.
+
+    Raises:
+        ValueError: If a level name is not recognised.
+    """
+    applied = {}
+    for name, level in levels.items():
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+        logging.getLogger(None if name == 'root' else name).setLevel(level)
+        applied[name] = level
+    return applied
+
+
+def get_levels() -> Dict[str, str]:
+    """Explicitly configured logger levels, including the root logger."""
+    levels = {'root': logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.Logger.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(logger.level)
+    return levels
+
+
+def configure_logging(
+    handlers: List[logging.Handler],
+    level: str = 'INFO',
+    json_format: bool = True,
+    levels: Optional[Dict[str, str]] = None,
+    sample_rate: float = 0.1
+) -> None:
+    """
+    Route all logging through a queue to the given handlers.
+
+    Args:
+        handlers: Output handlers (stream, file...), run on the listener thread.
+        level: Root level.
+        json_format: JSON lines if True, the classic text format otherwise.
+        levels: Per-logger overrides, e.g. {'httpx': 'WARNING'}.
+        sample_rate: Fraction of DEBUG records kept per call site.
+    """
+    global _listener
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Filters run on the calling thread, where the context is visible
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    set_levels(levels or {})
+
+    if _listener is not None:
+        atexit.unregister(_listener.stop)
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,92 @@
+"""
+Migration script to collapse cloned recurring reminders into a single row.
+Older versions inserted a new row every time a recurring reminder fired;
+this backfills recurrence_rule, keeps one row per series and moves the
+clones into the occurrence log.
+Run this once after deploying recurrence rules.
+"""
+
+import sqlite3
+from config import DATABASE_PATH
+from database import init_database
+from recurrence import rule_for_reminder
+
+# (reminders table, occurrence log table)
+TABLES = [
+    ("reminders", "reminder_occurrences"),
+    ("app_reminders", "app_reminder_occurrences"),
+]
+
+
+def collapse(cursor, table: str, log_table: str) -> tuple:
+    cursor.execute(f"""
+        SELECT id, user_id, task_text, scheduled_time_utc, user_timezone, status,
+               initial_reminder_sent, recurrence_type, recurrence_time, recurrence_rule
+        FROM {table}
+        WHERE recurrence_type IS NOT NULL
+        ORDER BY id ASC
+    """)
+    columns = [d[0] for d in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # Group clones of the same series
+    series = {}
+    for row in rows:
+        key = (row['user_id'], row['task_text'], row['recurrence_type'], row['recurrence_time'])
+        series.setdefault(key, []).append(row)
+
+    backfilled = 0
+    removed = 0
+    for clones in series.values():
+        # Keep the newest pending row that has not fired yet, else the newest row
+        unfired = [r for r in clones if r['status'] == 'pending' and not r['initial_reminder_sent']]
+        survivor = (unfired or clones)[-1]
+
+        if not survivor['recurrence_rule']:
+            cursor.execute(
+                f"UPDATE {table} SET recurrence_rule = ? WHERE id = ?",
+                (rule_for_reminder(survivor), survivor['id'])
+            )
+            backfilled += 1
+
+        for clone in clones:
+            if clone['id'] == survivor['id']:
+                continue
+            event = 'done' if clone['status'] == 'done' else 'fired'
+            cursor.execute(
+                f"INSERT INTO {log_table} (reminder_id, scheduled_time_utc, event) VALUES (?, ?, ?)",
+                (survivor['id'], clone['scheduled_time_utc'], event)
+            )
+            cursor.execute(f"DELETE FROM {table} WHERE id = ?", (clone['id'],))
+            removed += 1
+
+    return len(series), backfilled, removed
+
+
+def migrate():
+    # Adds the recurrence_rule / next_fire_utc columns and the occurrence log
+    init_database()
+
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    existing_tables = {row[0] for row in cursor.fetchall()}
+
+    for table, log_table in TABLES:
+        if table not in existing_tables or log_table not in existing_tables:
+            print(f"⚠️  {table}: table missing, skipped")
+            continue
+
+        series_count, backfilled, removed = collapse(cursor, table, log_table)
+        print(f"✅ {table}:")
+        print(f"   - Recurring series: {series_count}")
+        print(f"   - Rules backfilled: {backfilled}")
+        print(f"   - Cloned rows moved to {log_table}: {removed}")
+
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    migrate()
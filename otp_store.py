@@ -0,0 +1,344 @@
+"""
+OTP code storage with expiry, attempt counting and send throttling.
+MemoryOtpStore keeps codes in a dict with a min-heap of expiry times, so
+expired codes are dropped by popping the heap instead of scanning every
+entry. SqliteOtpStore keeps them in a table shared by all API workers.
+
+When an external service holds the code, the store only throttles sends
+and counts verification attempts (count_attempt) before the service is
+asked.
+"""
+
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+OTP_TTL_SECONDS = 300
+OTP_RESEND_SECONDS = 60
+OTP_MAX_ATTEMPTS = 5
+
+# Verification outcomes
+VERIFIED = 'verified'
+NOT_FOUND = 'not_found'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+INVALID = 'invalid'
+# Attempt counted; the external service holding the code decides
+PENDING = 'pending'
+
+
+class MemoryOtpStore:
+    """Process-local OTP store (single worker only)."""
+
+    def __init__(
+        self,
+        ttl: int = OTP_TTL_SECONDS,
+        resend_interval: int = OTP_RESEND_SECONDS,
+        max_attempts: int = OTP_MAX_ATTEMPTS
+    ):
+        self.ttl = ttl
+        self.resend_interval = resend_interval
+        self.max_attempts = max_attempts
+        # phone -> {"code", "expires", "sent_at", "attempts"}
+        self._entries: Dict[str, dict] = {}
+        # (expires, phone); stale items are skipped when popped
+        self._expiry: List[Tuple[float, str]] = []
+
+    def _purge(self, now: float) -> None:
+        """Drop codes whose expiry has passed, oldest first."""
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, phone = heapq.heappop(self._expiry)
+            entry = self._entries.get(phone)
+            # A resend pushed a newer expiry for this phone; keep it
+            if entry and entry["expires"] == expires:
+                del self._entries[phone]
+
+    async def issue(self, phone: str, code: Optional[str]) -> int:
+        """
+        Store a new code for a phone unless one was sent too recently.
+
+        Args:
+            phone: Phone number in E.164 format.
+            code: The code to store (None when an external service holds
+                the code and only throttling is needed).
+
+        Returns:
+            0 if the code was stored, otherwise seconds until a resend is allowed.
+        """
+        now = time.time()
+        self._purge(now)
+
+        entry = self._entries.get(phone)
+        if entry:
+            wait = entry["sent_at"] + self.resend_interval - now
+            if wait > 0:
+                return int(wait) + 1
+
+        expires = now + self.ttl
+        self._entries[phone] = {"code": code, "expires": expires, "sent_at": now, "attempts": 0}
+        heapq.heappush(self._expiry, (expires, phone))
+        return 0
+
+    async def verify(self, phone: str, code: str) -> Tuple[str, int]:
+        """
+        Check a code, counting failed attempts.
+
+        Args:
+            phone: Phone number in E.164 format.
+            code: Code entered by the user.
+
+        Returns:
+            (status, remaining_attempts) where status is one of VERIFIED,
+            NOT_FOUND, EXPIRED, LOCKED or INVALID.
+        """
+        now = time.time()
+        entry = self._entries.get(phone)
+        if not entry:
+            return NOT_FOUND, 0
+
+        if entry["expires"] <= now:
+            del self._entries[phone]
+            return EXPIRED, 0
+
+        if entry["attempts"] >= self.max_attempts:
+            del self._entries[phone]
+            return LOCKED, 0
+
+        if entry["code"] != code:
+            entry["attempts"] += 1
+            return INVALID, self.max_attempts - entry["attempts"]
+
+        del self._entries[phone]
+        return VERIFIED, 0
+
+    async def count_attempt(self, phone: str) -> Tuple[str, int]:
+        """
+        Count a verification attempt for a code an external service checks.
+
+        Returns:
+            (status, remaining_attempts) where status is PENDING if the
+            service may be asked, otherwise NOT_FOUND, EXPIRED or LOCKED.
+        """
+        now = time.time()
+        entry = self._entries.get(phone)
+        if not entry:
+            return NOT_FOUND, 0
+
+        if entry["expires"] <= now:
+            del self._entries[phone]
+            return EXPIRED, 0
+
+        if entry["attempts"] >= self.max_attempts:
+            del self._entries[phone]
+            return LOCKED, 0
+
+        entry["attempts"] += 1
+        return PENDING, self.max_attempts - entry["attempts"]
+
+    async def release(self, phone: str) -> None:
+        """Forget a phone's code and resend throttle (the send failed or the code was used)."""
+        self._entries.pop(phone, None)
+
+
+OTP_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS otp_codes (
+        phone TEXT PRIMARY KEY,
+        code TEXT,
+        expires_at REAL NOT NULL,
+        sent_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0
+    )
+"""
+OTP_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_otp_codes_expires ON otp_codes(expires_at)"
+
+
+class SqliteOtpStore:
+    """OTP store in a SQLite table, shared by every worker using the same file."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: int = OTP_TTL_SECONDS,
+        resend_interval: int = OTP_RESEND_SECONDS,
+        max_attempts: int = OTP_MAX_ATTEMPTS
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.resend_interval = resend_interval
+        self.max_attempts = max_attempts
+        self._initialized = False
+
+    async def _connect(self) -> aiosqlite.Connection:
+        # Autocommit mode so each operation controls its own transaction
+        db = await aiosqlite.connect(self.path, timeout=5.0, isolation_level=None)
+        if not self._initialized:
+            await db.execute(OTP_TABLE_SQL)
+            await db.execute(OTP_INDEX_SQL)
+            self._initialized = True
+        return db
+
+    async def issue(self, phone: str, code: Optional[str]) -> int:
+        """
+        Store a new code for a phone unless one was sent too recently.
+
+        Args:
+            phone: Phone number in E.164 format.
+            code: The code to store (None when an external service holds
+                the code and only throttling is needed).
+
+        Returns:
+            0 if the code was stored, otherwise seconds until a resend is allowed.
+        """
+        now = time.time()
+        db = await self._connect()
+        try:
+            # Expired rows are found through the expires_at index
+            await db.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (now,))
+            # The upsert only replaces a code sent long enough ago, so two
+            # workers racing on the same phone cannot both send
+            cursor = await db.execute(
+                """
+                INSERT INTO otp_codes (phone, code, expires_at, sent_at, attempts)
+                VALUES (?, ?, ?, ?, 0)
+                ON CONFLICT(phone) DO UPDATE SET
+                    code = excluded.code,
+                    expires_at = excluded.expires_at,
+                    sent_at = excluded.sent_at,
+                    attempts = 0
+                WHERE otp_codes.sent_at <= ?
+                """,
+                (phone, code, now + self.ttl, now, now - self.resend_interval)
+            )
+            if cursor.rowcount:
+                return 0
+
+            cursor = await db.execute("SELECT sent_at FROM otp_codes WHERE phone = ?", (phone,))
+            row = await cursor.fetchone()
+            if not row:
+                return 0
+            return int(row[0] + self.resend_interval - now) + 1
+        finally:
+            await db.close()
+
+    async def verify(self, phone: str, code: str) -> Tuple[str, int]:
+        """
+        Check a code, counting failed attempts.
+
+        Args:
+            phone: Phone number in E.164 format.
+            code: Code entered by the user.
+
+        Returns:
+            (status, remaining_attempts) where status is one of VERIFIED,
+            NOT_FOUND, EXPIRED, LOCKED or INVALID.
+        """
+        now = time.time()
+        db = await self._connect()
+        try:
+            # Take the write lock up front so concurrent guesses are counted
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = await db.execute(
+                    "SELECT code, expires_at, attempts FROM otp_codes WHERE phone = ?",
+                    (phone,)
+                )
+                row = await cursor.fetchone()
+                if not row:
+                    status, remaining = NOT_FOUND, 0
+                else:
+                    stored_code, expires_at, attempts = row
+                    if expires_at <= now:
+                        status, remaining = EXPIRED, 0
+                    elif attempts >= self.max_attempts:
+                        status, remaining = LOCKED, 0
+                    elif stored_code != code:
+                        status, remaining = INVALID, self.max_attempts - attempts - 1
+                    else:
+                        status, remaining = VERIFIED, 0
+
+                    if status == INVALID:
+                        await db.execute(
+                            "UPDATE otp_codes SET attempts = attempts + 1 WHERE phone = ?",
+                            (phone,)
+                        )
+                    else:
+                        await db.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+                await db.execute("COMMIT")
+            except Exception:
+                await db.execute("ROLLBACK")
+                raise
+            return status, remaining
+        finally:
+            await db.close()
+
+    async def count_attempt(self, phone: str) -> Tuple[str, int]:
+        """
+        Count a verification attempt for a code an external service checks.
+
+        Returns:
+            (status, remaining_attempts) where status is PENDING if the
+            service may be asked, otherwise NOT_FOUND, EXPIRED or LOCKED.
+        """
+        now = time.time()
+        db = await self._connect()
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = await db.execute(
+                    "SELECT expires_at, attempts FROM otp_codes WHERE phone = ?",
+                    (phone,)
+                )
+                row = await cursor.fetchone()
+                if not row:
+                    status, remaining = NOT_FOUND, 0
+                else:
+                    expires_at, attempts = row
+                    if expires_at <= now:
+                        status, remaining = EXPIRED, 0
+                    elif attempts >= self.max_attempts:
+                        status, remaining = LOCKED, 0
+                    else:
+                        status, remaining = PENDING, self.max_attempts - attempts - 1
+
+                    if status == PENDING:
+                        await db.execute(
+                            "UPDATE otp_codes SET attempts = attempts + 1 WHERE phone = ?",
+                            (phone,)
+                        )
+                    else:
+                        await db.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+                await db.execute("COMMIT")
+            except Exception:
+                await db.execute("ROLLBACK")
+                raise
+            return status, remaining
+        finally:
+            await db.close()
+
+    async def release(self, phone: str) -> None:
+        """Forget a phone's code and resend throttle (the send failed or the code was used)."""
+        db = await self._connect()
+        try:
+            await db.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+        finally:
+            await db.close()
+
+
+def create_otp_store(backend: str, path: str):
+    """
+    Build the configured OTP store.
+
+    Args:
+        backend: 'sqlite' (shared between workers) or 'memory'.
+        path: SQLite database file for the sqlite backend.
+    """
+    if backend == 'memory':
+        logger.info("Using in-memory OTP store")
+        return MemoryOtpStore()
+    logger.info(f"Using SQLite OTP store at {path}")
+    return SqliteOtpStore(path)
@@ -0,0 +1,316 @@
+"""
+Transactional outbox for reminder notifications.
+The scheduler scan does not send anything itself: in the same transaction
+that marks a reminder as fired (and moves a recurring one on), it queues
+one outbox row per notification under an idempotency key, so a rescan or
+a second worker can never queue it twice. Dispatchers lease batches of
+ready rows, send them with bounded concurrency (each user's in order) and
+ack or reschedule the whole batch in one write; failed sends back off
+exponentially and are given up after MAX_ATTEMPTS.
+
+Delivery is at least once: a dispatcher that dies between sending and
+acking leaves a lease that expires, and the row is sent again. The
+idempotency key travels with the notification so receivers that can (the
+app, for pushes) drop the duplicate.
+
+Works on a plain DB-API connection (sqlite3 or libsql), so callers run it
+in a worker thread.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from coordination import Shards
+
+logger = logging.getLogger(__name__)
+
+# Row status
+PENDING = 'pending'
+SENT = 'sent'
+DEAD = 'dead'
+
+# Notification kinds
+REMINDER = 'reminder'
+DELAYED = 'delayed'
+FOLLOW_UP = 'follow_up'
+
+BATCH_SIZE = 200
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Sent and dead rows are kept this long for inspection, then pruned
+RETENTION_DAYS = 7
+PRUNE_BATCH_SIZE = 5000
+
+
+class Undeliverable(Exception):
+    """Raised by a send callback when retrying cannot help (e.g. the user blocked the bot)."""
+
+
+def outbox_table(reminders_table: str) -> str:
+    return f"{reminders_table}_outbox"
+
+
+def schema_statements(reminders_table: str) -> List[str]:
+    """Idempotent CREATE statements for the outbox of a reminders table."""
+    table = outbox_table(reminders_table)
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            reminder_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_ready ON {table}(status, available_at)",
+    ]
+
+
+def idempotency_key(reminders_table: str, reminder: dict, kind: str) -> str:
+    """One key per reminder occurrence and notification kind."""
+    return f"{reminders_table}:{reminder['id']}:{reminder['scheduled_time_utc']}:{kind}"
+
+
+def enqueue(cursor, reminders_table: str, kind: str, reminder: dict) -> bool:
+    """
+    Queue a notification inside the caller's transaction.
+
+    Args:
+        cursor: Cursor of the transaction that marks the reminder as fired.
+        reminders_table: Reminders table the reminder belongs to.
+        kind: REMINDER, DELAYED or FOLLOW_UP.
+        reminder: Reminder row; stored as the payload the sender receives.
+
+    Returns:
+        False if this notification was already queued.
+    """
+    now = time.time()
+    cursor.execute(
+        f"""
+        INSERT OR IGNORE INTO {outbox_table(reminders_table)}
+            (idempotency_key, kind, reminder_id, user_id, payload, available_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            idempotency_key(reminders_table, reminder, kind), kind, reminder['id'], reminder['user_id'],
+            json.dumps(reminder, default=str, ensure_ascii=False), now, now
+        )
+    )
+    return cursor.rowcount == 1
+
+
+def lease(
+    connect: Callable,
+    reminders_table: str,
+    owner: str,
+    limit: int = BATCH_SIZE,
+    ttl: float = LEASE_SECONDS,
+    shards: Optional[Shards] = None
+) -> Tuple[str, List[dict]]:
+    """
+    Lease up to `limit` ready notifications, oldest first.
+
+    Returns:
+        (batch token, items); each item has id, kind, idempotency_key,
+        attempts and reminder (the payload).
+    """
+    table = outbox_table(reminders_table)
+    token = f"{owner}:{uuid.uuid4().hex[:8]}"
+    now = time.time()
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            UPDATE {table}
+            SET lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM {table}
+                WHERE status = 'pending' AND available_at <= ?
+                AND (lease_expires_at IS NULL OR lease_expires_at <= ?){shards.sql('user_id') if shards else ''}
+                ORDER BY id
+                LIMIT ?
+            )
+            """,
+            (token, now + ttl, now, now, limit)
+        )
+        leased = cursor.rowcount
+        if leased:
+            cursor.execute(
+                f"SELECT id, kind, idempotency_key, attempts, payload FROM {table} WHERE lease_owner = ? ORDER BY id",
+                (token,)
+            )
+            rows = cursor.fetchall()
+        else:
+            # Idle: a good moment to drop old history
+            rows = []
+            cutoff = now - RETENTION_DAYS * 86400
+            cursor.execute(
+                f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE status != 'pending' AND created_at < ? LIMIT ?
+                )
+                """,
+                (cutoff, PRUNE_BATCH_SIZE)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    items = [
+        {'id': row[0], 'kind': row[1], 'idempotency_key': row[2], 'attempts': row[3], 'reminder': json.loads(row[4])}
+        for row in rows
+    ]
+    return token, items
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next attempt after `attempts` failed ones."""
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def complete(
+    connect: Callable,
+    reminders_table: str,
+    token: str,
+    items: List[dict],
+    errors: Dict[int, Optional[BaseException]]
+) -> Tuple[int, int, int]:
+    """
+    Ack a leased batch in one transaction: sent rows are closed, failed ones
+    rescheduled with backoff or given up. Rows whose lease has meanwhile
+    passed to another dispatcher are left alone.
+
+    Args:
+        token: Batch token from lease().
+        items: The leased items.
+        errors: Item id -> exception for the sends that failed.
+
+    Returns:
+        (sent, retried, dead) counts of the rows this batch still held.
+    """
+    table = outbox_table(reminders_table)
+    now = time.time()
+    sent = [item['id'] for item in items if item['id'] not in errors]
+    acked = retried = dead = 0
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        if sent:
+            cursor.execute(
+                f"""
+                UPDATE {table}
+                SET status = 'sent', sent_at = ?, lease_owner = NULL, lease_expires_at = NULL
+                WHERE lease_owner = ? AND id IN ({', '.join('?' * len(sent))})
+                """,
+                (now, token, *sent)
+            )
+            acked = cursor.rowcount
+        for item in items:
+            if item['id'] not in errors:
+                continue
+            error = errors[item['id']]
+            give_up = isinstance(error, Undeliverable) or item['attempts'] >= MAX_ATTEMPTS
+            cursor.execute(
+                f"""
+                UPDATE {table}
+                SET status = ?, available_at = ?, last_error = ?, lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND lease_owner = ?
+                """,
+                (DEAD if give_up else PENDING, now + retry_delay(item['attempts']),
+                 f"{type(error).__name__}: {error}"[:500], item['id'], token)
+            )
+            if not cursor.rowcount:
+                continue
+            if give_up:
+                dead += 1
+            else:
+                retried += 1
+        conn.commit()
+    finally:
+        conn.close()
+    return acked, retried, dead
+
+
+async def deliver(
+    items: List[dict],
+    send: Callable[[dict], Awaitable[None]],
+    concurrency: int
+) -> Dict[int, Optional[BaseException]]:
+    """
+    Send a batch with bounded concurrency; each user's items go one at a
+    time in batch order.
+
+    Returns:
+        Item id -> exception for the failed sends.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    # Tasks start in batch order and asyncio locks are FIFO, so each user's queue keeps that order
+    user_locks: Dict[int, asyncio.Lock] = {}
+    errors: Dict[int, Optional[BaseException]] = {}
+
+    async def run(item: dict) -> None:
+        async with user_locks.setdefault(item['reminder']['user_id'], asyncio.Lock()), semaphore:
+            try:
+                await send(item)
+            except Exception as e:
+                errors[item['id']] = e
+
+    await asyncio.gather(*(run(item) for item in items))
+    return errors
+
+
+async def dispatch(
+    connect: Callable,
+    reminders_table: str,
+    owner: str,
+    send: Callable[[dict], Awaitable[None]],
+    shards: Optional[Shards] = None,
+    concurrency: int = 20,
+    batch_size: int = BATCH_SIZE
+) -> Tuple[int, int, int]:
+    """
+    Lease and deliver ready notifications until none are left.
+
+    Args:
+        connect: Returns a new DB-API connection.
+        reminders_table: Reminders table whose outbox to drain.
+        owner: Identity of this dispatcher, for leases.
+        send: Coroutine function delivering one item; raise to retry it
+            later, or Undeliverable to give it up.
+        shards: Only notifications of users in these shards (default: all).
+        concurrency: Sends in flight at once.
+        batch_size: Items leased (and acked) per round trip.
+
+    Returns:
+        (sent, retried, dead) totals.
+    """
+    totals = [0, 0, 0]
+    while True:
+        token, items = await asyncio.to_thread(lease, connect, reminders_table, owner, batch_size, shards=shards)
+        if not items:
+            break
+        errors = await deliver(items, send, concurrency)
+        counts = await asyncio.to_thread(complete, connect, reminders_table, token, items, errors)
+        totals = [total + count for total, count in zip(totals, counts)]
+        if counts[2]:
+            logger.warning(f"Gave up on {counts[2]} {reminders_table} notification(s) after repeated failures")
+        if len(items) < batch_size:
+            break
+    return tuple(totals)
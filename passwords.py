@@ -0,0 +1,123 @@
+"""
+Password hashing with scrypt, run off the event loop.
+Hashes are stored as 'scrypt$<n>$<r>$<p>$<salt>$<hash>' (base64 fields).
+The KDF runs in a bounded thread pool (hashlib releases the GIL while
+hashing), so logins do not stall other requests and concurrent logins
+cannot exhaust memory. Legacy unsalted SHA-256 hashes still verify and
+are flagged for rehashing.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# scrypt cost; memory per hash is 128 * N * r bytes (16 MiB at the defaults)
+SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# Concurrent KDF runs; further logins queue for a worker
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+
+PREFIX = 'scrypt'
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password')
+    return _executor
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * n * r * (p + 1) + 1024 * 1024,
+        dklen=HASH_BYTES
+    )
+
+
+def hash_password_sync(
+    password: str,
+    n: Optional[int] = None,
+    r: Optional[int] = None,
+    p: Optional[int] = None
+) -> str:
+    """Hash a password with a fresh salt (blocking); the cost defaults to the current SCRYPT_* settings."""
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, r, p)
+    return f"{PREFIX}${n}${r}${p}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password_sync(password: str, stored: str) -> Tuple[bool, bool]:
+    """
+    Check a password against a stored hash (blocking).
+
+    Returns:
+        (valid, needs_rehash): needs_rehash is set for legacy SHA-256 hashes
+        and for scrypt hashes made with a different cost.
+    """
+    if not stored:
+        return False, False
+
+    if not stored.startswith(PREFIX + '$'):
+        # Legacy: unsalted hex SHA-256
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+
+    try:
+        _, n, r, p, salt, digest = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        expected = _unb64(digest)
+        actual = _scrypt(password, _unb64(salt), n, r, p)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Malformed password hash: {e}")
+        return False, False
+
+    valid = hmac.compare_digest(actual, expected)
+    return valid, valid and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password in the worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), hash_password_sync, password)
+
+
+async def verify_password(password: str, stored: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password in the worker pool.
+
+    Args:
+        password: Password entered by the user.
+        stored: Hash from the database.
+
+    Returns:
+        (valid, new_hash): new_hash is set when the password was right but
+        the stored hash is outdated, and should be saved in its place.
+    """
+    loop = asyncio.get_running_loop()
+    valid, needs_rehash = await loop.run_in_executor(_get_executor(), verify_password_sync, password, stored)
+    if valid and needs_rehash:
+        return True, await hash_password(password)
+    return valid, None
@@ -0,0 +1,235 @@
+"""
+SQLite persistence for the bot's conversation state and user/chat data.
+Implements python-telegram-bot's BasePersistence on one key-value table,
+so ConversationHandler states and context.user_data (the transcription
+and task waiting for a time, the user's timezone, ...) survive restarts.
+
+Writes are coalesced: the Application hands over changed entries every
+update_interval seconds, they are buffered per key (the latest value
+wins) and written in one transaction shortly after, off the event loop.
+Application.stop() flushes whatever is still buffered.
+
+Several bot processes can share the table. Entries are loaded at startup;
+with refresh=True each update re-reads its user's and chat's data when
+another process wrote a newer version, at the cost of one indexed read
+(no write) per update. ConversationHandler only reads conversation states
+at startup, so a chat in the middle of a conversation must keep reaching
+the same process (e.g. one webhook replica per chat).
+
+Values are pickled, like PicklePersistence does. Works on a plain DB-API
+connection (sqlite3 or libsql); database calls run in a worker thread.
+"""
+
+import asyncio
+import json
+import logging
+import pickle
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'bot_persistence'
+
+# Entries changed within this window are written together
+FLUSH_DELAY_SECONDS = 0.1
+
+USER = 'user'
+CHAT = 'chat'
+BOT = 'bot'
+CONVERSATION = 'conversation'
+
+
+def schema_statements() -> list:
+    """Idempotent CREATE statements for the persistence table."""
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {TABLE} (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data BLOB NOT NULL,
+            version REAL NOT NULL,
+            PRIMARY KEY (kind, key)
+        )
+        """,
+    ]
+
+
+class SQLitePersistence(BasePersistence):
+    """BasePersistence storing user, chat and bot data and conversation states in SQLite."""
+
+    def __init__(self, connect: Callable, update_interval: float = 5, refresh: bool = False):
+        """
+        Args:
+            connect: Returns a new DB-API connection to the shared database.
+            update_interval: Seconds between the Application's hand-overs of
+                changed data (the most a crash can lose).
+            refresh: Re-read user and chat data that other processes changed
+                before each update.
+        """
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        self.connect = connect
+        self.refresh = refresh
+        # (kind, key) -> pickled value, or None to delete the row
+        self._pending: Dict[Tuple[str, str], Optional[bytes]] = {}
+        # (kind, key) -> version of the row as last read or written here
+        self._versions: Dict[Tuple[str, str], float] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # ----- reading -----
+
+    def _load_rows(self, kind: str) -> Dict[str, bytes]:
+        conn = self.connect()
+        try:
+            rows = conn.execute(f"SELECT key, data, version FROM {TABLE} WHERE kind = ?", (kind,)).fetchall()
+        finally:
+            conn.close()
+        for key, _, version in rows:
+            self._versions[(kind, key)] = version
+        return {key: data for key, data, _ in rows}
+
+    async def _load(self, kind: str) -> Dict[str, object]:
+        loaded = {}
+        for key, data in (await asyncio.to_thread(self._load_rows, kind)).items():
+            try:
+                loaded[key] = pickle.loads(data)
+            except Exception as e:
+                logger.error(f"Dropping unreadable persisted {kind} data for {key}: {e}")
+        return loaded
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {int(key): data for key, data in (await self._load(USER)).items()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {int(key): data for key, data in (await self._load(CHAT)).items()}
+
+    async def get_bot_data(self) -> dict:
+        return (await self._load(BOT)).get('', {})
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {
+            tuple(json.loads(key)): state
+            for key, state in (await self._load(f"{CONVERSATION}:{name}")).items()
+        }
+
+    def _read_newer(self, kind: str, key: str) -> Optional[Tuple[bytes, float]]:
+        conn = self.connect()
+        try:
+            return conn.execute(
+                f"SELECT data, version FROM {TABLE} WHERE kind = ? AND key = ? AND version > ?",
+                (kind, key, self._versions.get((kind, key), 0.0))
+            ).fetchone()
+        finally:
+            conn.close()
+
+    async def _refresh(self, kind: str, key: str, data: dict) -> None:
+        # Our own unwritten changes are newer than anything stored
+        if not self.refresh or (kind, key) in self._pending:
+            return
+        row = await asyncio.to_thread(self._read_newer, kind, key)
+        if not row or (kind, key) in self._pending:
+            return
+        try:
+            stored = pickle.loads(row[0])
+        except Exception as e:
+            logger.error(f"Ignoring unreadable persisted {kind} data for {key}: {e}")
+            return
+        data.clear()
+        data.update(stored)
+        self._versions[(kind, key)] = row[1]
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._refresh(USER, str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._refresh(CHAT, str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        await self._refresh(BOT, '', bot_data)
+
+    # ----- writing -----
+
+    def _buffer(self, kind: str, key: str, value: object) -> None:
+        try:
+            self._pending[(kind, key)] = None if value is None else pickle.dumps(value)
+        except Exception as e:
+            logger.error(f"Cannot persist {kind} data for {key}: {e}")
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        # Entries buffered while a write is running go out with the next one
+        while True:
+            await asyncio.sleep(FLUSH_DELAY_SECONDS)
+            if not await self._write_pending() or not self._pending:
+                return
+
+    def _write(self, batch: Dict[Tuple[str, str], Optional[bytes]], version: float) -> None:
+        conn = self.connect()
+        try:
+            for (kind, key), data in batch.items():
+                if data is None:
+                    conn.execute(f"DELETE FROM {TABLE} WHERE kind = ? AND key = ?", (kind, key))
+                else:
+                    conn.execute(
+                        f"""
+                        INSERT INTO {TABLE} (kind, key, data, version) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(kind, key) DO UPDATE SET data = excluded.data, version = excluded.version
+                        """,
+                        (kind, key, data, version)
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def _write_pending(self) -> bool:
+        """Write the buffered entries; False if the write failed."""
+        if not self._pending:
+            return True
+        batch, self._pending = self._pending, {}
+        version = time.time()
+        try:
+            await asyncio.to_thread(self._write, batch, version)
+        except Exception as e:
+            # Keep what was not changed again meanwhile; the next flush retries it
+            for entry, data in batch.items():
+                self._pending.setdefault(entry, data)
+            logger.error(f"Failed to persist {len(batch)} bot data entries: {e}")
+            return False
+        for entry in batch:
+            self._versions[entry] = version
+        logger.debug(f"Persisted {len(batch)} bot data entries")
+        return True
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._buffer(USER, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._buffer(CHAT, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._buffer(BOT, '', data)
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        self._buffer(f"{CONVERSATION}:{name}", json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._buffer(USER, str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._buffer(CHAT, str(chat_id), None)
+
+    async def flush(self) -> None:
+        """Write everything still buffered (called by Application.stop())."""
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        await self._write_pending()
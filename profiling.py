@@ -0,0 +1,300 @@
+"""
+Sampled profiling shared by the bot and the API server.
+A configurable share of API requests and bot voice messages runs under a
+profiler; runs slower than a threshold are written to the profile
+directory, as pyinstrument HTML (flame-style call tree and timeline) when
+pyinstrument is installed, or as cProfile .prof files (open with snakeviz
+or pstats) otherwise.
+
+The settings live in <profile dir>/settings.json and are re-read when the
+file changes, so the API's admin endpoints and the bot's /profiling
+command switch profiling for every process sharing the directory without
+a restart.
+
+Only one run is profiled at a time per process, and only the thread that
+started it (the event loop): time spent in worker threads shows up as the
+await that waited for it.
+"""
+
+import cProfile
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pyinstrument import Profiler
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    Profiler = None
+    PYINSTRUMENT_AVAILABLE = False
+
+BACKENDS = ('pyinstrument', 'cprofile') if PYINSTRUMENT_AVAILABLE else ('cprofile',)
+EXTENSIONS = {'pyinstrument': 'html', 'cprofile': 'prof'}
+
+SETTINGS_FILE = 'settings.json'
+
+# How often the settings file is checked for changes
+RELOAD_SECONDS = 1.0
+
+# source-YYYYmmddTHHMMSS-<ms>ms-<label>-<id>.<ext>
+PROFILE_NAME = re.compile(r'^[a-z]+-\d{8}T\d{6}-\d+ms-[A-Za-z0-9_]+-[0-9a-f]{6}\.(html|prof)$')
+
+_directory = 'profiles'
+_defaults: Dict[str, object] = {
+    'enabled': False,
+    'sample_rate': 0.05,
+    'min_duration_ms': 1000,
+    'max_files': 200,
+    'backend': BACKENDS[0],
+}
+_settings: Dict[str, object] = dict(_defaults)
+_settings_mtime: Optional[float] = None
+_checked_at = 0.0
+_busy = threading.Lock()
+_random = random.Random()
+
+
+def configure_profiling(
+    directory: str,
+    enabled: bool = False,
+    sample_rate: float = 0.05,
+    min_duration_ms: float = 1000,
+    max_files: int = 200
+) -> None:
+    """
+    Set where profiles go and the settings used until settings.json exists.
+
+    Args:
+        directory: Profile directory; share it between processes to manage them together.
+        enabled: Whether sampling starts switched on.
+        sample_rate: Share of runs profiled, 0..1.
+        min_duration_ms: Runs faster than this are discarded.
+        max_files: Oldest profiles beyond this many are deleted.
+    """
+    global _directory, _defaults, _settings, _settings_mtime, _checked_at
+    _directory = directory
+    _defaults = _validate({
+        'enabled': enabled,
+        'sample_rate': sample_rate,
+        'min_duration_ms': min_duration_ms,
+        'max_files': max_files,
+        'backend': BACKENDS[0],
+    })
+    _settings = dict(_defaults)
+    _settings_mtime = None
+    _checked_at = 0.0
+
+
+def _validate(settings: Dict[str, object]) -> Dict[str, object]:
+    unknown = set(settings) - set(_defaults)
+    if unknown:
+        raise ValueError(f"Unknown profiling setting: {', '.join(sorted(unknown))}")
+    checked = dict(settings)
+    if 'enabled' in checked and not isinstance(checked['enabled'], bool):
+        raise ValueError("enabled must be true or false")
+    if 'sample_rate' in checked:
+        checked['sample_rate'] = float(checked['sample_rate'])
+        if not 0 <= checked['sample_rate'] <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+    if 'min_duration_ms' in checked:
+        checked['min_duration_ms'] = float(checked['min_duration_ms'])
+        if checked['min_duration_ms'] < 0:
+            raise ValueError("min_duration_ms must not be negative")
+    if 'max_files' in checked:
+        checked['max_files'] = int(checked['max_files'])
+        if checked['max_files'] < 1:
+            raise ValueError("max_files must be at least 1")
+    if 'backend' in checked and checked['backend'] not in EXTENSIONS:
+        raise ValueError(f"backend must be one of: {', '.join(EXTENSIONS)}")
+    return checked
+
+
+def get_settings() -> Dict[str, object]:
+    """Current settings, picking up changes other processes wrote to settings.json."""
+    global _settings, _settings_mtime, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < RELOAD_SECONDS:
+        return dict(_settings)
+    _checked_at = now
+
+    path = os.path.join(_directory, SETTINGS_FILE)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        _settings, _settings_mtime = dict(_defaults), None
+        return dict(_settings)
+    if mtime != _settings_mtime:
+        try:
+            with open(path, encoding='utf-8') as f:
+                stored = _validate(json.load(f))
+            _settings = {**_defaults, **stored}
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring invalid {path}: {e}")
+        _settings_mtime = mtime
+    return dict(_settings)
+
+
+def set_settings(changes: Dict[str, object]) -> Dict[str, object]:
+    """
+    Change profiling settings for every process using the profile directory.
+
+    Args:
+        changes: Any of enabled, sample_rate, min_duration_ms, max_files, backend.
+
+    Returns:
+        The settings now in effect.
+
+    Raises:
+        ValueError: If a setting is unknown or out of range.
+    """
+    global _settings, _settings_mtime, _checked_at
+    changes = _validate(changes)
+    if changes.get('backend', BACKENDS[0]) not in BACKENDS:
+        raise ValueError(f"{changes['backend']} is not installed here")
+    settings = {**get_settings(), **changes}
+    os.makedirs(_directory, exist_ok=True)
+    path = os.path.join(_directory, SETTINGS_FILE)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, indent=2)
+    os.replace(temporary, path)
+    _settings = settings
+    _settings_mtime = os.stat(path).st_mtime
+    _checked_at = time.monotonic()
+    return dict(settings)
+
+
+@contextmanager
+def profile(source: str, label: str) -> Iterator[None]:
+    """
+    Profile the block if sampling picks it; slow runs are saved to disk.
+
+    Args:
+        source: Process that ran it ('api', 'bot'); the file name prefix.
+        label: What ran, e.g. "POST /api/voice".
+    """
+    settings = get_settings()
+    if (
+        not settings['enabled']
+        or _random.random() >= settings['sample_rate']
+        or not _busy.acquire(blocking=False)
+    ):
+        yield
+        return
+
+    # Processes without pyinstrument fall back to cProfile
+    backend = settings['backend'] if settings['backend'] in BACKENDS else 'cprofile'
+    started = time.perf_counter()
+    try:
+        if backend == 'pyinstrument':
+            profiler = Profiler(async_mode='enabled')
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+    except Exception as e:
+        # Another profiler or debugger already owns the hooks
+        _busy.release()
+        logger.warning(f"Could not start {backend} profiler: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        if backend == 'pyinstrument':
+            profiler.stop()
+        else:
+            profiler.disable()
+        _busy.release()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= settings['min_duration_ms']:
+            # Rendering can take a while; keep it off the event loop
+            threading.Thread(
+                target=_save,
+                args=(profiler, backend, source, label, elapsed_ms, settings['max_files']),
+                name='profile-writer',
+                daemon=True
+            ).start()
+
+
+def profiled(source: str, label: str) -> Callable:
+    """Decorator: run an async handler under profile(source, label)."""
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            with profile(source, label):
+                return await handler(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _save(profiler, backend: str, source: str, label: str, elapsed_ms: float, max_files: int) -> None:
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')[:60] or 'run'
+    name = (
+        f"{source}-{datetime.utcnow():%Y%m%dT%H%M%S}-{int(elapsed_ms)}ms-{slug}-"
+        f"{uuid.uuid4().hex[:6]}.{EXTENSIONS[backend]}"
+    )
+    path = os.path.join(_directory, name)
+    try:
+        os.makedirs(_directory, exist_ok=True)
+        if backend == 'pyinstrument':
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.dump_stats(path)
+        logger.info(f"Saved {elapsed_ms:.0f}ms profile of {label}: {name}")
+        _prune(max_files)
+    except Exception as e:
+        logger.error(f"Failed to save profile {name}: {e}")
+
+
+def _prune(max_files: int) -> None:
+    """Delete the oldest profiles beyond max_files."""
+    for entry in list_profiles()[max_files:]:
+        try:
+            os.remove(os.path.join(_directory, entry['name']))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles() -> List[dict]:
+    """Saved profiles, newest first."""
+    try:
+        names = [name for name in os.listdir(_directory) if PROFILE_NAME.match(name)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(_directory, name))
+        except FileNotFoundError:
+            continue
+        source, stamp, duration = name.split('-', 3)[:3]
+        profiles.append({
+            'name': name,
+            'source': source,
+            'created': datetime.strptime(stamp, '%Y%m%dT%H%M%S').isoformat(),
+            'duration_ms': int(duration[:-2]),
+            'size': stat.st_size,
+        })
+    profiles.sort(key=lambda entry: (entry['created'], entry['name']), reverse=True)
+    return profiles
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a saved profile, or None if the name is not one of ours."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(_directory, name)
+    return path if os.path.isfile(path) else None
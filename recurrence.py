@@ -0,0 +1,227 @@
+"""
+Recurrence rules for repeating reminders.
+A recurring reminder is stored once with an RRULE-style rule
+(e.g. "FREQ=DAILY;BYHOUR=9;BYMINUTE=0") and advanced in place after each
+firing, instead of being cloned into a new row every time.
+"""
+
+import logging
+from calendar import monthrange
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+from timezones import UTC, zone_or_utc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'Asia/Tashkent'
+DEFAULT_RECURRENCE_TIME = '09:00'
+
+# RRULE weekday codes, indexed by datetime.weekday()
+WEEKDAY_CODES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+RECURRENCE_TYPES = ('daily', 'weekdays', 'weekly', 'monthly')
+
+
+def parse_recurrence_time(recurrence_time: Optional[str]) -> Optional[tuple]:
+    """Parse an "HH:MM" string into (hour, minute), or None if invalid."""
+    if not recurrence_time:
+        return None
+    try:
+        hour, minute = map(int, recurrence_time.split(':')[:2])
+    except (ValueError, AttributeError):
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+    return hour, minute
+
+
+def to_local(dt_utc: datetime, user_timezone: str) -> datetime:
+    """Convert a naive UTC datetime to an aware datetime in the user's timezone."""
+    return dt_utc.replace(tzinfo=UTC).astimezone(zone_or_utc(user_timezone))
+
+
+def build_rule(
+    recurrence_type: Optional[str],
+    recurrence_time: Optional[str] = None,
+    anchor_utc: Optional[datetime] = None,
+    user_timezone: str = DEFAULT_TIMEZONE
+) -> Optional[str]:
+    """
+    Build an RRULE-style rule from the legacy recurrence fields.
+
+    Args:
+        recurrence_type: One of daily, weekdays, weekly, monthly.
+        recurrence_time: Local time of day as "HH:MM".
+        anchor_utc: First occurrence (naive UTC), used for the weekday of
+            weekly rules, the day of month of monthly rules, and as the
+            time of day when recurrence_time is missing.
+        user_timezone: User's timezone string.
+
+    Returns:
+        Rule string like "FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0", or None.
+    """
+    if recurrence_type not in RECURRENCE_TYPES:
+        return None
+
+    anchor_local = to_local(anchor_utc, user_timezone) if anchor_utc else None
+
+    hour_minute = parse_recurrence_time(recurrence_time)
+    if hour_minute is None:
+        if anchor_local:
+            hour_minute = (anchor_local.hour, anchor_local.minute)
+        else:
+            hour_minute = parse_recurrence_time(DEFAULT_RECURRENCE_TIME)
+    hour, minute = hour_minute
+
+    parts = []
+    if recurrence_type == 'daily':
+        parts.append("FREQ=DAILY")
+    elif recurrence_type == 'weekdays':
+        parts.append("FREQ=WEEKLY")
+        parts.append("BYDAY=" + ",".join(WEEKDAY_CODES[:5]))
+    elif recurrence_type == 'weekly':
+        weekday = anchor_local.weekday() if anchor_local else datetime.utcnow().weekday()
+        parts.append("FREQ=WEEKLY")
+        parts.append(f"BYDAY={WEEKDAY_CODES[weekday]}")
+    elif recurrence_type == 'monthly':
+        month_day = anchor_local.day if anchor_local else datetime.utcnow().day
+        parts.append("FREQ=MONTHLY")
+        parts.append(f"BYMONTHDAY={month_day}")
+
+    parts.append(f"BYHOUR={hour}")
+    parts.append(f"BYMINUTE={minute}")
+    return ";".join(parts)
+
+
+def parse_rule(rule: str) -> Dict[str, Any]:
+    """
+    Parse a rule string into its fields.
+
+    Returns:
+        Dict with FREQ (str), BYHOUR/BYMINUTE (int), BYDAY (list of weekday
+        numbers) and BYMONTHDAY (int) where present.
+
+    Raises:
+        ValueError: If the rule is malformed or uses an unsupported frequency.
+    """
+    fields: Dict[str, Any] = {}
+    for part in rule.upper().split(';'):
+        if not part.strip():
+            continue
+        key, _, value = part.partition('=')
+        key = key.strip()
+        value = value.strip()
+        if key == 'FREQ':
+            fields['FREQ'] = value
+        elif key == 'BYDAY':
+            fields['BYDAY'] = sorted(WEEKDAY_CODES.index(code) for code in value.split(','))
+        elif key in ('BYHOUR', 'BYMINUTE', 'BYMONTHDAY'):
+            fields[key] = int(value)
+
+    if fields.get('FREQ') not in ('DAILY', 'WEEKLY', 'MONTHLY'):
+        raise ValueError(f"Unsupported recurrence rule: {rule}")
+    fields.setdefault('BYHOUR', 9)
+    fields.setdefault('BYMINUTE', 0)
+    return fields
+
+
+def _matches_day(day, fields: Dict[str, Any]) -> bool:
+    """Check whether a local calendar day carries an occurrence of the rule."""
+    freq = fields['FREQ']
+    if freq == 'DAILY':
+        return True
+    if freq == 'WEEKLY':
+        return day.weekday() in fields.get('BYDAY', [day.weekday()])
+    # MONTHLY: clamp to the last day for short months (e.g. 31 -> 30 or 28)
+    month_day = fields.get('BYMONTHDAY', 1)
+    last_day = monthrange(day.year, day.month)[1]
+    return day.day == min(month_day, last_day)
+
+
+def next_occurrence(
+    rule: str,
+    user_timezone: str = DEFAULT_TIMEZONE,
+    after_utc: Optional[datetime] = None
+) -> Optional[datetime]:
+    """
+    Compute the first occurrence of a rule strictly after the given time.
+
+    Args:
+        rule: RRULE-style rule string.
+        user_timezone: Timezone the rule's wall-clock time is expressed in.
+        after_utc: Naive UTC datetime (defaults to now).
+
+    Returns:
+        Naive UTC datetime of the next occurrence, or None if the rule is invalid.
+    """
+    try:
+        fields = parse_rule(rule)
+    except ValueError as e:
+        logger.error(f"Invalid recurrence rule: {e}")
+        return None
+
+    if after_utc is None:
+        after_utc = datetime.utcnow()
+    zone = zone_or_utc(user_timezone)
+    day = to_local(after_utc, user_timezone).date()
+
+    # A monthly rule always matches within 31 days; weekly within 7
+    for _ in range(32):
+        if _matches_day(day, fields):
+            local = datetime(day.year, day.month, day.day, fields['BYHOUR'], fields['BYMINUTE'], tzinfo=zone)
+            candidate = local.astimezone(UTC).replace(tzinfo=None)
+            if candidate > after_utc:
+                return candidate
+        day += timedelta(days=1)
+    return None
+
+
+def rule_for_reminder(reminder: dict) -> Optional[str]:
+    """Return the reminder's rule, deriving it from legacy fields if needed."""
+    if reminder.get('recurrence_rule'):
+        return reminder['recurrence_rule']
+
+    anchor = reminder.get('scheduled_time_utc')
+    if isinstance(anchor, str):
+        try:
+            anchor = datetime.fromisoformat(anchor)
+        except ValueError:
+            anchor = None
+
+    return build_rule(
+        reminder.get('recurrence_type'),
+        reminder.get('recurrence_time'),
+        anchor_utc=anchor,
+        user_timezone=reminder.get('user_timezone') or DEFAULT_TIMEZONE
+    )
+
+
+def next_fire_for_reminder(reminder: dict, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Compute the slot that follows the reminder's current occurrence.
+    Missed slots (e.g. after downtime) are skipped rather than replayed.
+
+    Args:
+        reminder: Reminder dict with recurrence fields and scheduled_time_utc.
+        now: Current naive UTC time (defaults to now).
+
+    Returns:
+        Naive UTC datetime of the next slot, or None if not recurring.
+    """
+    rule = rule_for_reminder(reminder)
+    if not rule:
+        return None
+
+    if now is None:
+        now = datetime.utcnow()
+    after = now
+    scheduled = reminder.get('scheduled_time_utc')
+    if isinstance(scheduled, str):
+        try:
+            scheduled = datetime.fromisoformat(scheduled)
+        except ValueError:
+            scheduled = None
+    if scheduled and scheduled > after:
+        after = scheduled
+
+    return next_occurrence(rule, reminder.get('user_timezone') or DEFAULT_TIMEZONE, after)
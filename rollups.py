@@ -0,0 +1,295 @@
+"""
+Time-bucketed analytics rollups for reminders.
+Triggers append lifecycle events (created, fired, completed, snoozed,
+skipped) to an events table, stamped with the user's language, timezone
+and recurrence type. A background job folds new events into hourly and
+daily summary tables, tracking a watermark so each run only reads events
+it has not seen, and prunes events that are already rolled up.
+Works on a plain DB-API connection (sqlite3 or libsql), so callers run it
+in a worker thread.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ('created', 'fired', 'completed', 'snoozed', 'skipped')
+DIMENSIONS = ('language', 'timezone', 'recurrence')
+GRANULARITIES = {
+    'hourly': "strftime('%Y-%m-%d %H:00', created_at)",
+    'daily': "DATE(created_at)",
+}
+
+# Events folded per run; a backlog is worked off over successive runs
+ROLLUP_BATCH_SIZE = 50000
+
+# Rolled-up events are kept this long for ad-hoc inspection, then pruned
+EVENT_RETENTION_DAYS = 7
+
+WATERMARKS_TABLE = "rollup_watermarks"
+
+
+def events_table(reminders_table: str) -> str:
+    return f"{reminders_table}_events"
+
+
+def rollup_table(reminders_table: str, granularity: str) -> str:
+    return f"{reminders_table}_rollup_{granularity}"
+
+
+def schema_statements(
+    reminders_table: str,
+    occurrences_table: str,
+    users_table: str,
+    users_key: str
+) -> List[str]:
+    """
+    Event log, rollup tables and the triggers that feed the event log.
+
+    Args:
+        reminders_table: Reminders table (user_id, status, user_timezone,
+            recurrence_type, initial_reminder_sent, scheduled_time_utc,
+            next_fire_utc, created_at).
+        occurrences_table: Occurrence log of recurring reminders.
+        users_table: Table holding each user's language.
+        users_key: Column of users_table matching reminders.user_id.
+
+    Returns:
+        Idempotent CREATE statements, in execution order.
+    """
+    events = events_table(reminders_table)
+    prefix = f"{reminders_table}_rollup"
+
+    def record(event: str) -> str:
+        # Dimensions are snapshotted so later edits or deletes don't rewrite history
+        return f"""
+            INSERT INTO {events} (reminder_id, event, language, timezone, recurrence)
+            VALUES (
+                NEW.id, '{event}',
+                IFNULL((SELECT language FROM {users_table} WHERE {users_key} = NEW.user_id), 'unknown'),
+                IFNULL(NEW.user_timezone, 'unknown'),
+                IFNULL(NEW.recurrence_type, 'none')
+            );
+        """
+
+    statements = [
+        f"""
+        CREATE TABLE IF NOT EXISTS {events} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            reminder_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            language TEXT NOT NULL,
+            timezone TEXT NOT NULL,
+            recurrence TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARKS_TABLE} (
+            name TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]
+
+    for granularity in GRANULARITIES:
+        statements.append(f"""
+        CREATE TABLE IF NOT EXISTS {rollup_table(reminders_table, granularity)} (
+            bucket TEXT NOT NULL,
+            event TEXT NOT NULL,
+            language TEXT NOT NULL,
+            timezone TEXT NOT NULL,
+            recurrence TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, event, language, timezone, recurrence)
+        )
+        """)
+
+    statements += [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_created AFTER INSERT ON {reminders_table}
+        BEGIN
+            {record('created')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_fired AFTER UPDATE OF initial_reminder_sent ON {reminders_table}
+        WHEN IFNULL(OLD.initial_reminder_sent, 0) = 0 AND NEW.initial_reminder_sent = 1
+        BEGIN
+            {record('fired')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_completed AFTER UPDATE OF status ON {reminders_table}
+        WHEN NEW.status = 'done' AND OLD.status IS NOT 'done'
+        BEGIN
+            {record('completed')}
+        END
+        """,
+        # Reminders missed while the bot was down are closed as 'completed'
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_skipped AFTER UPDATE OF status ON {reminders_table}
+        WHEN NEW.status = 'completed' AND OLD.status IS NOT 'completed'
+        BEGIN
+            {record('skipped')}
+        END
+        """,
+        # A fired reminder pushed later without moving to its next recurrence slot
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_snoozed AFTER UPDATE OF scheduled_time_utc ON {reminders_table}
+        WHEN NEW.status = 'pending'
+          AND IFNULL(OLD.initial_reminder_sent, 0) = 1
+          AND NEW.scheduled_time_utc > OLD.scheduled_time_utc
+          AND OLD.next_fire_utc IS NEW.next_fire_utc
+        BEGIN
+            {record('snoozed')}
+        END
+        """,
+        # Recurring reminders stay pending; their outcomes land in the occurrence log
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_occurrence AFTER INSERT ON {occurrences_table}
+        WHEN NEW.event IN ('done', 'skipped')
+        BEGIN
+            INSERT INTO {events} (reminder_id, event, language, timezone, recurrence)
+            SELECT r.id, CASE NEW.event WHEN 'done' THEN 'completed' ELSE 'skipped' END,
+                   IFNULL((SELECT language FROM {users_table} WHERE {users_key} = r.user_id), 'unknown'),
+                   IFNULL(r.user_timezone, 'unknown'),
+                   IFNULL(r.recurrence_type, 'none')
+            FROM {reminders_table} r WHERE r.id = NEW.reminder_id;
+        END
+        """,
+    ]
+    return statements
+
+
+def run_rollup(connect: Callable, reminders_table: str, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """
+    Fold events past the watermark into the hourly and daily rollups.
+    Buckets, watermark and pruning are updated in one transaction.
+
+    Args:
+        connect: Factory returning a new DB-API connection.
+        reminders_table: Reminders table whose events to roll up.
+        batch_size: Maximum events folded in this run.
+
+    Returns:
+        Number of events processed.
+    """
+    events = events_table(reminders_table)
+    started = time.monotonic()
+
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT last_event_id FROM {WATERMARKS_TABLE} WHERE name = ?", (events,))
+        row = cursor.fetchone()
+        low = row[0] if row else 0
+
+        cursor.execute(
+            f"SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {events} WHERE id > ? ORDER BY id LIMIT ?)",
+            (low, batch_size)
+        )
+        high, count = cursor.fetchone()
+        if not count:
+            return 0
+
+        for granularity, bucket in GRANULARITIES.items():
+            cursor.execute(
+                f"""
+                INSERT INTO {rollup_table(reminders_table, granularity)}
+                    (bucket, event, language, timezone, recurrence, count)
+                SELECT {bucket}, event, language, timezone, recurrence, COUNT(*)
+                FROM {events}
+                WHERE id > ? AND id <= ?
+                GROUP BY 1, 2, 3, 4, 5
+                ON CONFLICT(bucket, event, language, timezone, recurrence)
+                DO UPDATE SET count = count + excluded.count
+                """,
+                (low, high)
+            )
+
+        cursor.execute(
+            f"""
+            INSERT INTO {WATERMARKS_TABLE} (name, last_event_id, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(name) DO UPDATE SET
+                last_event_id = excluded.last_event_id,
+                updated_at = excluded.updated_at
+            """,
+            (events, high)
+        )
+
+        retention_cutoff = (datetime.utcnow() - timedelta(days=EVENT_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute(
+            f"DELETE FROM {events} WHERE id <= ? AND created_at < ?",
+            (high, retention_cutoff)
+        )
+
+        conn.commit()
+        logger.info(
+            f"Rolled up {count} {reminders_table} events up to #{high} "
+            f"in {(time.monotonic() - started) * 1000:.0f}ms"
+        )
+        return count
+    finally:
+        conn.close()
+
+
+def query_rollup(
+    connect: Callable,
+    reminders_table: str,
+    granularity: str = 'daily',
+    days: int = 90,
+    event: Optional[str] = None,
+    group_by: Optional[str] = None
+) -> List[Dict]:
+    """
+    Read a time series from the rollup tables.
+
+    Args:
+        connect: Factory returning a new DB-API connection.
+        reminders_table: Reminders table whose rollups to read.
+        granularity: 'hourly' or 'daily'.
+        days: How many days back to include.
+        event: Only this event type (default: all).
+        group_by: Optional dimension to split by (language, timezone, recurrence).
+
+    Returns:
+        Rows of {bucket, event, [group], count} ordered by bucket.
+
+    Raises:
+        ValueError: If granularity, event or group_by is not supported.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    if event is not None and event not in EVENTS:
+        raise ValueError(f"Unsupported event: {event}")
+    if group_by is not None and group_by not in DIMENSIONS:
+        raise ValueError(f"Unsupported dimension: {group_by}")
+
+    since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d')
+    columns = "bucket, event" + (f", {group_by}" if group_by else "")
+    where = "bucket >= ?" + (" AND event = ?" if event else "")
+    params = [since] + ([event] if event else [])
+
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT {columns}, SUM(count) AS count
+            FROM {rollup_table(reminders_table, granularity)}
+            WHERE {where}
+            GROUP BY {columns}
+            ORDER BY bucket
+            """,
+            params
+        )
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
@@ -2,27 +2,89 @@
 Scheduler module for handling reminder jobs.
 Uses python-telegram-bot's built-in JobQueue for scheduling.
 Includes startup recovery for bot restarts.
+
+The reminder check only decides what is due: it marks reminders as fired
+and queues their messages in the outbox in one transaction. A separate
+job drains the outbox every few seconds, so scanning and sending scale
+independently and a crash never loses or double-queues a reminder.
+
+With SCHEDULER_SHARDS set, every process running this scheduler (bot.py
+and any number of bot_scheduler.py) claims a share of the user_id shards
+at each check and only sends those users' reminders; the rollup job runs
+in one of them at a time.
 """
 
+import time
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden
 from telegram.ext import ContextTypes
 
 from database import (
     get_pending_reminders,
     get_follow_up_reminders,
-    mark_initial_reminder_sent,
-    mark_follow_up_sent,
-    update_reminder_status,
-    get_all_pending_reminders,
-    schedule_next_recurrence,
+    enqueue_notifications,
+    complete_stale_reminders,
+    iter_pending_reminders,
+    count_pending_reminders,
+    promote_due_recurrences,
+    advance_recurrences,
+    roll_up_reminder_events,
+    get_connection,
+)
+from coordination import Lease, ShardMembership, default_holder
+import outbox
+from recurrence_batch import next_fires_for_reminders
+from config import (
+    FOLLOW_UP_DELAY_SECONDS,
+    RECOVERY_GRACE_SECONDS,
+    RECOVERY_BATCH_SIZE,
+    DELIVERY_CONCURRENCY,
+    OUTBOX_POLL_SECONDS,
+    ROLLUP_INTERVAL_SECONDS,
+    SCHEDULER_LAG_SLO_SECONDS,
+    SCHEDULER_SHARDS,
+    SCHEDULER_LEASE_TTL_SECONDS,
+    ADMIN_USER_IDS,
 )
-from config import FOLLOW_UP_DELAY_SECONDS
 from time_parser import format_datetime
+from scheduler_health import SchedulerHealth, DEGRADED
+from logging_setup import log_context
+import metrics
 
 logger = logging.getLogger(__name__)
 
+FIRE_LAG = metrics.histogram(
+    'reminder_fire_lag_seconds', "Delay between a reminder's scheduled time and its delivery",
+    buckets=metrics.LAG_BUCKETS
+)
+DELIVERIES = metrics.counter('reminders_delivered_total', "Reminder messages by kind and outcome", ['channel', 'kind', 'outcome'])
+DUE_REMINDERS = metrics.gauge('reminders_due', "Unsent reminders found due on the last scheduler tick")
+TICK_SECONDS = metrics.histogram('scheduler_tick_seconds', "Duration of one reminder check")
+
+CHECK_INTERVAL_SECONDS = 30
+
+# Delivery lag and tick regularity of this process's reminder checker
+SCHEDULER_HEALTH = SchedulerHealth(CHECK_INTERVAL_SECONDS, SCHEDULER_LAG_SLO_SECONDS)
+metrics.gauge('scheduler_degraded', "1 while scheduler health is degraded").set_function(
+    lambda: SCHEDULER_HEALTH.snapshot()['status'] == DEGRADED
+)
+
+# This process's share of the reminders, and the lease that keeps the rollup
+# job to one process at a time (both only when sharded)
+SHARDS = (
+    ShardMembership(get_connection, 'reminders', SCHEDULER_SHARDS, ttl=SCHEDULER_LEASE_TTL_SECONDS)
+    if SCHEDULER_SHARDS else None
+)
+ROLLUP_LEASE = Lease(get_connection, 'reminders_rollup', ttl=SCHEDULER_LEASE_TTL_SECONDS)
+OUTBOX_OWNER = SHARDS.member if SHARDS else default_holder()
+if SHARDS:
+    metrics.gauge('scheduler_shards_owned', "Reminder shards this process sends for").set_function(
+        lambda: len(SHARDS.owned.owned)
+    )
+
 
 async def check_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -30,39 +92,109 @@ async def check_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
     This function is called periodically by the job queue.
     """
     now = datetime.utcnow()
+    started = time.perf_counter()
+    SCHEDULER_HEALTH.tick()
     
     try:
+        shards = await asyncio.to_thread(SHARDS.claim) if SHARDS else None
+        
+        # Move recurring reminders onto their next slot once it arrives
+        promoted = await promote_due_recurrences(now, shards)
+        if promoted:
+            logger.info(f"Advanced {promoted} recurring reminders to their next occurrence")
+        
         # Get all pending reminders that are due
-        pending_reminders = await get_pending_reminders(now)
+        pending_reminders = await get_pending_reminders(now, shards)
         
         if pending_reminders:
             logger.info(f"Found {len(pending_reminders)} pending reminders due at {now.isoformat()}")
         
-        for reminder in pending_reminders:
-            if reminder.get('initial_reminder_sent', 0) == 0:
-                # This reminder hasn't been sent yet - send initial reminder
-                logger.info(f"Sending reminder {reminder['id']}: {reminder['task_text']}")
-                await send_reminder(context, reminder)
+        unsent = [r for r in pending_reminders if r.get('initial_reminder_sent', 0) == 0]
+        DUE_REMINDERS.set(len(unsent))
+        
+        # Next slots for the whole batch at once (morning peaks are mostly recurring)
+        next_fires = next_fires_for_reminders(unsent, now)
+        for reminder in unsent:
+            if reminder.get('recurrence_type') and reminder['id'] not in next_fires:
+                logger.warning(f"Failed to schedule next occurrence for reminder {reminder['id']}")
         
         # Check for follow-ups (reminders sent more than 30 minutes ago)
-        # Note: Follow-ups are only for non-recurring reminders
         follow_up_threshold = now - timedelta(seconds=FOLLOW_UP_DELAY_SECONDS)
-        follow_up_reminders = await get_follow_up_reminders(follow_up_threshold)
+        follow_up_reminders = await get_follow_up_reminders(follow_up_threshold, shards)
         
-        for reminder in follow_up_reminders:
-            await send_follow_up(context, reminder)
+        # Mark them fired and queue the messages; dispatch_outbox sends them
+        queued, queued_follow_ups = await enqueue_notifications(
+            [(reminder, next_fires.get(reminder['id'])) for reminder in unsent],
+            follow_up_reminders
+        )
+        if queued or queued_follow_ups:
+            logger.info(f"Queued {queued} reminders and {queued_follow_ups} follow-ups")
     
     except Exception as e:
         logger.error(f"Error checking reminders: {e}", exc_info=True)
+    finally:
+        TICK_SECONDS.observe(time.perf_counter() - started)
+    
+    transition = SCHEDULER_HEALTH.check_transition()
+    if transition:
+        await alert_admins(context.bot, transition)
+
+
+async def alert_admins(bot: Bot, health: dict) -> None:
+    """
+    Tell admins that scheduler health changed.
+    
+    Args:
+        bot: The Telegram Bot instance.
+        health: Snapshot from SchedulerHealth.
+    """
+    if health['status'] == DEGRADED:
+        text = "⚠️ Scheduler degraded:\n" + "\n".join(f"• {reason}" for reason in health['reasons'])
+    else:
+        text = f"✅ Scheduler recovered (p99 lag {health['lag_p99']:.1f}s)"
+    
+    for admin_id in ADMIN_USER_IDS:
+        try:
+            await bot.send_message(chat_id=admin_id, text=text)
+        except Exception as e:
+            logger.error(f"Failed to alert admin {admin_id}: {e}")
+
 
+async def dispatch_outbox(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job sending queued reminder and follow-up messages."""
+    async def send(item: dict) -> None:
+        reminder = item['reminder']
+        with log_context(reminder_id=reminder['id'], user_id=reminder['user_id']):
+            if item['kind'] == outbox.FOLLOW_UP:
+                await send_follow_up(context.bot, reminder)
+            elif item['kind'] == outbox.DELAYED:
+                await send_delayed_reminder(context.bot, reminder, datetime.utcnow())
+            else:
+                await send_reminder(context.bot, reminder)
+    
+    try:
+        sent, retried, dead = await outbox.dispatch(
+            get_connection, 'reminders', OUTBOX_OWNER, send,
+            shards=SHARDS.owned if SHARDS else None,
+            concurrency=DELIVERY_CONCURRENCY
+        )
+        if sent or retried or dead:
+            logger.info(f"Outbox: {sent} sent, {retried} to retry, {dead} given up")
+    except Exception as e:
+        logger.error(f"Outbox dispatch failed: {e}", exc_info=True)
 
-async def send_reminder(context: ContextTypes.DEFAULT_TYPE, reminder: dict) -> None:
+
+async def send_reminder(bot: Bot, reminder: dict) -> None:
     """
     Send a reminder message to the user.
     
     Args:
-        context: The context from the job.
+        bot: The Telegram Bot instance.
         reminder: The reminder dictionary from database.
+    
+    Raises:
+        outbox.Undeliverable: If the user blocked the bot.
+        Exception: Any other send failure (the outbox retries it).
     """
     try:
         user_tz = reminder.get('user_timezone', 'Asia/Tashkent')
@@ -110,40 +242,38 @@ async def send_reminder(context: ContextTypes.DEFAULT_TYPE, reminder: dict) -> N
             rec_label = recurrence_labels.get(reminder['recurrence_type'], '🔁 Takroriy / Повторяющееся')
             message += f"\n{rec_label}"
         
-        await context.bot.send_message(
+        await bot.send_message(
             chat_id=reminder['chat_id'],
             text=message,
             parse_mode='Markdown'
         )
-        
-        # For ALL reminders (including recurring), mark initial_reminder_sent
-        # Follow-up will be sent 30 minutes later
-        await mark_initial_reminder_sent(reminder['id'])
+        lag = (datetime.utcnow() - scheduled_time).total_seconds()
+        FIRE_LAG.observe(max(0.0, lag))
+        SCHEDULER_HEALTH.record_lag(lag)
+        DELIVERIES.inc(channel='telegram', kind='reminder', outcome='sent')
         
         logger.info(f"Sent reminder {reminder['id']} to user {reminder['user_id']}{' (recurring)' if is_recurring else ''}")
         
-        # For recurring reminders, schedule the next occurrence
-        if is_recurring:
-            try:
-                new_id = await schedule_next_recurrence(reminder)
-                if new_id:
-                    logger.info(f"Scheduled next occurrence of recurring reminder, new ID: {new_id}")
-                else:
-                    logger.warning(f"Failed to schedule next occurrence for reminder {reminder['id']}")
-            except Exception as e:
-                logger.error(f"Error scheduling next recurrence: {e}")
-        
+    except Forbidden as e:
+        DELIVERIES.inc(channel='telegram', kind='reminder', outcome='failed')
+        raise outbox.Undeliverable(str(e)) from e
     except Exception as e:
+        DELIVERIES.inc(channel='telegram', kind='reminder', outcome='failed')
         logger.error(f"Failed to send reminder {reminder['id']}: {e}")
+        raise
 
 
-async def send_follow_up(context: ContextTypes.DEFAULT_TYPE, reminder: dict) -> None:
+async def send_follow_up(bot: Bot, reminder: dict) -> None:
     """
     Send a follow-up message asking if the task is done.
     
     Args:
-        context: The context from the job.
+        bot: The Telegram Bot instance.
         reminder: The reminder dictionary from database.
+    
+    Raises:
+        outbox.Undeliverable: If the user blocked the bot.
+        Exception: Any other send failure (the outbox retries it).
     """
     try:
         # Build message with notes
@@ -164,26 +294,29 @@ async def send_follow_up(context: ContextTypes.DEFAULT_TYPE, reminder: dict) ->
         # Create inline keyboard with YES/NO buttons
         keyboard = [
             [
-                InlineKeyboardButton("✅ HA / ДА", callback_data="reminder_yes"),
-                InlineKeyboardButton("❌ YO'Q / НЕТ", callback_data="reminder_no")
+                InlineKeyboardButton("✅ HA / ДА", callback_data=f"reminder_yes:{reminder['id']}"),
+                InlineKeyboardButton("❌ YO'Q / НЕТ", callback_data=f"reminder_no:{reminder['id']}")
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await context.bot.send_message(
+        await bot.send_message(
             chat_id=reminder['chat_id'],
             text=message,
             parse_mode='Markdown',
             reply_markup=reply_markup
         )
-        
-        # Mark that follow-up has been sent
-        await mark_follow_up_sent(reminder['id'])
+        DELIVERIES.inc(channel='telegram', kind='follow_up', outcome='sent')
         
         logger.info(f"Sent follow-up for reminder {reminder['id']} to user {reminder['user_id']}")
         
+    except Forbidden as e:
+        DELIVERIES.inc(channel='telegram', kind='follow_up', outcome='failed')
+        raise outbox.Undeliverable(str(e)) from e
     except Exception as e:
+        DELIVERIES.inc(channel='telegram', kind='follow_up', outcome='failed')
         logger.error(f"Failed to send follow-up for reminder {reminder['id']}: {e}")
+        raise
 
 
 def setup_scheduler(application) -> None:
@@ -198,87 +331,180 @@ def setup_scheduler(application) -> None:
     # Check for reminders every 30 seconds
     job_queue.run_repeating(
         check_reminders,
-        interval=30,
+        interval=CHECK_INTERVAL_SECONDS,
         first=10,  # Start 10 seconds after bot startup
         name="reminder_checker"
     )
     
+    # Send queued reminder and follow-up messages
+    job_queue.run_repeating(
+        dispatch_outbox,
+        interval=OUTBOX_POLL_SECONDS,
+        first=10,
+        name="outbox_dispatcher"
+    )
+    
+    # Fold new reminder events into the analytics rollups
+    job_queue.run_repeating(
+        rollup_job,
+        interval=ROLLUP_INTERVAL_SECONDS,
+        first=60,
+        name="analytics_rollup"
+    )
+    
     logger.info("Scheduler set up successfully - checking reminders every 30 seconds")
 
 
+async def leave_shards(application) -> None:
+    """Hand this process's shards to the other schedulers on shutdown."""
+    if SHARDS:
+        try:
+            await asyncio.to_thread(SHARDS.leave)
+        except Exception as e:
+            logger.error(f"Failed to leave scheduler shards: {e}")
+
+
+async def rollup_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job that updates the hourly/daily analytics rollups."""
+    try:
+        # Sharded processes take turns; the lease outlives one run
+        if SHARDS and not await asyncio.to_thread(ROLLUP_LEASE.try_acquire):
+            return
+        await roll_up_reminder_events()
+    except Exception as e:
+        logger.error(f"Analytics rollup failed: {e}", exc_info=True)
+
+
+async def send_delayed_reminder(bot: Bot, reminder: dict, now: datetime) -> None:
+    """
+    Send a reminder that was missed while the bot was down.
+    
+    Args:
+        bot: The Telegram Bot instance.
+        reminder: The reminder dictionary from database.
+        now: Current UTC time, used to say how late the reminder is.
+    
+    Raises:
+        outbox.Undeliverable: If the user blocked the bot.
+        Exception: Any other send failure (the outbox retries it).
+    """
+    scheduled = datetime.fromisoformat(reminder['scheduled_time_utc'])
+    
+    # Calculate how overdue it is (Uzbek/Russian)
+    overdue = now - scheduled
+    if overdue.seconds >= 3600:
+        hours = overdue.seconds // 3600
+        overdue_uz = f"{hours} soat oldin"
+        overdue_ru = f"{hours} ч. назад"
+    else:
+        minutes = overdue.seconds // 60
+        overdue_uz = f"{minutes} minut oldin"
+        overdue_ru = f"{minutes} мин. назад"
+    
+    message = (
+        f"🔔 **Kechikkan eslatma** / **Отложенное напоминание**\n\n"
+        f"📝 {reminder['task_text']}\n\n"
+        f"⚠️ _Bu {overdue_uz} rejalashtirilgan edi._\n"
+        f"_Это было запланировано {overdue_ru}._"
+    )
+    
+    try:
+        await bot.send_message(
+            chat_id=reminder['chat_id'],
+            text=message,
+            parse_mode='Markdown'
+        )
+    except Forbidden as e:
+        DELIVERIES.inc(channel='telegram', kind='delayed', outcome='failed')
+        raise outbox.Undeliverable(str(e)) from e
+    except Exception as e:
+        DELIVERIES.inc(channel='telegram', kind='delayed', outcome='failed')
+        logger.error(f"Failed to send delayed reminder {reminder['id']}: {e}")
+        raise
+    
+    DELIVERIES.inc(channel='telegram', kind='delayed', outcome='sent')
+    logger.info(f"Sent delayed reminder {reminder['id']} to user {reminder['user_id']}")
+
+
 async def recover_pending_reminders(application) -> None:
     """
     Recover pending reminders after bot restart.
-    Checks for any reminders that should have been sent while bot was down.
+    Reminders missed by more than the grace period are skipped in bulk
+    (recurring ones move to their next slot); the rest are streamed in time
+    order, marked fired and queued in the outbox as delayed notifications,
+    like check_reminders does, so the regular check does not fire them
+    again and a crash mid-recovery does not resend them.
     
     Args:
         application: The Telegram Application instance.
     """
     try:
         logger.info("Checking for missed reminders after restart...")
+        started = time.monotonic()
         
         now = datetime.utcnow()
-        pending = await get_all_pending_reminders()
+        cutoff = now - timedelta(seconds=RECOVERY_GRACE_SECONDS)
+        
+        # Too old: close all stale one-off reminders in one statement
+        skipped_count = await complete_stale_reminders(cutoff)
+        if skipped_count:
+            logger.info(f"Skipped {skipped_count} reminders older than {RECOVERY_GRACE_SECONDS // 3600} hours")
+        
+        queued_count = 0
+        waiting_count = 0
+        scanned = 0
         
-        missed_count = 0
-        upcoming_count = 0
+        # Sharded: recover only the users this process starts out with
+        shards = await asyncio.to_thread(SHARDS.claim) if SHARDS else None
         
-        for reminder in pending:
-            scheduled = datetime.fromisoformat(reminder['scheduled_time_utc'])
+        async for batch in iter_pending_reminders(now, RECOVERY_BATCH_SIZE, shards):
+            scanned += len(batch)
+            stale_recurring = []
+            overdue = []
             
-            if scheduled <= now:
-                # This reminder was missed while bot was down
-                overdue_seconds = (now - scheduled).total_seconds()
-                max_delay_seconds = 2 * 3600  # 2 hours grace period
+            for reminder in batch:
+                is_recurring = reminder.get('recurrence_type') is not None
                 
-                if overdue_seconds > max_delay_seconds:
-                    # Too old, skip this reminder
-                    missed_count += 1
-                    try:
-                        await update_reminder_status(reminder['id'], 'completed')
-                        logger.info(f"Skipped reminder {reminder['id']} - deadline passed by {overdue_seconds/3600:.1f} hours")
-                    except Exception as e:
-                        logger.error(f"Failed to mark reminder {reminder['id']} as completed: {e}")
+                # Fired recurring reminders wait for promote_due_recurrences
+                if is_recurring and reminder.get('initial_reminder_sent'):
+                    waiting_count += 1
+                elif reminder['scheduled_time_utc'] < cutoff.isoformat():
+                    stale_recurring.append(reminder)
                 else:
-                    # Still relevant, send delayed notification
-                    missed_count += 1
-                    
-                    # Calculate how overdue it is (Uzbek/Russian)
-                    overdue = now - scheduled
-                    if overdue.seconds >= 3600:
-                        hours = overdue.seconds // 3600
-                        overdue_uz = f"{hours} soat oldin"
-                        overdue_ru = f"{hours} ч. назад"
-                    else:
-                        minutes = overdue.seconds // 60
-                        overdue_uz = f"{minutes} minut oldin"
-                        overdue_ru = f"{minutes} мин. назад"
-                    
-                    # Send delayed notification
-                    try:
-                        message = (
-                            f"🔔 **Kechikkan eslatma** / **Отложенное напоминание**\n\n"
-                            f"📝 {reminder['task_text']}\n\n"
-                            f"⚠️ _Bu {overdue_uz} rejalashtirilgan edi._\n"
-                            f"_Это было запланировано {overdue_ru}._"
-                        )
-                        
-                        await application.bot.send_message(
-                            chat_id=reminder['chat_id'],
-                            text=message,
-                            parse_mode='Markdown'
-                        )
-                        
-                        logger.info(f"Sent delayed reminder {reminder['id']} to user {reminder['user_id']}")
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to send delayed reminder {reminder['id']}: {e}")
-            else:
-                upcoming_count += 1
+                    overdue.append(reminder)
+            
+            # Stale recurring reminders move to their next slot in one batch
+            if stale_recurring:
+                try:
+                    next_fires = next_fires_for_reminders(stale_recurring, now)
+                    skipped_count += await advance_recurrences(
+                        [(r, next_fires[r['id']]) for r in stale_recurring if r['id'] in next_fires],
+                        event='skipped'
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to advance stale recurring reminders: {e}")
+            
+            # Still relevant: queue delayed notifications; dispatch_outbox sends them
+            if overdue:
+                next_fires = next_fires_for_reminders(overdue, now)
+                queued, _ = await enqueue_notifications(
+                    [(reminder, next_fires.get(reminder['id'])) for reminder in overdue],
+                    [],
+                    kind=outbox.DELAYED
+                )
+                queued_count += queued
+            
+            logger.info(
+                f"Recovery progress: {scanned} scanned, {skipped_count} skipped, "
+                f"{queued_count} delayed reminders queued ({time.monotonic() - started:.1f}s)"
+            )
+        
+        upcoming_count = waiting_count + await count_pending_reminders(now)
         
         logger.info(
-            f"Startup recovery complete: "
-            f"{missed_count} missed reminders sent, "
+            f"Startup recovery complete in {time.monotonic() - started:.1f}s: "
+            f"{skipped_count} missed reminders skipped, "
+            f"{queued_count} missed reminders queued, "
             f"{upcoming_count} upcoming reminders scheduled"
         )
         
@@ -0,0 +1,144 @@
+"""
+Scheduler health tracking.
+Records how late each reminder is delivered relative to its
+scheduled_time_utc and when each scheduler tick runs, keeps a rolling
+window of both, and reports p50/p95/p99 lag plus a health status:
+degraded when p99 lag breaks the SLO, ticks were missed, or the loop has
+stalled. Shared by the bot scheduler and the API scheduler.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+DEGRADED = 'degraded'
+
+# Rolling window for lag percentiles and missed ticks
+HEALTH_WINDOW_SECONDS = 900
+
+# Samples kept at most (the oldest are dropped first)
+MAX_LAG_SAMPLES = 20000
+
+# A gap between ticks longer than this many intervals counts as missed ticks
+MISSED_TICK_FACTOR = 1.5
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+class SchedulerHealth:
+    """Rolling delivery lag and tick regularity for one scheduler loop."""
+
+    def __init__(
+        self,
+        tick_interval: float,
+        lag_slo_seconds: float,
+        window_seconds: float = HEALTH_WINDOW_SECONDS,
+        max_samples: int = MAX_LAG_SAMPLES
+    ):
+        """
+        Args:
+            tick_interval: Seconds between scheduler ticks.
+            lag_slo_seconds: p99 delivery lag above this is degraded.
+            window_seconds: Rolling window for lag and missed ticks.
+            max_samples: Upper bound on lag samples kept in the window.
+        """
+        self.tick_interval = tick_interval
+        self.lag_slo_seconds = lag_slo_seconds
+        self.window_seconds = window_seconds
+        # (monotonic time, lag seconds)
+        self._lags: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+        # (monotonic time, ticks missed before this one)
+        self._missed: Deque[Tuple[float, int]] = deque()
+        self._last_tick: Optional[float] = None
+        self._started = time.monotonic()
+        self._status = OK
+
+    def record_lag(self, lag_seconds: float) -> None:
+        """Record one delivery's lateness (delivery time minus scheduled time)."""
+        self._lags.append((time.monotonic(), max(0.0, lag_seconds)))
+
+    def restart(self) -> None:
+        """Forget tick history when the loop starts again after a pause (e.g. a new leader)."""
+        self._missed.clear()
+        self._last_tick = None
+        self._started = time.monotonic()
+
+    def tick(self) -> None:
+        """Record the start of a scheduler tick."""
+        now = time.monotonic()
+        if self._last_tick is not None:
+            gap = now - self._last_tick
+            if gap > self.tick_interval * MISSED_TICK_FACTOR:
+                missed = int(gap // self.tick_interval) - 1
+                self._missed.append((now, max(missed, 1)))
+                logger.warning(f"Scheduler missed {max(missed, 1)} tick(s): {gap:.1f}s since the last one")
+        self._last_tick = now
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._lags and self._lags[0][0] < cutoff:
+            self._lags.popleft()
+        while self._missed and self._missed[0][0] < cutoff:
+            self._missed.popleft()
+
+    def snapshot(self) -> dict:
+        """
+        Current health.
+
+        Returns:
+            Dict with status ('ok' or 'degraded'), reasons, lag percentiles
+            (seconds) over the window, sample count, missed ticks and
+            seconds since the last tick.
+        """
+        now = time.monotonic()
+        self._trim(now)
+        lags = sorted(lag for _, lag in self._lags)
+        missed = sum(count for _, count in self._missed)
+        since_tick = now - (self._last_tick if self._last_tick is not None else self._started)
+
+        p99 = percentile(lags, 0.99)
+        reasons = []
+        if p99 > self.lag_slo_seconds:
+            reasons.append(f"p99 lag {p99:.1f}s exceeds {self.lag_slo_seconds:g}s")
+        if missed:
+            reasons.append(f"{missed} missed tick(s) in the last {self.window_seconds // 60:g} min")
+        if since_tick > self.tick_interval * 2 + 5:
+            reasons.append(f"no tick for {since_tick:.0f}s")
+
+        return {
+            'status': DEGRADED if reasons else OK,
+            'reasons': reasons,
+            'lag_p50': round(percentile(lags, 0.5), 3),
+            'lag_p95': round(percentile(lags, 0.95), 3),
+            'lag_p99': round(p99, 3),
+            'lag_samples': len(lags),
+            'missed_ticks': missed,
+            'seconds_since_tick': round(since_tick, 1),
+            'lag_slo_seconds': self.lag_slo_seconds,
+        }
+
+    def check_transition(self) -> Optional[dict]:
+        """
+        Evaluate health and report status changes (for alerting).
+
+        Returns:
+            The snapshot if the status changed since the last check, else None.
+        """
+        snapshot = self.snapshot()
+        if snapshot['status'] == self._status:
+            return None
+        self._status = snapshot['status']
+        if self._status == DEGRADED:
+            logger.warning(f"Scheduler degraded: {'; '.join(snapshot['reasons'])}")
+        else:
+            logger.info("Scheduler recovered")
+        return snapshot
@@ -0,0 +1,248 @@
+"""
+Incrementally maintained statistics for the admin dashboards.
+Triggers on the reminders (and users) tables keep running totals, per-day
+counts and per-user counts in small counter tables, so admin stats are
+primary-key lookups instead of full-table COUNT(*) scans.
+The SQL is shared by the bot tables (database.py) and the app tables
+(api_server.py); each caller executes it with its own connection type.
+"""
+
+from typing import List, Optional
+
+# Totals keys: 'reminders', 'users', 'status:<status>', 'recurring:<status>'
+# Daily keys: 'reminders' and 'users' (rows created that day)
+
+
+def _prefix(reminders_table: str) -> str:
+    return f"{reminders_table}_stats"
+
+
+def _bump(table: str, key_columns: str, key_values: str, delta: int, where: str = "") -> str:
+    """Upsert that adds delta to a counter row, creating it if needed."""
+    sign = '+' if delta >= 0 else '-'
+    if where:
+        return (
+            f"INSERT INTO {table} ({key_columns}, value) SELECT {key_values}, {delta} WHERE {where} "
+            f"ON CONFLICT({key_columns}) DO UPDATE SET value = value {sign} {abs(delta)};"
+        )
+    return (
+        f"INSERT INTO {table} ({key_columns}, value) VALUES ({key_values}, {delta}) "
+        f"ON CONFLICT({key_columns}) DO UPDATE SET value = value {sign} {abs(delta)};"
+    )
+
+
+def schema_statements(reminders_table: str, users_table: Optional[str] = None) -> List[str]:
+    """
+    Counter tables and the triggers that keep them current.
+
+    Args:
+        reminders_table: Table holding reminders (needs user_id, status,
+            recurrence_type and created_at columns).
+        users_table: Table holding user accounts, if any. Without it, the
+            'users' total counts distinct users that created reminders.
+
+    Returns:
+        Idempotent CREATE statements, in execution order.
+    """
+    p = _prefix(reminders_table)
+    totals, daily, users = f"{p}_totals", f"{p}_daily", f"{p}_users"
+    status = "'status:' || IFNULL({row}.status, '')"
+    recurring = "'recurring:' || IFNULL({row}.status, '')"
+    created_day = "DATE(IFNULL({row}.created_at, CURRENT_TIMESTAMP))"
+
+    statements = [
+        f"""
+        CREATE TABLE IF NOT EXISTS {totals} (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS {daily} (
+            day TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, key)
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS {users} (
+            user_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            pending INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            first_reminder TIMESTAMP,
+            last_reminder TIMESTAMP
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{users}_last ON {users}(last_reminder)",
+        f"CREATE INDEX IF NOT EXISTS idx_{reminders_table}_created ON {reminders_table}(created_at)",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {p}_after_insert AFTER INSERT ON {reminders_table}
+        BEGIN
+            {_bump(totals, 'key', "'reminders'", 1)}
+            {_bump(totals, 'key', status.format(row='NEW'), 1)}
+            {_bump(totals, 'key', recurring.format(row='NEW'), 1, 'NEW.recurrence_type IS NOT NULL')}
+            {_bump(daily, 'day, key', created_day.format(row='NEW') + ", 'reminders'", 1)}
+            INSERT INTO {users} (user_id, total, pending, done, first_reminder, last_reminder)
+            VALUES (NEW.user_id, 1, NEW.status = 'pending', NEW.status = 'done', NEW.created_at, NEW.created_at)
+            ON CONFLICT(user_id) DO UPDATE SET
+                total = total + 1,
+                pending = pending + excluded.pending,
+                done = done + excluded.done,
+                last_reminder = MAX(IFNULL(last_reminder, excluded.last_reminder), excluded.last_reminder);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {p}_after_update AFTER UPDATE OF status, recurrence_type ON {reminders_table}
+        WHEN OLD.status IS NOT NEW.status
+          OR (OLD.recurrence_type IS NULL) != (NEW.recurrence_type IS NULL)
+        BEGIN
+            {_bump(totals, 'key', status.format(row='OLD'), -1)}
+            {_bump(totals, 'key', status.format(row='NEW'), 1)}
+            {_bump(totals, 'key', recurring.format(row='OLD'), -1, 'OLD.recurrence_type IS NOT NULL')}
+            {_bump(totals, 'key', recurring.format(row='NEW'), 1, 'NEW.recurrence_type IS NOT NULL')}
+            UPDATE {users} SET
+                pending = pending - (OLD.status = 'pending') + (NEW.status = 'pending'),
+                done = done - (OLD.status = 'done') + (NEW.status = 'done')
+            WHERE user_id = NEW.user_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {p}_after_delete AFTER DELETE ON {reminders_table}
+        BEGIN
+            {_bump(totals, 'key', "'reminders'", -1)}
+            {_bump(totals, 'key', status.format(row='OLD'), -1)}
+            {_bump(totals, 'key', recurring.format(row='OLD'), -1, 'OLD.recurrence_type IS NOT NULL')}
+            {_bump(daily, 'day, key', created_day.format(row='OLD') + ", 'reminders'", -1)}
+            UPDATE {users} SET
+                total = total - 1,
+                pending = pending - (OLD.status = 'pending'),
+                done = done - (OLD.status = 'done')
+            WHERE user_id = OLD.user_id;
+        END
+        """,
+    ]
+
+    if users_table:
+        statements += [
+            f"CREATE INDEX IF NOT EXISTS idx_{users_table}_created ON {users_table}(created_at)",
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {p}_{users_table}_after_insert AFTER INSERT ON {users_table}
+            BEGIN
+                {_bump(totals, 'key', "'users'", 1)}
+                {_bump(daily, 'day, key', created_day.format(row='NEW') + ", 'users'", 1)}
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {p}_{users_table}_after_delete AFTER DELETE ON {users_table}
+            BEGIN
+                {_bump(totals, 'key', "'users'", -1)}
+                {_bump(daily, 'day, key', created_day.format(row='OLD') + ", 'users'", -1)}
+            END
+            """,
+        ]
+    else:
+        statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS {p}_users_after_insert AFTER INSERT ON {users}
+        BEGIN
+            {_bump(totals, 'key', "'users'", 1)}
+        END
+        """)
+
+    return statements
+
+
+def initialized_query(reminders_table: str) -> str:
+    """Query returning a row once the counters have been backfilled."""
+    return f"SELECT 1 FROM {_prefix(reminders_table)}_totals WHERE key = 'reminders'"
+
+
+def rebuild_statements(reminders_table: str, users_table: Optional[str] = None) -> List[str]:
+    """
+    Recompute every counter from the source tables.
+    Run once after schema_statements on an existing database (triggers are
+    already in place, so nothing written meanwhile is lost).
+    """
+    p = _prefix(reminders_table)
+    totals, daily, users = f"{p}_totals", f"{p}_daily", f"{p}_users"
+
+    statements = [
+        f"DELETE FROM {totals}",
+        f"DELETE FROM {daily}",
+        f"DELETE FROM {users}",
+        f"INSERT INTO {totals} (key, value) SELECT 'reminders', COUNT(*) FROM {reminders_table}",
+        f"""
+        INSERT INTO {totals} (key, value)
+        SELECT 'status:' || IFNULL(status, ''), COUNT(*) FROM {reminders_table} GROUP BY 1
+        """,
+        f"""
+        INSERT INTO {totals} (key, value)
+        SELECT 'recurring:' || IFNULL(status, ''), COUNT(*) FROM {reminders_table}
+        WHERE recurrence_type IS NOT NULL GROUP BY 1
+        """,
+        f"""
+        INSERT INTO {daily} (day, key, value)
+        SELECT DATE(IFNULL(created_at, CURRENT_TIMESTAMP)), 'reminders', COUNT(*) FROM {reminders_table} GROUP BY 1
+        """,
+        f"""
+        INSERT INTO {users} (user_id, total, pending, done, first_reminder, last_reminder)
+        SELECT user_id, COUNT(*),
+               SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN status = 'done' THEN 1 ELSE 0 END),
+               MIN(created_at), MAX(created_at)
+        FROM {reminders_table} GROUP BY user_id
+        """,
+    ]
+
+    if users_table:
+        statements += [
+            f"INSERT INTO {totals} (key, value) SELECT 'users', COUNT(*) FROM {users_table}",
+            f"""
+            INSERT INTO {daily} (day, key, value)
+            SELECT DATE(IFNULL(created_at, CURRENT_TIMESTAMP)), 'users', COUNT(*) FROM {users_table} GROUP BY 1
+            """,
+        ]
+    else:
+        # The insert trigger on the per-user table has already counted these;
+        # reset to the exact value
+        statements += [
+            f"DELETE FROM {totals} WHERE key = 'users'",
+            f"INSERT INTO {totals} (key, value) SELECT 'users', COUNT(*) FROM {users}",
+        ]
+
+    return statements
+
+
+def totals_query(reminders_table: str) -> str:
+    """Query returning (key, value) rows for all running totals."""
+    return f"SELECT key, value FROM {_prefix(reminders_table)}_totals"
+
+
+def daily_query(reminders_table: str) -> str:
+    """Query returning (key, value) rows for one day; takes the day (YYYY-MM-DD)."""
+    return f"SELECT key, value FROM {_prefix(reminders_table)}_daily WHERE day = ?"
+
+
+def users_table_name(reminders_table: str) -> str:
+    """Name of the per-user counter table."""
+    return f"{_prefix(reminders_table)}_users"
+
+
+def summarize(totals: dict, today: dict) -> dict:
+    """
+    Turn raw counter rows into dashboard figures.
+
+    Args:
+        totals: Mapping of totals key to value.
+        today: Mapping of daily key to value for the current day.
+    """
+    return {
+        'total_users': totals.get('users', 0),
+        'total_reminders': totals.get('reminders', 0),
+        'pending_reminders': totals.get('status:pending', 0),
+        'done_reminders': totals.get('status:done', 0),
+        'recurring_reminders': totals.get('recurring:pending', 0),
+        'today_reminders': today.get('reminders', 0),
+        'today_users': today.get('users', 0),
+    }
@@ -7,11 +7,13 @@ Supports Uzbek and Russian languages for Uzbekistan users.
 import re
 import logging
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Tuple, List
 import dateparser
 from dateutil import parser as dateutil_parser
-from dateutil import tz
 from slang_dictionary import normalize_slang
+from timezones import UTC, to_local_naive
+from tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,22 @@ TASK_SEPARATORS = [
 ]
 
 
+@lru_cache(maxsize=64)
+def dateparser_settings(user_timezone: str) -> dict:
+    """
+    Dateparser settings for a user's timezone, built once per zone.
+    The returned dict is shared and must not be modified.
+    """
+    return {
+        'PREFER_DATES_FROM': 'future',
+        'PREFER_DAY_OF_MONTH': 'first',
+        'RETURN_AS_TIMEZONE_AWARE': False,
+        'TIMEZONE': user_timezone,
+        'TO_TIMEZONE': 'UTC',
+    }
+
+
+@traced('parse.regex')
 def parse_reminder_text(
     text: str,
     user_timezone: str = 'Asia/Tashkent',
@@ -128,13 +146,7 @@ def parse_reminder_text(
             return task, scheduled_time
     
     # Try to parse with dateparser for natural language
-    settings = {
-        'PREFER_DATES_FROM': 'future',
-        'PREFER_DAY_OF_MONTH': 'first',
-        'RETURN_AS_TIMEZONE_AWARE': False,
-        'TIMEZONE': user_timezone,
-        'TO_TIMEZONE': 'UTC',
-    }
+    settings = dateparser_settings(user_timezone)
     
     # Common time expressions (Uzbek and Russian)
     time_expressions = [
@@ -215,6 +227,7 @@ def parse_reminder_text(
     return task, None
 
 
+@traced('parse.multi')
 def parse_multiple_tasks(text: str, language: Optional[str] = None) -> List[str]:
     """
     Split text containing multiple tasks into individual task strings.
@@ -297,62 +310,105 @@ def parse_snooze_duration(text: str) -> Optional[timedelta]:
     return None
 
 
-def format_datetime(dt: datetime, user_timezone: str = 'UTC') -> str:
+# Day and month names, indexed by weekday() and month - 1
+DAY_NAMES = {
+    'uz': ['Dushanba', 'Seshanba', 'Chorshanba', 'Payshanba', 'Juma', 'Shanba', 'Yakshanba'],
+    'ru': ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'],
+}
+MONTH_NAMES = {
+    'uz': ['Yanvar', 'Fevral', 'Mart', 'Aprel', 'May', 'Iyun',
+           'Iyul', 'Avgust', 'Sentabr', 'Oktabr', 'Noyabr', 'Dekabr'],
+    'ru': ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+           'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря'],
+}
+
+
+def format_datetime(dt: datetime, user_timezone: str = 'UTC', language: str = 'uz') -> str:
     """
     Format a datetime for user-friendly display in their timezone.
+    Results are cached per (minute, timezone, language, local date), since
+    reminder lists and messages format the same timestamps repeatedly.
     
     Args:
         dt: The datetime to format (assumed UTC if naive).
         user_timezone: User's timezone string.
+        language: 'uz' or 'ru' (other values fall back to Uzbek).
     
     Returns:
-        Formatted string like "Tomorrow at 3:00 PM" or "Monday, Jan 15 at 2:30 PM".
+        Formatted string like "Ertaga soat 15:00" or "15-Yanvar, 2025 soat 14:30".
     """
-    try:
-        # Convert from UTC to user timezone
-        user_tz = tz.gettz(user_timezone) or tz.UTC
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=tz.UTC)
-        dt_local = dt.astimezone(user_tz)
-    except Exception:
-        dt_local = dt
-    
-    now = datetime.now(user_tz if 'user_tz' in dir() else None) or datetime.now()
-    if dt_local.tzinfo:
-        now = datetime.now(dt_local.tzinfo)
-    
-    today = now.date()
-    tomorrow = today + timedelta(days=1)
-    
-    # Uzbek day names
-    uzbek_days = {
-        'Monday': 'Dushanba',
-        'Tuesday': 'Seshanba', 
-        'Wednesday': 'Chorshanba',
-        'Thursday': 'Payshanba',
-        'Friday': 'Juma',
-        'Saturday': 'Shanba',
-        'Sunday': 'Yakshanba'
-    }
-    
-    # Uzbek month names
-    uzbek_months = {
-        'January': 'Yanvar', 'February': 'Fevral', 'March': 'Mart',
-        'April': 'Aprel', 'May': 'May', 'June': 'Iyun',
-        'July': 'Iyul', 'August': 'Avgust', 'September': 'Sentabr',
-        'October': 'Oktabr', 'November': 'Noyabr', 'December': 'Dekabr'
-    }
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(UTC).replace(tzinfo=None)
+    language = 'ru' if language and language.startswith('ru') else 'uz'
     
-    if dt_local.date() == today:
-        return f"Bugun soat {dt_local.strftime('%H:%M')}"
-    elif dt_local.date() == tomorrow:
-        return f"Ertaga soat {dt_local.strftime('%H:%M')}"
-    elif (dt_local.date() - today).days < 7:
-        day_name = uzbek_days.get(dt_local.strftime('%A'), dt_local.strftime('%A'))
-        return f"{day_name} soat {dt_local.strftime('%H:%M')}"
-    else:
-        month_name = uzbek_months.get(dt_local.strftime('%B'), dt_local.strftime('%B'))
-        return f"{dt_local.day}-{month_name}, {dt_local.year} soat {dt_local.strftime('%H:%M')}"
+    # "Today" is part of the key so cached labels roll over at local midnight
+    today = to_local_naive(datetime.utcnow(), user_timezone).date()
+    return _format_minute(dt.replace(second=0, microsecond=0), user_timezone, language, today)
+
+
+@lru_cache(maxsize=4096)
+def _format_minute(minute_utc: datetime, user_timezone: str, language: str, today) -> str:
+    """Format a whole-minute UTC datetime relative to the user's local date."""
+    dt_local = to_local_naive(minute_utc, user_timezone)
+    time_str = dt_local.strftime('%H:%M')
+    days_ahead = (dt_local.date() - today).days
+    
+    if language == 'ru':
+        if days_ahead == 0:
+            return f"Сегодня в {time_str}"
+        elif days_ahead == 1:
+            return f"Завтра в {time_str}"
+        elif days_ahead < 7:
+            return f"{DAY_NAMES['ru'][dt_local.weekday()]} в {time_str}"
+        return f"{dt_local.day} {MONTH_NAMES['ru'][dt_local.month - 1]} {dt_local.year} в {time_str}"
+    
+    if days_ahead == 0:
+        return f"Bugun soat {time_str}"
+    elif days_ahead == 1:
+        return f"Ertaga soat {time_str}"
+    elif days_ahead < 7:
+        return f"{DAY_NAMES['uz'][dt_local.weekday()]} soat {time_str}"
+    return f"{dt_local.day}-{MONTH_NAMES['uz'][dt_local.month - 1]}, {dt_local.year} soat {time_str}"
+
+
+# Uzbekistan cities and regions to timezone mappings
+TIMEZONE_HINTS = {
+    # Uzbekistan cities (all Asia/Tashkent +5)
+    'toshkent': 'Asia/Tashkent',
+    'tashkent': 'Asia/Tashkent',
+    'ташкент': 'Asia/Tashkent',
+    'samarqand': 'Asia/Samarkand',
+    'samarkand': 'Asia/Samarkand',
+    'самарканд': 'Asia/Samarkand',
+    'buxoro': 'Asia/Samarkand',
+    'bukhara': 'Asia/Samarkand',
+    'бухара': 'Asia/Samarkand',
+    'andijon': 'Asia/Tashkent',
+    'andijan': 'Asia/Tashkent',
+    'андижан': 'Asia/Tashkent',
+    "farg'ona": 'Asia/Tashkent',
+    'fergana': 'Asia/Tashkent',
+    'фергана': 'Asia/Tashkent',
+    'namangan': 'Asia/Tashkent',
+    'наманган': 'Asia/Tashkent',
+    'xorazm': 'Asia/Samarkand',
+    'urgench': 'Asia/Samarkand',
+    'ургенч': 'Asia/Samarkand',
+    'nukus': 'Asia/Samarkand',
+    'нукус': 'Asia/Samarkand',
+    'qarshi': 'Asia/Samarkand',
+    'karshi': 'Asia/Samarkand',
+    'карши': 'Asia/Samarkand',
+    'navoiy': 'Asia/Samarkand',
+    'navoi': 'Asia/Samarkand',
+    'навои': 'Asia/Samarkand',
+    "o'zbekiston": 'Asia/Tashkent',
+    'uzbekistan': 'Asia/Tashkent',
+    'узбекистан': 'Asia/Tashkent',
+    # Russian cities (for Russian speakers)
+    'moscow': 'Europe/Moscow',
+    'москва': 'Europe/Moscow',
+}
 
 
 def detect_timezone_from_location(location_text: str) -> Optional[str]:
@@ -366,47 +422,8 @@ def detect_timezone_from_location(location_text: str) -> Optional[str]:
     Returns:
         Timezone string or None.
     """
-    # Uzbekistan cities and regions to timezone mappings
-    timezone_hints = {
-        # Uzbekistan cities (all Asia/Tashkent +5)
-        'toshkent': 'Asia/Tashkent',
-        'tashkent': 'Asia/Tashkent',
-        'ташкент': 'Asia/Tashkent',
-        'samarqand': 'Asia/Samarkand',
-        'samarkand': 'Asia/Samarkand',
-        'самарканд': 'Asia/Samarkand',
-        'buxoro': 'Asia/Samarkand',
-        'bukhara': 'Asia/Samarkand',
-        'бухара': 'Asia/Samarkand',
-        'andijon': 'Asia/Tashkent',
-        'andijan': 'Asia/Tashkent',
-        'андижан': 'Asia/Tashkent',
-        "farg'ona": 'Asia/Tashkent',
-        'fergana': 'Asia/Tashkent',
-        'фергана': 'Asia/Tashkent',
-        'namangan': 'Asia/Tashkent',
-        'наманган': 'Asia/Tashkent',
-        'xorazm': 'Asia/Samarkand',
-        'urgench': 'Asia/Samarkand',
-        'ургенч': 'Asia/Samarkand',
-        'nukus': 'Asia/Samarkand',
-        'нукус': 'Asia/Samarkand',
-        'qarshi': 'Asia/Samarkand',
-        'karshi': 'Asia/Samarkand',
-        'карши': 'Asia/Samarkand',
-        'navoiy': 'Asia/Samarkand',
-        'navoi': 'Asia/Samarkand',
-        'навои': 'Asia/Samarkand',
-        "o'zbekiston": 'Asia/Tashkent',
-        'uzbekistan': 'Asia/Tashkent',
-        'узбекистан': 'Asia/Tashkent',
-        # Russian cities (for Russian speakers)
-        'moscow': 'Europe/Moscow',
-        'москва': 'Europe/Moscow',
-    }
-    
     text_lower = location_text.lower()
-    for hint, timezone in timezone_hints.items():
+    for hint, timezone in TIMEZONE_HINTS.items():
         if hint in text_lower:
             return timezone
     
@@ -0,0 +1,148 @@
+"""
+Timezone registry.
+Resolves timezone names to interned tzinfo objects once and caches UTC
+offset transitions, so hot paths (formatting, parsing, recurrence) do not
+look zones up from strings on every call.
+"""
+
+import logging
+from bisect import bisect_right
+from datetime import datetime, timedelta, tzinfo
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from dateutil import tz as tz_module
+
+logger = logging.getLogger(__name__)
+
+UTC = tz_module.UTC
+
+# Transition tables cover this many years around the requested year
+TABLE_YEARS_BEFORE = 1
+TABLE_YEARS_AFTER = 3
+
+# Offsets are sampled at this step, then changes are bisected to the second
+SAMPLE_STEP = timedelta(hours=6)
+
+_zones = {}
+
+
+def get_zone(name: Optional[str]) -> Optional[tzinfo]:
+    """
+    Return the interned tzinfo for a timezone name.
+
+    Args:
+        name: IANA timezone name (e.g. 'Asia/Tashkent').
+
+    Returns:
+        The tzinfo object, or None if the name is unknown.
+    """
+    if not name:
+        return None
+    try:
+        return _zones[name]
+    except KeyError:
+        pass
+    zone = tz_module.gettz(name)
+    if zone is None:
+        # Names come from user input; only known zones are interned
+        logger.debug(f"Unknown timezone: {name}")
+        return None
+    _zones[name] = zone
+    return zone
+
+
+def zone_or_utc(name: Optional[str]) -> tzinfo:
+    """Return the tzinfo for a name, falling back to UTC."""
+    return get_zone(name) or UTC
+
+
+def is_valid_timezone(name: Optional[str]) -> bool:
+    """Check whether a timezone name resolves to a known zone."""
+    return get_zone(name) is not None
+
+
+def _utcoffset_seconds(zone: tzinfo, dt_utc: datetime) -> int:
+    """UTC offset of a zone at a naive UTC instant, in seconds."""
+    local = dt_utc.replace(tzinfo=UTC).astimezone(zone)
+    return int(local.utcoffset().total_seconds())
+
+
+def _table_window(base_year: int) -> Tuple[datetime, datetime]:
+    """Naive UTC range a transition table centred on base_year is exact for."""
+    return (
+        datetime(base_year - TABLE_YEARS_BEFORE, 1, 1),
+        datetime(base_year + TABLE_YEARS_AFTER + 1, 1, 1),
+    )
+
+
+@lru_cache(maxsize=64)
+def transition_table(name: str, base_year: int) -> Tuple[List[datetime], List[int]]:
+    """
+    Build the UTC offset transition table for a timezone.
+
+    Args:
+        name: IANA timezone name (unknown names use UTC).
+        base_year: Year the table is centred on (part of the cache key so
+            long-running processes roll the window forward).
+
+    Returns:
+        (starts, offsets): naive UTC instants where an offset takes effect
+        (the first entry covers everything before the window) and the
+        offsets in seconds.
+    """
+    zone = zone_or_utc(name)
+    start, end = _table_window(base_year)
+
+    starts = [datetime(1970, 1, 1)]
+    offsets = [_utcoffset_seconds(zone, start)]
+
+    prev = start
+    current = start + SAMPLE_STEP
+    while current <= end:
+        offset = _utcoffset_seconds(zone, current)
+        if offset != offsets[-1]:
+            # Bisect to the exact second the new offset takes effect
+            lo, hi = prev, current
+            while (hi - lo) > timedelta(seconds=1):
+                mid = lo + (hi - lo) / 2
+                if _utcoffset_seconds(zone, mid) == offsets[-1]:
+                    lo = mid
+                else:
+                    hi = mid
+            starts.append(hi.replace(microsecond=0))
+            offsets.append(offset)
+        prev = current
+        current += SAMPLE_STEP
+
+    return starts, offsets
+
+
+def utc_offset(name: Optional[str], dt_utc: datetime) -> timedelta:
+    """
+    UTC offset of a timezone at a naive UTC instant, from the cached table.
+    Instants outside the table's window are looked up in the zone itself.
+
+    Args:
+        name: IANA timezone name.
+        dt_utc: Naive UTC datetime.
+
+    Returns:
+        Offset as a timedelta.
+    """
+    base_year = datetime.utcnow().year
+    start, end = _table_window(base_year)
+    if not start <= dt_utc < end:
+        return timedelta(seconds=_utcoffset_seconds(zone_or_utc(name), dt_utc))
+    starts, offsets = transition_table(name or 'UTC', base_year)
+    index = max(bisect_right(starts, dt_utc) - 1, 0)
+    return timedelta(seconds=offsets[index])
+
+
+def to_local(dt_utc: datetime, name: Optional[str]) -> datetime:
+    """Convert a naive UTC datetime to an aware datetime in the given timezone."""
+    return dt_utc.replace(tzinfo=UTC).astimezone(zone_or_utc(name))
+
+
+def to_local_naive(dt_utc: datetime, name: Optional[str]) -> datetime:
+    """Convert a naive UTC datetime to naive local wall time using cached offsets."""
+    return dt_utc + utc_offset(name, dt_utc)
@@ -0,0 +1,55 @@
+"""
+Bounded cache of verified JWTs.
+Maps a digest of the raw token to its claims (user_id, exp, token version)
+so repeat requests with the same token skip signature verification. The
+raw token is never kept in memory; entries drop out at their expiry or
+when the cache is full (least recently used first).
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+TOKEN_CACHE_SIZE = 10000
+
+
+class TokenCache:
+    """LRU cache of token digest -> (user_id, exp, version)."""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[int, float, int]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Tuple[int, int]]:
+        """
+        Look up a previously verified token.
+
+        Returns:
+            (user_id, version), or None if unknown or expired.
+        """
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        user_id, exp, version = entry
+        if exp <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user_id, version
+
+    def put(self, token: str, user_id: int, exp: float, version: int) -> None:
+        """Remember a token whose signature and expiry were just verified."""
+        key = self._key(token)
+        self._entries[key] = (user_id, exp, version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,358 @@
+"""
+Lightweight tracing for the voice pipeline.
+Spans follow the OpenTelemetry data model (128-bit trace id, 64-bit span
+id, parent id, start/end in nanoseconds, attributes, events and a status)
+and finished traces are exported as OTLP/JSON, one trace per line, to a
+file or stdout; the OpenTelemetry Collector's otlpjsonfile receiver and
+most trace viewers read that format directly.
+
+A trace starts at trace() (e.g. one voice message); span() inside it adds
+a child stage and is a no-op outside a trace, so shared code such as
+database calls can be instrumented without tracing every caller.
+
+Spans are kept in memory until the root ends, then the whole trace is
+exported if it failed, took longer than the slow threshold (those are also
+logged as a stage timeline at WARNING) or was picked by the sample rate.
+Exports are written from a background thread.
+"""
+
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, TextIO
+
+from logging_setup import log_context
+
+logger = logging.getLogger(__name__)
+
+SCOPE_NAME = 'levi.tracing'
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+_current: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('trace_span', default=None)
+_random = random.Random()
+
+_service_name = 'levi-bot'
+_exporter = 'none'
+_path = 'traces.jsonl'
+_sample_rate = 0.0
+_slow_ms = 5000.0
+_queue: Optional[queue.SimpleQueue] = None
+_writer: Optional[threading.Thread] = None
+
+
+class Span:
+    """One timed stage of a trace."""
+
+    def __init__(self, name: str, trace: '_Trace', parent: Optional['Span'], kind: int, attributes: dict):
+        self.name = name
+        self.trace = trace
+        self.span_id = _random.getrandbits(64).to_bytes(8, 'big').hex()
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.events: List[dict] = []
+        self.status = STATUS_UNSET
+        self.status_message = ''
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def add_event(self, name: str, **attributes) -> None:
+        self.events.append({'name': name, 'time_ns': time.time_ns(), 'attributes': attributes})
+
+    def set_error(self, message: str) -> None:
+        """Mark the span (and so its trace) as failed."""
+        self.status = STATUS_ERROR
+        self.status_message = message
+        self.trace.failed = True
+
+    def record_exception(self, error: BaseException) -> None:
+        self.add_event('exception', **{
+            'exception.type': type(error).__name__,
+            'exception.message': str(error),
+        })
+        self.set_error(f"{type(error).__name__}: {error}")
+
+    def to_otlp(self) -> dict:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or time.time_ns()),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': self.status, **({'message': self.status_message} if self.status_message else {})},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.events:
+            span['events'] = [
+                {'name': event['name'], 'timeUnixNano': str(event['time_ns']),
+                 'attributes': _otlp_attributes(event['attributes'])}
+                for event in self.events
+            ]
+        return span
+
+
+class _NoopSpan:
+    """Stands in for a span outside any trace, so callers never need to check."""
+
+    trace_id = None
+    duration_ms = 0.0
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    """Spans of one trace, buffered until the root span ends."""
+
+    def __init__(self):
+        self.trace_id = _random.getrandbits(128).to_bytes(16, 'big').hex()
+        self.spans: List[Span] = []
+        self.failed = False
+
+
+def _otlp_attributes(attributes: dict) -> List[dict]:
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {'boolValue': value}
+        elif isinstance(value, int):
+            typed = {'intValue': str(value)}
+        elif isinstance(value, float):
+            typed = {'doubleValue': value}
+        else:
+            typed = {'stringValue': str(value)}
+        values.append({'key': key, 'value': typed})
+    return values
+
+
+def configure_tracing(
+    exporter: str = 'none',
+    path: str = 'traces.jsonl',
+    sample_rate: float = 0.0,
+    slow_ms: float = 5000,
+    service_name: str = 'levi-bot'
+) -> None:
+    """
+    Choose where traces go and which ones are kept.
+
+    Args:
+        exporter: 'file' (append to path), 'stdout' or 'none' (slow traces are still logged).
+        path: OTLP/JSON lines file for the file exporter.
+        sample_rate: Share of ordinary traces exported, 0..1.
+        slow_ms: Traces at least this long are always exported and logged.
+        service_name: service.name resource attribute.
+
+    Raises:
+        ValueError: If the exporter is not recognised.
+    """
+    global _service_name, _exporter, _path, _sample_rate, _slow_ms
+    if exporter not in ('file', 'stdout', 'none'):
+        raise ValueError(f"Unknown trace exporter: {exporter}")
+    _exporter = exporter
+    _path = path
+    _sample_rate = sample_rate
+    _slow_ms = slow_ms
+    _service_name = service_name
+
+
+def current_span():
+    """The active span, or a no-op span outside any trace."""
+    return _current.get() or NOOP_SPAN
+
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Span]:
+    """
+    Start a new trace whose root span covers the block; inside an existing
+    trace this is an ordinary child span. Log records written inside the
+    block carry the trace_id.
+    """
+    parent = _current.get()
+    if parent is not None:
+        with span(name, **attributes) as child:
+            yield child
+        return
+
+    root = Span(name, _Trace(), None, KIND_SERVER, attributes)
+    token = _current.set(root)
+    try:
+        with log_context(trace_id=root.trace_id):
+            yield root
+    except BaseException as e:
+        root.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        root.end_ns = time.time_ns()
+        root.trace.spans.append(root)
+        _finish(root)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a stage of the current trace; a no-op outside one."""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    child = Span(name, parent.trace, parent, KIND_INTERNAL, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        child.end_ns = time.time_ns()
+        parent.trace.spans.append(child)
+
+
+def traced(name: str, root: bool = False) -> Callable:
+    """Decorator: run each call of a sync or async function in span(name), or trace(name) if root."""
+    scope = trace if root else span
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with scope(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with scope(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timeline(root: Span) -> str:
+    """One-line stage summary of a finished trace, in start order."""
+    stages = sorted((s for s in root.trace.spans if s is not root), key=lambda s: s.start_ns)
+    parts = [
+        f"{s.name} +{(s.start_ns - root.start_ns) / 1e6:.0f}ms {s.duration_ms:.0f}ms"
+        + (" ERROR" if s.status == STATUS_ERROR else "")
+        for s in stages
+    ]
+    return ' | '.join(parts) or 'no stages'
+
+
+def _finish(root: Span) -> None:
+    """Decide whether a finished trace is kept, and hand it to the exporter."""
+    slow = root.duration_ms >= _slow_ms
+    if slow:
+        logger.warning(
+            f"Slow trace {root.name} {root.duration_ms:.0f}ms (trace_id={root.trace_id}): {timeline(root)}"
+        )
+    if _exporter == 'none':
+        return
+    if not (slow or root.trace.failed or _random.random() < _sample_rate):
+        return
+    _export(root.trace)
+
+
+def _export(buffered: _Trace) -> None:
+    global _queue, _writer
+    line = json.dumps({
+        'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': _service_name})},
+            'scopeSpans': [{
+                'scope': {'name': SCOPE_NAME},
+                'spans': [s.to_otlp() for s in sorted(buffered.spans, key=lambda s: s.start_ns)],
+            }],
+        }],
+    }, ensure_ascii=False)
+    if _writer is None or not _writer.is_alive():
+        _queue = queue.SimpleQueue()
+        _writer = threading.Thread(target=_write_loop, args=(_queue,), name='trace-exporter', daemon=True)
+        _writer.start()
+        atexit.register(_flush)
+    _queue.put(line)
+
+
+def _write_loop(lines: queue.SimpleQueue) -> None:
+    out: Optional[TextIO] = None
+    while True:
+        line = lines.get()
+        if line is None:
+            break
+        try:
+            if _exporter == 'stdout':
+                sys.stdout.write(line + '\n')
+                sys.stdout.flush()
+                continue
+            if out is None or out.name != _path:
+                if out is not None:
+                    out.close()
+                directory = os.path.dirname(_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                out = open(_path, 'a', encoding='utf-8')
+            out.write(line + '\n')
+            out.flush()
+        except OSError as e:
+            logger.error(f"Failed to export trace: {e}")
+    if out is not None:
+        out.close()
+
+
+def _flush() -> None:
+    """Write out queued traces before the process exits."""
+    if _writer is not None and _writer.is_alive():
+        _queue.put(None)
+        _writer.join(timeout=5)
+
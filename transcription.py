@@ -16,6 +16,7 @@ from config import (
     MAX_RETRIES,
     RETRY_DELAY_SECONDS,
 )
+from tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -105,7 +106,8 @@ async def transcribe_voice_message(
     
     # Convert OGG to WAV
     try:
-        wav_path = convert_ogg_to_wav(voice_file_path)
+        with span('convert'):
+            wav_path = convert_ogg_to_wav(voice_file_path)
     except Exception as e:
         raise TranscriptionError(f"Failed to convert audio: {e}")
     
@@ -152,10 +154,11 @@ async def transcribe_voice_message(
         for attempt in range(MAX_RETRIES):
             try:
                 # Perform the transcription (synchronous, wrapped in asyncio)
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: client.recognize(config=config, audio=audio)
-                )
+                with span('transcribe', backend='google', attempt=attempt + 1):
+                    response = await asyncio.get_event_loop().run_in_executor(
+                        None,
+                        lambda: client.recognize(config=config, audio=audio)
+                    )
                 
                 # Extract transcription from response
                 if not response.results:
@@ -271,11 +274,13 @@ async def download_and_transcribe(
     
     try:
         # Download the voice file from Telegram
-        file = await bot.get_file(voice.file_id)
-        await file.download_to_drive(temp_path)
+        with span('download') as download:
+            file = await bot.get_file(voice.file_id)
+            await file.download_to_drive(temp_path)
         
-        # Check file size (very small files likely have no audio)
-        file_size = os.path.getsize(temp_path)
+            # Check file size (very small files likely have no audio)
+            file_size = os.path.getsize(temp_path)
+            download.set_attribute('bytes', file_size)
         if file_size < 1000:  # Less than 1KB
             raise PoorAudioQualityError("Audio file too small - may be corrupted")
         
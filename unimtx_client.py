@@ -0,0 +1,174 @@
+"""
+Unimtx SMS/OTP API client.
+One pooled httpx client is shared by all requests, with short connect and
+read timeouts. A circuit breaker stops calling Unimtx for a while after
+repeated transport failures, so a degraded provider fails fast instead of
+holding request slots. Call latency is recorded per action.
+"""
+
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+UNIMTX_LATENCY = metrics.histogram('unimtx_request_seconds', "Unimtx API call latency", ['action'])
+UNIMTX_FAILURES = metrics.counter('unimtx_failures_total', "Unimtx calls that failed or were rejected by the breaker", ['action', 'reason'])
+
+
+class UnimtxUnavailable(Exception):
+    """Unimtx could not be reached, or the circuit breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures and rejects calls until reset_timeout
+    has passed; then lets a single trial call through (half-open).
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = self.CLOSED
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now."""
+        if self.state == self.CLOSED:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # One trial call; another is let through if it never reports back
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("Circuit closed")
+        self.failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class UnimtxClient:
+    """Client for the Unimtx OTP actions."""
+
+    def __init__(
+        self,
+        base_url: str,
+        access_key_id: str,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+        max_connections: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            base_url: API root (point at a local stand-in server for testing).
+            access_key_id: Unimtx access key.
+            connect_timeout: Seconds to establish a connection.
+            read_timeout: Seconds to wait for a response.
+            max_connections: Size of the connection pool.
+            breaker: Circuit breaker (a default one is created if omitted).
+            transport: Optional httpx transport (e.g. for tests).
+        """
+        self.base_url = base_url.rstrip('/')
+        self.access_key_id = access_key_id
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.breaker = breaker or CircuitBreaker()
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self.transport,
+                headers={"Content-Type": "application/json"}
+            )
+        return self._client
+
+    async def call(self, action: str, payload: dict) -> dict:
+        """
+        Call a Unimtx action.
+
+        Args:
+            action: Action name (e.g. 'otp.send').
+            payload: JSON body.
+
+        Returns:
+            Parsed JSON response (check its 'code' field for API errors).
+
+        Raises:
+            UnimtxUnavailable: If the circuit is open, the request failed or
+                timed out, or Unimtx answered with a server error.
+        """
+        if not self.breaker.allow():
+            UNIMTX_FAILURES.inc(action=action, reason='circuit_open')
+            raise UnimtxUnavailable("Unimtx circuit open")
+
+        started = time.monotonic()
+        try:
+            response = await self._get_client().post(
+                "/",
+                params={"action": action, "accessKeyId": self.access_key_id},
+                json=payload
+            )
+            if response.status_code >= 500:
+                raise UnimtxUnavailable(f"Unimtx returned HTTP {response.status_code}")
+            result = response.json()
+        except (httpx.HTTPError, ValueError, UnimtxUnavailable) as e:
+            self.breaker.record_failure()
+            UNIMTX_FAILURES.inc(action=action, reason=type(e).__name__)
+            if isinstance(e, UnimtxUnavailable):
+                raise
+            raise UnimtxUnavailable(f"Unimtx {action} failed: {e!r}") from e
+        finally:
+            UNIMTX_LATENCY.observe(time.monotonic() - started, action=action)
+
+        self.breaker.record_success()
+        return result
+
+    async def send_otp(self, phone: str, ttl: int = 300) -> dict:
+        """Send a 6-digit OTP by SMS."""
+        return await self.call("otp.send", {"to": phone, "channel": "sms", "digits": 6, "ttl": ttl})
+
+    async def verify_otp(self, phone: str, code: str) -> dict:
+        """Check an OTP entered by the user."""
+        return await self.call("otp.verify", {"to": phone, "code": code})
+
+    def stats(self) -> dict:
+        """Breaker state and per-action latency histograms."""
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "latency": {labels['action']: histogram.snapshot() for labels, histogram in UNIMTX_LATENCY.children()},
+        }
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
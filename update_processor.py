@@ -0,0 +1,84 @@
+"""
+Concurrent Telegram update processing that keeps each chat in order.
+Updates of different chats are handled side by side, up to a limit, while
+the updates of one chat run one at a time in arrival order, so
+ConversationHandler state and user_data never see two updates of the same
+conversation at once.
+
+An update arriving while its chat is busy is appended to that chat's queue
+and run by the task already working on the chat, instead of waiting in a
+slot of its own: a user sending a burst of messages occupies one slot,
+not all of them.
+"""
+
+import logging
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update: object) -> Optional[int]:
+    """Chat an update belongs to (the user for chat-less updates), or None."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Runs up to max_concurrent_updates chats at once, each chat's updates in order."""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Chats being processed -> their updates not yet finished (the running one first)
+        self._queues: Dict[int, Deque[Awaitable[Any]]] = {}
+
+    @property
+    def busy_chats(self) -> int:
+        return len(self._queues)
+
+    @property
+    def queued_updates(self) -> int:
+        """Updates waiting behind an earlier update of their chat."""
+        return sum(len(queue) - 1 for queue in self._queues.values())
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = chat_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            # The task working on this chat runs it after the ones before it
+            queue.append(coroutine)
+            return
+
+        queue = self._queues[key] = deque([coroutine])
+        try:
+            while queue:
+                try:
+                    await queue[0]
+                except Exception as e:
+                    # Handler errors already went to the error handlers; keep the chat moving
+                    logger.error(f"Update processing failed for chat {key}: {e}", exc_info=True)
+                queue.popleft()
+        finally:
+            del self._queues[key]
+            # Cancelled mid-queue: close the rest so they don't leak as never-awaited
+            for pending in queue:
+                if hasattr(pending, 'close'):
+                    pending.close()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,123 @@
+"""
+Webhook front end for the Telegram bot as an ASGI app.
+Telegram POSTs each update to WEBHOOK_URL; the app checks the secret
+token header, puts the update on the Application's queue and answers at
+once, so Telegram can keep up to max_connections requests in flight while
+the handlers run concurrently (one at a time per chat, see
+update_processor).
+
+The app can run on its own under uvicorn or host another ASGI app (the
+API server) on the same port, with both lifespans run together.
+
+On shutdown the server stops accepting connections, so Telegram keeps
+new updates and retries them later, and every update already accepted is
+processed before the Application stops.
+"""
+
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+DEFAULT_PATH = '/telegram'
+
+
+def default_secret_token(bot_token: str) -> str:
+    """Secret token derived from the bot token, so every replica agrees on it without configuration."""
+    return hashlib.sha256(f"webhook:{bot_token}".encode()).hexdigest()[:64]
+
+
+def create_webhook_app(
+    application: Application,
+    webhook_url: Optional[str] = None,
+    secret_token: Optional[str] = None,
+    max_connections: int = 40,
+    allowed_updates: Optional[List[str]] = None,
+    drop_pending_updates: bool = False,
+    api_app=None
+) -> Starlette:
+    """
+    Build the ASGI app receiving the bot's updates.
+
+    Args:
+        application: The configured (not yet initialized) Application; the
+            app's lifespan initializes, starts, stops and shuts it down.
+        webhook_url: Public HTTPS URL Telegram posts to; registered with
+            setWebhook on startup. Its path is the route served. If None,
+            the webhook is left as registered and DEFAULT_PATH is served.
+        secret_token: Value Telegram sends in the secret token header
+            (default: derived from the bot token).
+        max_connections: Simultaneous connections Telegram may open (1-100).
+        allowed_updates: Update types to receive (default: Telegram's default set).
+        drop_pending_updates: Drop updates that queued up while the bot was away.
+        api_app: ASGI app to serve on every other path (e.g. api_server.app).
+
+    Returns:
+        The Starlette app.
+    """
+    url_path = (urlparse(webhook_url).path if webhook_url else '') or DEFAULT_PATH
+    secret_token = secret_token or default_secret_token(application.bot.token)
+
+    async def receive_update(request: Request) -> Response:
+        if request.headers.get(SECRET_HEADER) != secret_token:
+            return Response(status_code=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            # Not JSON, or JSON that is not an update
+            return Response(status_code=400)
+        await application.update_queue.put(update)
+        return Response(status_code=200)
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if webhook_url:
+            await application.bot.set_webhook(
+                webhook_url,
+                secret_token=secret_token,
+                max_connections=max_connections,
+                allowed_updates=allowed_updates,
+                drop_pending_updates=drop_pending_updates
+            )
+            logger.info(f"Webhook set to {webhook_url} (max_connections={max_connections})")
+        logger.info(
+            f"Receiving updates on {url_path} "
+            f"({application.update_processor.max_concurrent_updates} concurrent)"
+        )
+
+        try:
+            if api_app is not None:
+                async with api_app.router.lifespan_context(api_app):
+                    yield
+            else:
+                yield
+        finally:
+            # The webhook stays registered, so updates sent meanwhile wait at Telegram
+            logger.info(f"Draining {application.update_queue.qsize()} queued update(s)")
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+            logger.info("Webhook stopped")
+
+    routes = [Route(url_path, receive_update, methods=['POST'])]
+    if api_app is not None:
+        routes.append(Mount('/', app=api_app))
+    return Starlette(routes=routes, lifespan=lifespan)